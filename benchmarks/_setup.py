@@ -0,0 +1,15 @@
+""" Imported by every benchmark before anything from src: points the engines at a throwaway SQLite file
+and registers every model, so a benchmark creates the whole schema whichever models it imports itself.
+Set DB_PROFILE before importing it to benchmark another profile.
+"""
+import os
+import tempfile
+
+directory = tempfile.TemporaryDirectory()
+path = os.path.join(directory.name, "bench.db")
+os.environ["ENGINE_PATH_DB"] = f"sqlite:///{path}"
+os.environ["ASYNC_ENGINE_PATH_DB"] = f"sqlite+aiosqlite:///{path}"
+
+from src.services.SQLite.index import register_models
+
+register_models()
@@ -0,0 +1,82 @@
+""" python -m benchmarks.cart_pricing [lines] [iterations]
+
+Compares pricing a cart with one select(Product) per line (the old create_order loop)
+against the single query of src.services.cart on a throwaway SQLite database.
+"""
+import asyncio
+import sys
+import time
+
+from benchmarks._setup import directory
+
+from sqlalchemy import event, select, insert
+from src.services.SQLite.index import async_engine, async_session, reset_database
+from src.api.users.model import User
+from src.api.restaurants.model import Restaurant
+from src.api.products.model import Product
+import src.services.cart.index as cart
+
+async_engine.echo = False
+statements = 0
+
+@event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+def count_statement(*args):
+    global statements
+    statements += 1
+
+
+async def price_per_line(session, restaurant_id, product_ids, quantities):
+    total = 0
+    for product_id, quantity in zip(product_ids, quantities):
+        result = await session.execute(select(Product).where(Product.id == product_id))
+        product = result.scalar_one_or_none()
+        total += product.price * quantity
+    return total
+
+
+async def price_batched(session, restaurant_id, product_ids, quantities):
+    lines = await cart.price_cart(session, restaurant_id, product_ids, quantities)
+    return sum(line.total for line in lines)
+
+
+async def seed(products: int):
+    await reset_database()
+    async with async_session() as session:
+        await session.execute(insert(User).values(id=1, name="Owner", surname="Bench", email="owner@bench", hashed_password="-", role="owner"))
+        await session.execute(insert(Restaurant).values(id=1, name="Bench", address="-", city="-", country="-", email="bench@bench", owner_id=1))
+        await session.execute(insert(Product), [
+            {"id": i, "name": f"Product {i}", "price": 100 + i, "discount": i % 20, "restaurant_id": 1}
+            for i in range(1, products + 1)
+        ])
+        await session.commit()
+
+
+async def measure(name, price, product_ids, quantities, iterations):
+    global statements
+    async with async_session() as session:
+        await price(session, 1, product_ids, quantities)
+        statements = 0
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            await price(session, 1, product_ids, quantities)
+            timings.append(time.perf_counter() - start)
+            session.expunge_all()
+    timings.sort()
+    print(f"{name:<10} mean {sum(timings) / len(timings) * 1000:8.3f} ms  p50 {timings[len(timings) // 2] * 1000:8.3f} ms  "
+          f"p95 {timings[int(len(timings) * 0.95)] * 1000:8.3f} ms  {statements / iterations:5.1f} statements/cart")
+
+
+async def main(lines: int, iterations: int):
+    await seed(max(lines, 200))
+    product_ids = list(range(1, lines + 1))
+    quantities = [1 + i % 3 for i in range(lines)]
+    print(f"{lines} line cart, {iterations} iterations")
+    await measure("per-line", price_per_line, product_ids, quantities, iterations)
+    await measure("batched", price_batched, product_ids, quantities, iterations)
+    await async_engine.dispose()
+    directory.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 30, int(sys.argv[2]) if len(sys.argv) > 2 else 200))
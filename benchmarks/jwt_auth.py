@@ -0,0 +1,69 @@
+""" python -m benchmarks.jwt_auth [iterations]
+
+Per-request cost of JWTBearer with the old double decode and os.getenv lookups
+against the verified-token cache.
+"""
+import asyncio
+import os
+import sys
+import time
+
+from benchmarks._setup import directory
+
+import jwt
+from datetime import datetime
+from fastapi import HTTPException
+from fastapi.security import HTTPBearer
+from starlette.requests import Request
+import src.services.auth.index as auth
+
+
+class User:
+    id = 1
+    email = "user@example.com"
+    role = "user"
+    hashed_password = None
+
+
+def decode_uncached(token: str) -> dict:
+    try:
+        decoded_token = jwt.decode(token, os.getenv("JWT_SECRET", "secret"), algorithms=[(os.getenv("JWT_ALGORITHM", "HS256"))])
+        return decoded_token if decoded_token["expires"] >= datetime.now().timestamp() else None
+    except:
+        return {}
+
+
+class UncachedJWTBearer(HTTPBearer):
+    """ JWTBearer as it was: verify_jwt decodes once, then the payload is decoded again """
+
+    async def __call__(self, request: Request):
+        credentials = await super().__call__(request)
+        if not decode_uncached(credentials.credentials):
+            raise HTTPException(status_code=403, detail="Invalid token or expired token.")
+        return decode_uncached(credentials.credentials)
+
+
+def make_request(token: str) -> Request:
+    return Request({"type": "http", "headers": [(b"authorization", f"Bearer {token}".encode())]})
+
+
+async def measure(name: str, bearer, request: Request, iterations: int):
+    await bearer(request)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        await bearer(request)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<10} {elapsed / iterations * 1e6:8.2f} us/request")
+
+
+async def main(iterations: int):
+    request = make_request(auth.sign_jwt(User())["token"]["access_token"])
+    print(f"{iterations} authenticated requests with the same token")
+    await measure("uncached", UncachedJWTBearer(), request, iterations)
+    await measure("cached", auth.JWTBearer(), request, iterations)
+    print("cache", auth.token_cache.stats())
+    directory.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000))
@@ -0,0 +1,120 @@
+""" python -m benchmarks.load [--workload mixed] [--concurrency 16] [--requests 2000] [--output run.json] [--compare baseline.json]
+
+Mounts the main.py app through httpx's in-process ASGI transport on a throwaway SQLite
+database seeded with the synthetic generator, then drives a weighted workload with
+concurrent workers. Latencies include the full ASGI stack but no network.
+"""
+import argparse
+import asyncio
+import contextvars
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+parser = argparse.ArgumentParser(description="In-process load and latency benchmark")
+parser.add_argument("--workload", default="mixed", help="mixed, read or write")
+parser.add_argument("--concurrency", type=int, default=16)
+parser.add_argument("--requests", type=int, default=2000)
+parser.add_argument("--warmup", type=int, default=100)
+parser.add_argument("--restaurants", type=int, default=100)
+parser.add_argument("--products", type=int, default=5000)
+parser.add_argument("--orders", type=int, default=50000)
+parser.add_argument("--customers", type=int, default=2000)
+parser.add_argument("--seed", type=int, default=42)
+parser.add_argument("--database", help="SQLite file to use, a temporary one by default")
+parser.add_argument("--profile", default=os.getenv("DB_PROFILE", "development"), help="engine profile, development or production")
+parser.add_argument("--output", help="save the results as JSON")
+parser.add_argument("--compare", help="JSON of a previous run to compare with")
+parser.add_argument("--threshold", type=float, default=0.10, help="p95 increase reported as a regression")
+args = parser.parse_args()
+
+# The engines are created at import time, so the database has to be chosen first
+database = args.database or os.path.join(tempfile.mkdtemp(), "bench_load.db")
+os.environ["ENGINE_PATH_DB"] = f"sqlite:///{database}"
+os.environ["ASYNC_ENGINE_PATH_DB"] = f"sqlite+aiosqlite:///{database}"
+os.environ["DB_PROFILE"] = args.profile
+
+import httpx
+from sqlalchemy import event
+import main
+import src.services.SQLite.index as db
+from src.services.seeder.index import seed_data, seed_synthetic
+from benchmarks.load.workload import Context, WORKLOADS, prepare, picker
+from benchmarks.load.report import summarize, print_summary, save, compare
+
+current_request = contextvars.ContextVar("current_request", default=None)
+
+
+def count_statement(*_):
+    counter = current_request.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+async def seed():
+    await db.reset_database()
+    await seed_data()
+    await seed_synthetic(args.restaurants, args.products, args.orders, args.customers, months=3, seed=args.seed)
+
+
+async def worker(client, context, pick, remaining, samples):
+    while remaining[0] > 0:
+        remaining[0] -= 1
+        route, request, rng = pick()
+        counter = [0]
+        token = current_request.set(counter)
+        start = time.perf_counter()
+        try:
+            response = await request(client, context, rng)
+            status = response.status_code
+        except Exception:
+            status = 599
+        elapsed = time.perf_counter() - start
+        current_request.reset(token)
+        if samples is not None:
+            samples.append((route, status, elapsed, counter[0]))
+
+
+async def run():
+    for engine in (db.async_engine, db.read_engine, db.sync_engine):
+        engine.echo = False
+    for engine in {db.async_engine, db.read_engine}:
+        event.listen(engine.sync_engine, "before_cursor_execute", count_statement)
+
+    print(f"Seeding {args.restaurants} restaurants, {args.products} products, {args.orders} orders")
+    await seed()
+
+    # Unhandled errors become 500 responses like behind a real server
+    transport = httpx.ASGITransport(app=main.app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        context = Context(args.restaurants + 1, args.customers + args.restaurants + 3)
+        await prepare(client, context)
+        pick = picker(WORKLOADS[args.workload], args.seed)
+
+        await asyncio.gather(*(worker(client, context, pick, [args.warmup // args.concurrency + 1], None) for _ in range(args.concurrency)))
+
+        samples = []
+        remaining = [args.requests]
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client, context, pick, remaining, samples) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - start
+
+    summary = summarize(samples, elapsed)
+    print_summary(summary)
+    return {
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare", "database")},
+        "environment": {"python": sys.version.split()[0], "platform": platform.platform(), "date": datetime.now().isoformat(timespec="seconds")},
+        "summary": summary,
+    }
+
+
+if __name__ == "__main__":
+    results = asyncio.run(run())
+    if args.output:
+        save(args.output, results)
+        print(f"Saved to {args.output}")
+    if args.compare and compare(args.compare, results, args.threshold):
+        sys.exit(1)
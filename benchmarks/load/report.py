@@ -0,0 +1,67 @@
+""" Per-route latency percentiles, throughput and SQL statements, saved as JSON and compared between runs """
+import json
+
+
+def percentile(sorted_values, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(len(sorted_values) * fraction), len(sorted_values) - 1)]
+
+
+def summarize(samples, elapsed: float) -> dict:
+    """ samples is a list of (route, status, seconds, statements) """
+    routes = {}
+    for route, status, seconds, statements in samples:
+        entry = routes.setdefault(route, {"latencies": [], "statements": 0, "errors": 0, "status": {}})
+        entry["latencies"].append(seconds)
+        entry["statements"] += statements
+        entry["errors"] += status >= 400
+        entry["status"][str(status)] = entry["status"].get(str(status), 0) + 1
+
+    def stats(latencies, statements, errors):
+        latencies.sort()
+        return {
+            "requests": len(latencies),
+            "errors": errors,
+            "rps": round(len(latencies) / elapsed, 2),
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+            "sql_per_request": round(statements / len(latencies), 2) if latencies else 0.0,
+        }
+
+    result = {route: {**stats(entry["latencies"], entry["statements"], entry["errors"]), "status": entry["status"]} for route, entry in sorted(routes.items())}
+    total = stats([seconds for _, _, seconds, _ in samples], sum(statements for *_, statements in samples), sum(status >= 400 for _, status, _, _ in samples))
+    return {"elapsed_s": round(elapsed, 3), "total": total, "routes": result}
+
+
+def print_summary(summary: dict):
+    print(f"{'route':<42}{'req':>7}{'err':>6}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'sql/req':>9}")
+    for route, stats in list(summary["routes"].items()) + [("total", summary["total"])]:
+        print(f"{route:<42}{stats['requests']:>7}{stats['errors']:>6}{stats['rps']:>10.1f}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}{stats['sql_per_request']:>9.2f}")
+
+
+def save(path: str, results: dict):
+    with open(path, "w") as file:
+        json.dump(results, file, indent=2)
+
+
+def compare(baseline_path: str, results: dict, threshold: float) -> bool:
+    """ Print the change per route against a saved run, True when some route regressed beyond threshold """
+    with open(baseline_path) as file:
+        baseline = json.load(file)
+
+    regressed = False
+    print(f"\n{'route':<42}{'p95 before':>12}{'p95 after':>12}{'change':>9}{'sql before':>12}{'sql after':>11}")
+    current = {**results["summary"]["routes"], "total": results["summary"]["total"]}
+    previous = {**baseline["summary"]["routes"], "total": baseline["summary"]["total"]}
+    for route, stats in current.items():
+        before = previous.get(route)
+        if before is None:
+            print(f"{route:<42}{'-':>12}{stats['p95_ms']:>12.2f}{'new':>9}")
+            continue
+        change = (stats["p95_ms"] - before["p95_ms"]) / before["p95_ms"] if before["p95_ms"] else 0.0
+        worse = change > threshold or stats["sql_per_request"] > before["sql_per_request"] * (1 + threshold)
+        regressed |= worse
+        print(f"{route:<42}{before['p95_ms']:>12.2f}{stats['p95_ms']:>12.2f}{change:>+9.1%}{before['sql_per_request']:>12.2f}{stats['sql_per_request']:>11.2f}{'  REGRESSION' if worse else ''}")
+    return regressed
@@ -0,0 +1,109 @@
+""" Weighted mix of requests across every router, each named after its route template """
+import random
+
+
+class Context:
+    """ Tokens and ids shared by the workers of one run """
+
+    def __init__(self, restaurants: int, users: int):
+        self.restaurants = restaurants
+        self.users = users
+        self.headers = {}
+        self.menu = []
+        self.orders = []
+
+
+async def login(client, email: str, password: str) -> dict:
+    response = await client.post("/login", json={"email": email, "password": password})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['token']['access_token']}"}
+
+
+async def prepare(client, context: Context):
+    context.headers["admin"] = await login(client, "admin@admin.com", "admin")
+    context.headers["owner"] = await login(client, "owner@example.com", "ownerpassword")
+    context.headers["user"] = await login(client, "user@example.com", "password")
+    response = await client.get("/products/1", headers=context.headers["user"])
+    context.menu = [product["id"] for product in response.json()["products"]]
+
+
+async def list_restaurants(client, context, rng):
+    return await client.get("/restaurants", params={"skip": rng.randrange(0, max(context.restaurants - 20, 1)), "limit": 20})
+
+async def get_restaurant(client, context, rng):
+    return await client.get(f"/restaurants/{rng.randint(1, context.restaurants)}")
+
+async def list_menu(client, context, rng):
+    return await client.get(f"/products/{rng.randint(1, context.restaurants)}", headers=context.headers["user"])
+
+async def list_products(client, context, rng):
+    return await client.get("/products", params={"skip": rng.randrange(0, 1000), "limit": 50}, headers=context.headers["admin"])
+
+async def create_order(client, context, rng):
+    products = rng.sample(context.menu, rng.randint(1, min(5, len(context.menu))))
+    response = await client.post("/orders", headers=context.headers["user"], json={
+        "customer_id": 2,
+        "restaurant_id": 1,
+        "products": products,
+        "quantity": [rng.randint(1, 3) for _ in products],
+    })
+    if response.status_code == 200:
+        context.orders.append(response.json()["id"])
+    return response
+
+async def update_order(client, context, rng):
+    order_id = rng.choice(context.orders) if context.orders else 1
+    return await client.put(f"/orders/{order_id}", params={"status": rng.choice(["completed", "canceled", "pending"])}, headers=context.headers["owner"])
+
+async def my_orders(client, context, rng):
+    return await client.get("/orders/me/1", headers=context.headers["user"])
+
+async def restaurant_report(client, context, rng):
+    return await client.get("/restaurants/1/report", headers=context.headers["owner"])
+
+async def list_users(client, context, rng):
+    return await client.get("/users", params={"skip": rng.randrange(0, max(context.users - 20, 1)), "limit": 20}, headers=context.headers["admin"])
+
+async def get_user(client, context, rng):
+    return await client.get(f"/users/{rng.randint(1, context.users)}", headers=context.headers["admin"])
+
+async def login_user(client, context, rng):
+    return await client.post("/login", json={"email": "user@example.com", "password": "password"})
+
+async def create_qrcode(client, context, rng):
+    return await client.post("/qrcodes", json={"restaurant_id": 1, "table_number": rng.randint(1, 80)}, headers=context.headers["owner"])
+
+
+# (route template, weight, request)
+MIXED = [
+    ("GET /restaurants", 20, list_restaurants),
+    ("GET /restaurants/{restaurant_id}", 15, get_restaurant),
+    ("GET /products/{restaurant_id}", 20, list_menu),
+    ("GET /products", 3, list_products),
+    ("POST /orders", 8, create_order),
+    ("PUT /orders/{order_id}", 3, update_order),
+    ("GET /orders/me/{restaurant_id}", 6, my_orders),
+    ("GET /restaurants/{restaurant_id}/report", 2, restaurant_report),
+    ("GET /users", 2, list_users),
+    ("GET /users/{user_id}", 2, get_user),
+    ("POST /login", 2, login_user),
+    ("POST /qrcodes", 2, create_qrcode),
+]
+
+WORKLOADS = {
+    "mixed": MIXED,
+    "read": [operation for operation in MIXED if operation[0].startswith("GET")],
+    "write": [operation for operation in MIXED if not operation[0].startswith("GET")],
+}
+
+
+def picker(workload, seed: int):
+    names = [name for name, _, _ in workload]
+    weights = [weight for _, weight, _ in workload]
+    requests = {name: request for name, _, request in workload}
+    rng = random.Random(seed)
+
+    def pick():
+        name = rng.choices(names, weights)[0]
+        return name, requests[name], rng
+    return pick
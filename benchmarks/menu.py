@@ -0,0 +1,89 @@
+""" python -m benchmarks.menu [products] [iterations]
+
+GET /products/{restaurant_id} and /products/{product_id} on a synthetic catalogue: the query, ORM rows and
+response models they ran before against the in-memory menu snapshots, plus the memory the snapshots hold
+per 10k products and what rebuilding them costs.
+"""
+import asyncio
+import sys
+import time
+import tracemalloc
+
+from benchmarks._setup import directory
+
+from sqlalchemy import select, func
+from src.services.SQLite.index import Base, async_engine, read_session
+from src.api.products.model import Product
+from src.api.products.index import ProductRead, product_page
+from src.services.cache.index import encode
+from src.services.catalog.index import MenuSnapshots
+from src.services.projection.index import project
+from src.services.seeder.index import seed_synthetic
+
+
+async def database_page(restaurant_id: int) -> bytes:
+    async with read_session() as conn:
+        stmt = select(Product).where(Product.restaurant_id == restaurant_id).options(project(Product, ProductRead))
+        return encode(await product_page(conn, stmt, restaurant_id, 0, 100, None))
+
+
+async def database_product(product_id: int) -> bytes:
+    async with read_session() as conn:
+        stmt = select(Product).where(Product.id == product_id).options(project(Product, ProductRead))
+        return ProductRead.model_validate((await conn.execute(stmt)).scalars().first()).model_dump_json().encode()
+
+
+async def measure(run, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        await run()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+async def main(products: int, iterations: int):
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    await seed_synthetic(restaurants=max(products // 200, 1), products=products, orders=0, customers=1)
+    async with read_session() as conn:
+        restaurant_id, size = (await conn.execute(
+            select(Product.restaurant_id, func.count()).group_by(Product.restaurant_id).order_by(func.count().desc()).limit(1))).one()
+        product_id = (await conn.execute(select(Product.id).where(Product.restaurant_id == restaurant_id).limit(1))).scalar()
+        restaurant_ids = (await conn.execute(select(Product.restaurant_id).distinct())).scalars().all()
+
+    menus = MenuSnapshots(ProductRead, 3600)
+
+    async def snapshot_page():
+        return (await menus.menu(restaurant_id)).offset_page(0, 100)
+
+    async def snapshot_product():
+        return await menus.product(product_id)
+
+    assert await snapshot_page() == await database_page(restaurant_id)
+    print(f"{products} products, restaurant {restaurant_id} has {size}, mean of {iterations} (us)")
+    print(f"{'':<28} {'database':>9} {'snapshot':>9}")
+    print(f"{'menu page of 100':<28} {await measure(lambda: database_page(restaurant_id), iterations):9.0f} {await measure(snapshot_page, iterations):9.1f}")
+    print(f"{'one product':<28} {await measure(lambda: database_product(product_id), iterations):9.0f} {await measure(snapshot_product, iterations):9.1f}")
+    print(f"{'rebuild after a write':<28} {'':>9} {await measure(lambda: menus.rebuild(restaurant_id), 20):9.0f}")
+
+    # Every menu loaded into an empty snapshot, timed, then again traced
+    menus = MenuSnapshots(ProductRead, 3600)
+    start = time.perf_counter()
+    for id in restaurant_ids:
+        await menus.menu(id)
+    elapsed = time.perf_counter() - start
+    menus = MenuSnapshots(ProductRead, 3600)
+    tracemalloc.start()
+    for id in restaurant_ids:
+        await menus.menu(id)
+    traced, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stats = menus.stats()
+    per_10k = 10000 / stats["products"]
+    print(f"all {stats['menus']} menus: {stats['bytes'] * per_10k / 1e6:.2f} MB held per 10k products "
+          f"({traced * per_10k / 1e6:.2f} MB traced while loading), built in {elapsed * per_10k:.2f} s per 10k")
+    await async_engine.dispose()
+    directory.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000, int(sys.argv[2]) if len(sys.argv) > 2 else 500))
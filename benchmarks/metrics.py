@@ -0,0 +1,81 @@
+""" python -m benchmarks.metrics [requests]
+
+Overhead of the /metrics instrumentation: the statement hooks on an engine executing a
+one-row query, and the middleware on GET /users/{user_id} served in process (best of five rounds),
+plus the bookkeeping alone, which is what remains once the noise of the first two is taken out.
+"""
+import asyncio
+import os
+import sys
+import time
+import timeit
+
+from benchmarks._setup import directory
+
+import httpx
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine
+import main
+import src.api.users.index as users
+from src.api.products.model import Product
+from src.api.users.model import User
+from src.services.auth.index import sign_jwt
+from src.services.metrics.index import Metrics, RequestStats, track_statements
+
+
+async def statements(engine, count: int) -> float:
+    stmt = select(Product.id).where(Product.id == 1)
+    async with engine.connect() as conn:
+        start = time.perf_counter()
+        for _ in range(count):
+            (await conn.execute(stmt)).all()
+        return (time.perf_counter() - start) / count * 1e6
+
+
+async def requests(app, count: int, headers: dict) -> float:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        start = time.perf_counter()
+        for _ in range(count):
+            (await client.get("/users/1", headers=headers)).raise_for_status()
+        return (time.perf_counter() - start) / count * 1e6
+
+
+async def main_(count: int):
+    await main.startup_event()
+    url = os.environ["ASYNC_ENGINE_PATH_DB"]
+    plain, tracked = create_async_engine(url), create_async_engine(url)
+    track_statements(tracked.sync_engine)
+
+    # Same routes and CORS without the metrics middleware, the statement hooks stay on the shared engines
+    bare = FastAPI(default_response_class=ORJSONResponse)
+    bare.add_middleware(CORSMiddleware, allow_origins=main.origins, allow_credentials=True, allow_methods=["*"], allow_headers=["*"])
+    bare.include_router(users.app)
+    token = sign_jwt(User(id=1, email="admin@admin.com", role="admin"))["token"]["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    rounds = [
+        (await statements(plain, count), await statements(tracked, count), await requests(bare, count, headers), await requests(main.app, count, headers))
+        for _ in range(5)
+    ]
+    statement_before, statement_after, request_before, request_after = (min(column) for column in zip(*rounds))
+
+    print(f"mean of {count} (us)   {'plain':>8} {'metrics':>8} {'overhead':>9}")
+    print(f"{'statement':<20} {statement_before:8.0f} {statement_after:8.0f} {statement_after - statement_before:9.0f}")
+    print(f"{'GET /users/1':<20} {request_before:8.0f} {request_after:8.0f} {request_after - request_before:9.0f}")
+
+    registry, stats = Metrics(10), RequestStats()
+    for bookkeeping, run in [
+        ("observe_statement", lambda: registry.observe_statement("SELECT 1", 0.0001)),
+        ("observe_request", lambda: registry.observe_request("GET", "/users/{user_id}", 200, 0.003, stats)),
+    ]:
+        print(f"{bookkeeping:<20} {timeit.timeit(run, number=100000) * 10:8.2f}")
+    await plain.dispose()
+    await tracked.dispose()
+    directory.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main_(int(sys.argv[1]) if len(sys.argv) > 1 else 1000))
@@ -0,0 +1,64 @@
+""" python -m benchmarks.nearby [restaurants] [iterations]
+
+GET /restaurants/nearby on synthetic restaurants scattered around twelve city centres:
+the R*Tree with planar candidates against loading the same bounding box over the plain
+latitude/longitude columns, both ranked by exact haversine distance.
+"""
+import asyncio
+import sys
+import time
+
+from benchmarks._setup import directory
+
+from sqlalchemy import select, func
+from src.services.SQLite.index import Base, async_engine, read_session
+from src.api.restaurants.model import Restaurant
+from src.api.restaurants.index import get_nearby_restaurants, rank_nearby, with_owner
+from src.services.seeder.index import seed_synthetic
+import src.services.geo.index as geo
+
+# (lat, lon, radius km): centre of Milano, outskirts of Roma, between two cities, open sea
+POINTS = [(45.4642, 9.1900, 1), (45.4642, 9.1900, 5), (41.95, 12.55, 10), (44.0, 10.0, 25), (39.0, 5.0, 50)]
+
+
+async def box_scan(lat: float, lon: float, radius: float):
+    """ Every restaurant in the box over the plain columns, ranked by exact distance in Python """
+    (min_lat, max_lat, min_lon, max_lon), = geo.bounding_boxes(lat, lon, radius)
+    async with read_session() as conn:
+        stmt = with_owner(select(Restaurant)).where(Restaurant.latitude.between(min_lat, max_lat), Restaurant.longitude.between(min_lon, max_lon))
+        candidates = [(restaurant, None) for restaurant in (await conn.execute(stmt)).scalars().all()]
+        return rank_nearby(lat, lon, radius, candidates)[:20]
+
+
+async def in_box(lat: float, lon: float, radius: float) -> int:
+    (min_lat, max_lat, min_lon, max_lon), = geo.bounding_boxes(lat, lon, radius)
+    async with read_session() as conn:
+        stmt = select(func.count()).where(Restaurant.latitude.between(min_lat, max_lat), Restaurant.longitude.between(min_lon, max_lon))
+        return (await conn.execute(stmt)).scalar()
+
+
+async def measure(run, iterations: int):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        rows = await run()
+    return (time.perf_counter() - start) / iterations * 1e3, len(rows)
+
+
+async def main(restaurants: int, iterations: int):
+    async_engine.echo = False
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    await seed_synthetic(restaurants=restaurants, products=restaurants, orders=0, customers=1)
+
+    print(f"{restaurants} restaurants, mean of {iterations} requests, limit 20 (ms)")
+    print(f"{'lat, lon, radius':<24} {'column box':>11} {'nearby':>8} {'in box':>8} {'returned':>9}")
+    for lat, lon, radius in POINTS:
+        scan_ms, _ = await measure(lambda: box_scan(lat, lon, radius), iterations)
+        nearby_ms, returned = await measure(lambda: get_nearby_restaurants(lat, lon, radius, 20), iterations)
+        print(f"{f'{lat}, {lon}, {radius} km':<24} {scan_ms:11.2f} {nearby_ms:8.2f} {await in_box(lat, lon, radius):8} {returned:9}")
+    await async_engine.dispose()
+    directory.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000, int(sys.argv[2]) if len(sys.argv) > 2 else 50))
@@ -0,0 +1,79 @@
+""" python -m benchmarks.order_writes [orders] [profile]
+
+200 (by default) orders submitted at once, the way a dinner rush reaches POST /orders: a commit per
+order against the group-commit write queue at a few window sizes. Latency is per order, from submit
+to committed; the database profile is "development" (rollback journal) or "production" (WAL).
+"""
+import asyncio
+import os
+import sys
+import time
+
+os.environ["DB_PROFILE"] = sys.argv[2] if len(sys.argv) > 2 else "production"
+from benchmarks._setup import directory
+
+import numpy as np
+from sqlalchemy import select
+from src.services.SQLite.index import Base, async_engine, read_session
+from src.api.users.model import User
+from src.api.products.model import Product
+from src.api.orders.index import OrderCreate, submit_order
+from src.services.seeder.index import seed_synthetic
+from src.services.writer.index import write_queue, ORDER_WRITE_BATCH_WINDOW_MS, ORDER_WRITE_BATCH_SIZE
+
+# (label, window in ms, batch size), window 0 is a transaction and a commit per order as before
+SETTINGS = [("commit per order", 0, 1), ("group, 2 ms, 16", 2, 16), ("group, 2 ms, 64", 2, 64), ("group, 5 ms, 256", 5, 256)]
+
+
+async def rush(orders):
+    async def one(order):
+        start = time.perf_counter()
+        try:
+            await submit_order(order)
+        except Exception:
+            # "database is locked" once busy_timeout runs out
+            return None
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*[one(order) for order in orders])
+    failed = sum(latency is None for latency in latencies)
+    return time.perf_counter() - start, np.array([latency for latency in latencies if latency is not None]) * 1e3, failed
+
+
+async def main(count: int):
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    await seed_synthetic(restaurants=20, products=400, orders=0, customers=50)
+    async with read_session() as conn:
+        products = (await conn.execute(select(Product.id, Product.restaurant_id))).all()
+        customers = (await conn.execute(select(User.id).limit(50))).scalars().all()
+
+    rng = np.random.default_rng(0)
+    orders = []
+    for i in range(count):
+        restaurant_id = products[rng.integers(len(products))][1]
+        menu = [id for id, owner in products if owner == restaurant_id]
+        picked = rng.choice(menu, size=min(3, len(menu)), replace=False).tolist()
+        orders.append(OrderCreate(customer_id=customers[i % len(customers)], restaurant_id=restaurant_id, products=picked, quantity=[1] * len(picked)))
+
+    print(f"{count} concurrent orders, {os.environ['DB_PROFILE']} profile (default window {ORDER_WRITE_BATCH_WINDOW_MS:g} ms, "
+          f"batch {ORDER_WRITE_BATCH_SIZE}), best of 3 rounds")
+    print(f"{'':<18} {'orders/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'batches':>8} {'failed':>7}")
+    for label, window, size in SETTINGS:
+        write_queue.window, write_queue.max_batch = window / 1000, size
+        best = None
+        for _ in range(3):
+            batches = write_queue.batches
+            elapsed, latencies, failed = await rush(orders)
+            if best is None or elapsed < best[0]:
+                best = (elapsed, latencies, failed, write_queue.batches - batches)
+        elapsed, latencies, failed, batches = best
+        print(f"{label:<18} {(count - failed) / elapsed:9.0f} {np.percentile(latencies, 50):8.1f} {np.percentile(latencies, 99):8.1f} {batches:8} {failed:7}")
+    await write_queue.shutdown()
+    await async_engine.dispose()
+    directory.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 200))
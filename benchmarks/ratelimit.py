@@ -0,0 +1,70 @@
+""" python -m benchmarks.ratelimit [clients] [iterations]
+
+Cost of the rate limit dependency per request: the bucket update alone for a known client, a new
+client evicting the least recently used one, and the whole dependency on a request keyed by IP and
+by bearer token (the token decode is cached, as it is on every authenticated route).
+"""
+import asyncio
+import sys
+import time
+from types import SimpleNamespace
+
+from benchmarks._setup import directory
+
+from fastapi import HTTPException, Request
+from src.services.auth.index import sign_jwt
+from src.services.ratelimit.index import RateLimit
+
+
+def scope(host: str, headers: list) -> dict:
+    return {"type": "http", "method": "GET", "path": "/", "headers": headers, "client": (host, 50000), "query_string": b""}
+
+
+async def measure(run, iterations: int) -> float:
+    start = time.perf_counter()
+    for i in range(iterations):
+        await run(i)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+async def main(clients: int, iterations: int):
+    # Never throttles, so every call takes the allowed path
+    limit = RateLimit("bench", f"{iterations * 10}/second", clients, 16)
+    keys = [f"ip:10.0.{i // 256 % 256}.{i % 256}" for i in range(clients)]
+    for key in keys:
+        limit.take(key, time.monotonic())
+
+    async def known(i):
+        limit.take(keys[i % clients], time.monotonic())
+
+    async def new(i):
+        limit.take(f"new:{i}", time.monotonic())
+
+    token = sign_jwt(SimpleNamespace(id=1, email="admin@admin.com", role="admin"))["token"]["access_token"]
+    by_ip = [Request(scope(f"10.1.{i // 256 % 256}.{i % 256}", [])) for i in range(1000)]
+    by_token = Request(scope("10.2.0.1", [(b"authorization", f"Bearer {token}".encode())]))
+
+    async def dependency_ip(i):
+        await limit(by_ip[i % 1000])
+
+    async def dependency_token(i):
+        await limit(by_token)
+
+    throttle = RateLimit("throttled", "1/hour", clients, 16)
+
+    async def throttled(i):
+        try:
+            await throttle(by_token)
+        except HTTPException:
+            pass
+
+    print(f"{clients} clients, mean of {iterations} calls (us)")
+    for name, run in [("take, known client", known), ("take, new client", new), ("dependency, by ip", dependency_ip),
+                      ("dependency, by token", dependency_token), ("dependency, 429", throttled)]:
+        print(f"{name:<24} {await measure(run, iterations):8.2f}")
+    print(limit.stats())
+    directory.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000, int(sys.argv[2]) if len(sys.argv) > 2 else 200000))
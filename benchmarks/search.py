@@ -0,0 +1,57 @@
+""" python -m benchmarks.search [products] [iterations]
+
+Menu search on a synthetic catalogue: the FTS5 index ranked with bm25 against the
+LIKE '%term%' scan over name and description it replaces.
+"""
+import asyncio
+import sys
+import time
+
+from benchmarks._setup import directory
+
+from sqlalchemy import select, or_
+from src.services.SQLite.index import Base, async_engine
+from src.api.products.model import Product
+from src.services.seeder.index import seed_synthetic
+import src.services.search.index as search
+
+QUERIES = ["pizza", "ragu", "tiramisu", "spaghetti carbonara", "pan"]
+
+
+def like_statement(q: str):
+    stmt = select(Product.id, Product.name).where(Product.visible == True)
+    for term in q.split():
+        stmt = stmt.where(or_(Product.name.ilike(f"%{term}%"), Product.description.ilike(f"%{term}%")))
+    return stmt.limit(20)
+
+
+async def like(conn, q: str):
+    return (await conn.execute(like_statement(q))).all()
+
+
+async def measure(run, iterations: int):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        rows = await run()
+    return (time.perf_counter() - start) / iterations * 1e3, len(rows)
+
+
+async def main(products: int, iterations: int):
+    async_engine.echo = False
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    await seed_synthetic(restaurants=max(products // 50, 1), products=products, orders=0, customers=1)
+
+    print(f"{products} products, mean of {iterations} queries, first 20 hits (ms)")
+    print(f"{'query':<22} {'like':>8} {'fts':>8} {'like hits':>10} {'fts hits':>9}")
+    async with async_engine.connect() as conn:
+        for q in QUERIES:
+            like_ms, like_hits = await measure(lambda: like(conn, q), iterations)
+            fts_ms, fts_hits = await measure(lambda: search.search_products(conn, q), iterations)
+            print(f"{q:<22} {like_ms:8.2f} {fts_ms:8.2f} {like_hits:10} {fts_hits:9}")
+    await async_engine.dispose()
+    directory.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000, int(sys.argv[2]) if len(sys.argv) > 2 else 50))
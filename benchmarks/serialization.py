@@ -0,0 +1,104 @@
+""" python -m benchmarks.serialization [iterations]
+
+Cost of one 100 row list response, query and serialization measured apart:
+full ORM rows through jsonable_encoder and JSONResponse (the handlers without response
+models) against projected rows through the response models and ORJSONResponse.
+"""
+import asyncio
+import sys
+import time
+from datetime import datetime
+from typing import List
+
+from benchmarks._setup import directory, path
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from sqlalchemy import select, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, sessionmaker
+from src.services.SQLite.index import Base, create_engines
+from src.api.users.model import User
+from src.api.restaurants.model import Restaurant
+from src.api.products.model import Product
+from src.api.orders.model import Order
+from src.api.orderItems.model import order_items
+from src.api.restaurants.index import RestaurantRead, with_owner
+from src.api.products.index import ProductRead
+from src.api.orders.index import OrderSummary, with_lines
+from src.services.projection.index import project
+
+ROWS = 100
+
+
+async def prepare(engine):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(insert(User).values(id=1, name="Owner", surname="Bench", email="owner@bench", hashed_password="$pbkdf2-sha256$29000$" + "x" * 64, role="owner"))
+        await conn.execute(insert(Restaurant), [
+            {"id": i, "name": f"Restaurant {i}", "address": f"{i} Main St", "city": "City", "country": "Country", "postal_code": "12345",
+             "email": f"r{i}@bench", "description": "A restaurant used by the serialization benchmark", "owner_id": 1, "status": "open"}
+            for i in range(1, ROWS + 1)
+        ])
+        await conn.execute(insert(Product), [
+            {"id": i, "name": f"Product {i}", "description": "A product used by the serialization benchmark", "price": 100 + i, "restaurant_id": 1}
+            for i in range(1, ROWS + 1)
+        ])
+        await conn.execute(insert(Order), [
+            {"id": i, "customer_id": 1, "restaurant_id": 1, "status": "completed", "total_price": 300 + i, "created_at": datetime.now()}
+            for i in range(1, ROWS + 1)
+        ])
+        await conn.execute(insert(order_items), [
+            {"order_id": i, "product_id": (i + line) % ROWS + 1, "name": f"Product {(i + line) % ROWS + 1}", "quantity": 1, "price": 100 + line}
+            for i in range(1, ROWS + 1) for line in range(3)
+        ])
+
+
+CASES = [
+    ("restaurants", select(Restaurant).options(joinedload(Restaurant.owner)), with_owner(select(Restaurant)), RestaurantRead),
+    ("products", select(Product), select(Product).options(project(Product, ProductRead)), ProductRead),
+    ("orders", select(Order).options(joinedload(Order.products)), with_lines(select(Order)), OrderSummary),
+]
+
+
+async def measure(session_factory, stmt, encode, iterations: int):
+    query = serialization = 0.0
+    for _ in range(iterations):
+        async with session_factory() as session:
+            start = time.perf_counter()
+            rows = (await session.execute(stmt.limit(ROWS))).unique().scalars().all()
+            middle = time.perf_counter()
+            await encode(rows)
+            query += middle - start
+            serialization += time.perf_counter() - middle
+    return query / iterations * 1e6, serialization / iterations * 1e6
+
+
+async def main(iterations: int):
+    _, engine, _ = create_engines(f"sqlite:///{path}", f"sqlite+aiosqlite:///{path}", "development")
+    engine.echo = False
+    await prepare(engine)
+    session_factory = sessionmaker(bind=engine, expire_on_commit=False, class_=AsyncSession)
+
+    print(f"{ROWS} rows per response, mean of {iterations} responses (us)")
+    print(f"{'list':<12} {'query before':>13} {'query after':>12} {'encode before':>14} {'encode after':>13} {'saved':>8}")
+    for name, before_stmt, after_stmt, schema in CASES:
+        field = create_model_field(f"Response_{name}", List[schema], mode="serialization")
+
+        async def before(rows):
+            return JSONResponse(await serialize_response(response_content=rows)).body
+
+        async def after(rows, field=field):
+            return ORJSONResponse(await serialize_response(field=field, response_content=rows)).body
+
+        query_before, encode_before = await measure(session_factory, before_stmt, before, iterations)
+        query_after, encode_after = await measure(session_factory, after_stmt, after, iterations)
+        saved = query_before + encode_before - query_after - encode_after
+        print(f"{name:<12} {query_before:13.0f} {query_after:12.0f} {encode_before:14.0f} {encode_after:13.0f} {saved:8.0f}")
+    await engine.dispose()
+    directory.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 200))
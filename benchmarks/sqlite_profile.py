@@ -0,0 +1,81 @@
+""" python -m benchmarks.sqlite_profile [seconds] [readers] [writers]
+
+Read throughput while writers keep committing orders, for the development engine
+(one engine, default pragmas) and the production profile (WAL, read pool, single writer).
+"""
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime
+
+from benchmarks._setup import directory
+
+from sqlalchemy import select, insert, func
+from src.services.SQLite.index import Base, create_engines
+from src.api.users.model import User
+from src.api.restaurants.model import Restaurant
+from src.api.orders.model import Order
+
+
+async def prepare(engine):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(insert(User).values(id=1, name="Owner", surname="Bench", email="owner@bench", hashed_password="-", role="owner"))
+        await conn.execute(insert(Restaurant).values(id=1, name="Bench", address="-", city="-", country="-", email="bench@bench", owner_id=1))
+        await conn.execute(insert(Order), [
+            {"customer_id": 1, "restaurant_id": 1, "status": "completed", "total_price": i, "created_at": datetime.now()}
+            for i in range(20000)
+        ])
+
+
+async def writer(engine, deadline, counts):
+    while time.perf_counter() < deadline:
+        try:
+            async with engine.begin() as conn:
+                await conn.execute(insert(Order).values(customer_id=1, restaurant_id=1, total_price=1, created_at=datetime.now()))
+            counts["writes"] += 1
+        except Exception:
+            counts["write_errors"] += 1
+
+
+async def reader(engine, deadline, counts):
+    stmt = select(Order.id, Order.total_price).where(Order.restaurant_id == 1).order_by(Order.id.desc()).limit(100)
+    while time.perf_counter() < deadline:
+        try:
+            async with engine.connect() as conn:
+                (await conn.execute(stmt)).all()
+                await conn.execute(select(func.count(Order.id)))
+            counts["reads"] += 1
+        except Exception:
+            counts["read_errors"] += 1
+
+
+async def run(profile, seconds, readers, writers):
+    path = os.path.join(directory.name, f"bench_{profile}.db")
+    sync_engine, write_engine, read_engine = create_engines(f"sqlite:///{path}", f"sqlite+aiosqlite:///{path}", profile)
+    for engine in (sync_engine, write_engine, read_engine):
+        engine.echo = False
+    await prepare(write_engine)
+
+    counts = {"reads": 0, "read_errors": 0, "writes": 0, "write_errors": 0}
+    deadline = time.perf_counter() + seconds
+    await asyncio.gather(
+        *(reader(read_engine, deadline, counts) for _ in range(readers)),
+        *(writer(write_engine, deadline, counts) for _ in range(writers)),
+    )
+    print(f"{profile:<12} reads {counts['reads'] / seconds:8.1f}/s  writes {counts['writes'] / seconds:7.1f}/s  "
+          f"read errors {counts['read_errors']:4}  write errors {counts['write_errors']:4}")
+    for engine in {write_engine, read_engine}:
+        await engine.dispose()
+
+
+async def main(seconds, readers, writers):
+    print(f"{readers} readers and {writers} writers for {seconds}s")
+    for profile in ("development", "production"):
+        await run(profile, seconds, readers, writers)
+    directory.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(*(int(value) for value in sys.argv[1:4]) if len(sys.argv) > 3 else (5, 8, 4)))
@@ -1,4 +1,8 @@
+import time
+BOOT_STARTED = time.perf_counter()
+
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 import src.services.SQLite.index as db
 import src.api.users.index as users
@@ -7,6 +11,10 @@ import src.api.orders.index as orders
 import src.api.products.index as products
 import src.api.auth.index as auth
 import src.api.qrcodes.index as qrcodes
+import src.api.reports.index as reports
+import src.api.search.index as search
+import src.api.metrics.index as metrics
+from src.services.metrics.index import MetricsMiddleware, metrics as registry
 
 import src.services.QRCode.index as qr_code
 
@@ -17,11 +25,15 @@ import os
 from dotenv import load_dotenv 
 load_dotenv() 
 
+# "warm" keeps the database across restarts, upgrading the schema when needed and seeding only
+# an empty one. "reset" drops and reseeds everything on every boot
+STARTUP_MODE = os.getenv("STARTUP_MODE", "warm")
+
 origins = [
     os.getenv("FRONTEND_URL", "https://python-final-project-front-end.vercel.app"),
 ]
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -30,6 +42,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Outermost, so the latency includes the other middlewares
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(users.app)
 app.include_router(restaurants.app)
@@ -37,16 +51,53 @@ app.include_router(products.app)
 app.include_router(orders.app)
 app.include_router(auth.app)
 app.include_router(qrcodes.app)
+app.include_router(reports.app)
+app.include_router(search.app)
+app.include_router(metrics.app)
 
-from src.services.seeder.index import seed_data
+from src.services.seeder.index import seed_data, seed_if_empty
+import src.services.passwords.index as passwords
+import src.services.revocation.index as revocation
+from src.services.idempotency.index import idempotency
+from src.services.writer.index import write_queue
+
+IMPORTED = time.perf_counter()
 
 
 async def startup_event():
-    # Reset the database
-    await db.reset_database()
-    # Seed the database
-    await seed_data()
+    started = time.perf_counter()
+    if STARTUP_MODE == "reset":
+        await db.reset_database()
+        schema = "reset"
+    else:
+        added = await db.prepare_database()
+        schema = f"added {', '.join(added)}" if added else "current"
+    await revocation.denylist.start()
+    await idempotency.start()
+    write_queue.start()
+    prepared = time.perf_counter()
+    if STARTUP_MODE == "reset":
+        await seed_data()
+        seeded = True
+    else:
+        seeded = await seed_if_empty()
+    ready = time.perf_counter()
+
+    # Seconds from the first line of this module, exposed as startup_* gauges at /metrics
+    registry.startup.update({
+        "imports_seconds": IMPORTED - BOOT_STARTED,
+        "database_seconds": prepared - started,
+        "seed_seconds": ready - prepared,
+        "ready_seconds": ready - BOOT_STARTED,
+    })
+    print(f"Ready in {(ready - BOOT_STARTED) * 1000:.0f} ms (imports {(IMPORTED - BOOT_STARTED) * 1000:.0f} ms, "
+          f"database {(prepared - started) * 1000:.0f} ms, {schema}, seed {(ready - prepared) * 1000:.0f} ms{'' if seeded else ', skipped'})")
 
 app.add_event_handler("startup", startup_event)
+app.add_event_handler("shutdown", passwords.pool.shutdown)
+app.add_event_handler("shutdown", qr_code.shutdown)
+app.add_event_handler("shutdown", revocation.denylist.shutdown)
+app.add_event_handler("shutdown", idempotency.shutdown)
+app.add_event_handler("shutdown", write_queue.shutdown)
 
 
@@ -3,9 +3,12 @@ from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from sqlalchemy.future import select
 from src.services.SQLite.index import async_session
 from src.api.users.model import User
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
+from typing import Optional
 import src.services.auth.index as auth
-from passlib.hash import pbkdf2_sha256 
+import src.services.passwords.index as passwords
+import src.services.revocation.index as revocation
+import src.services.ratelimit.index as ratelimit
 
 app = APIRouter()
 auth_scheme = HTTPBearer()
@@ -15,7 +18,26 @@ class LoginRequest(BaseModel):
     email: str
     password: str
 
-@app.post("/login", tags=["auth"])
+class AccessToken(BaseModel):
+    access_token: str
+    expires_in: int
+
+class TokenUser(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    name: str
+    surname: str
+    email: str
+    role: str
+    profile_picture: Optional[str] = None
+
+class TokenResponse(BaseModel):
+    token: AccessToken
+    token_type: str
+    user: TokenUser
+
+@app.post("/login", dependencies=[Depends(ratelimit.login_limit)], tags=["auth"], response_model=TokenResponse)
 async def login(login_request: LoginRequest):
     async with async_session() as conn:
         query = select(User).where(User.email == login_request.email)
@@ -25,17 +47,36 @@ async def login(login_request: LoginRequest):
         if user is None:
             raise HTTPException(status_code=404, detail="User not found")
 
-        if not pbkdf2_sha256.verify(login_request.password, user.hashed_password):
+        valid, rehashed_password = await passwords.verify_password(login_request.password, user.hashed_password)
+        if not valid:
             raise HTTPException(status_code=400, detail="Incorrect email or password")
 
+        if rehashed_password:
+            user.hashed_password = rehashed_password
+            await conn.commit()
+
         return auth.sign_jwt(user)
     
 
-@app.get("/logout", dependencies=[Depends(auth.JWTBearer())],  tags=["auth"])
-async def logout():
+@app.get("/logout", tags=["auth"])
+async def logout(token: dict = Depends(auth.JWTBearer())):
+    await revocation.denylist.revoke(token["jti"], token["expires"], token["id"])
     return {"message": "Logged out"}
 
 
+class RevokeRequest(BaseModel):
+    token: str
+
+@app.post("/revoke", dependencies=[Depends(auth.admin_required)], tags=["auth"])
+async def revoke(revoke_request: RevokeRequest):
+    """ Revoke someone else's access token, e.g. one that leaked """
+    payload = auth.decode_jwt(revoke_request.token)
+    if not payload:
+        raise HTTPException(status_code=400, detail="Invalid token or expired token.")
+    await revocation.denylist.revoke(payload["jti"], payload["expires"], payload["id"])
+    return {"message": "Token revoked"}
+
+
 class RegisterRequest(BaseModel):
     email: str
     password: str
@@ -44,7 +85,7 @@ class RegisterRequest(BaseModel):
     email: str
     confirm_password: str
 
-@app.post("/register", tags=["auth"])
+@app.post("/register", dependencies=[Depends(ratelimit.login_limit)], tags=["auth"], response_model=TokenResponse)
 async def register(RegisterRequest: RegisterRequest):
     if RegisterRequest.password != RegisterRequest.confirm_password:
         raise HTTPException(status_code=400, detail="Passwords do not match")
@@ -58,7 +99,7 @@ async def register(RegisterRequest: RegisterRequest):
         if existing_user:
             raise HTTPException(status_code=400, detail="Email already exists")
         
-        hashed_password = pbkdf2_sha256.hash(RegisterRequest.password)
+        hashed_password = await passwords.hash_password(RegisterRequest.password)
 
         print(RegisterRequest)
         
@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Integer, String, Float, DateTime
+from src.services.SQLite.index import Base
+from datetime import datetime
+
+class RevokedToken(Base):
+    """ Denylist of access tokens by jti, a row is useless once the token has expired and is purged then """
+    __tablename__ = 'revoked_tokens'
+    # Ids are never reused, so other workers can pick up new rows with id > the last one they saw
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    jti = Column(String, unique=True, nullable=False)
+    expires = Column(Float, index=True, nullable=False)  # "expires" claim of the token, epoch seconds
+    user_id = Column(Integer, nullable=True)
+    revoked_at = Column(DateTime, default=datetime.now)
@@ -0,0 +1,39 @@
+import hmac
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import PlainTextResponse
+import src.services.metrics.index as metrics
+import src.services.auth.index as auth
+import src.services.ownership.index as ownership
+import src.services.passwords.index as passwords
+import src.services.QRCode.index as qr_code
+from src.services.cache.index import catalog_cache
+from src.services.broker.index import broker
+import src.services.revocation.index as revocation
+import src.services.ratelimit.index as ratelimit
+from src.services.idempotency.index import idempotency
+from src.services.writer.index import write_queue
+from src.api.products.index import menus
+
+app = APIRouter()
+
+# Exported as <name>_<key> gauges next to the request metrics
+COMPONENTS = {
+    "jwt_cache": auth.token_cache.stats,
+    "catalog_cache": catalog_cache.stats,
+    "menu_snapshots": menus.stats,
+    "ownership_index": ownership.index.stats,
+    "qrcode_cache": qr_code.cache.stats,
+    "password_pool": passwords.pool.stats,
+    "order_feed": broker.stats,
+    "token_denylist": revocation.denylist.stats,
+    "idempotency": idempotency.stats,
+    "order_writes": write_queue.stats,
+    "startup": lambda: metrics.metrics.startup,
+    **{f"rate_limit_{name}": limit.stats for name, limit in ratelimit.limits.items()},
+}
+
+@app.get("/metrics", tags=["metrics"], response_class=PlainTextResponse)
+async def get_metrics(request: Request):
+    if metrics.METRICS_TOKEN and not hmac.compare_digest(request.headers.get("authorization", ""), f"Bearer {metrics.METRICS_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return Response(metrics.metrics.render(COMPONENTS), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, ForeignKey, DateTime, Table
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Table
+from sqlalchemy.orm import relationship, synonym
 from src.services.SQLite.index import Base
 from datetime import datetime
 
@@ -7,8 +8,23 @@ order_items = Table(
     Base.metadata,
     Column('order_id', Integer, ForeignKey('orders.id'), primary_key=True),
     Column('product_id', Integer, ForeignKey('products.id'), primary_key=True),
+    Column('name', String, nullable=True),  # Product name when the order was placed
     Column('quantity', Integer, nullable=False, default=1),
     Column('price', Integer, nullable=False),
     Column('created_at', DateTime, default=datetime.now),
     Column('updated_at', DateTime, default=datetime.now, onupdate=datetime.now)
-)
\ No newline at end of file
+)
+
+class OrderItem(Base):
+    """ One line of an order, name and price are what the customer saw and paid even if the product changes later """
+    __table__ = order_items
+
+    unit_price = synonym('price')
+
+    # Relationships
+    order = relationship("Order", back_populates="lines")
+    product = relationship("Product")
+
+    @property
+    def total(self) -> int:
+        return self.quantity * self.price
@@ -1,12 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import select, update, delete, and_
-from pydantic import BaseModel
-from src.services.SQLite.index import async_session
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, WebSocket, WebSocketDisconnect, WebSocketException, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, update, delete, and_, func
+from pydantic import BaseModel, ConfigDict
+from src.services.SQLite.index import read_session
 from src.api.orders.model import Order
-from src.api.products.model import Product
 from src.api.restaurants.model import Restaurant
+from src.api.orderItems.model import order_items, OrderItem
 import src.services.auth.index as auth
+import src.services.reports.index as reports
+import src.services.analytics.index as analytics
+import src.services.cart.index as cart
+import src.services.pagination.index as pagination
+import src.services.export.index as export
+import src.services.broker.index as broker
+import src.services.ratelimit.index as ratelimit
+import src.services.idempotency.index as idempotency
+from src.services.writer.index import write_queue
+from src.services.ownership.index import Ownership, ownership_required
+from src.services.projection.index import project
 from sqlalchemy.orm import joinedload
+from typing import List, Optional, Tuple, Union
+from datetime import date, datetime
 
 app = APIRouter()
 
@@ -16,135 +30,234 @@ class OrderCreate(BaseModel):
     quantity: list[int]
     restaurant_id: int
 
-@app.post("/orders", tags=["orders"])
-async def create_order(order: OrderCreate, token: dict = Depends(auth.JWTBearer())):
-    async with async_session() as session:
-        new_order = Order(customer_id=order.customer_id , restaurant_id=order.restaurant_id)
-
-        for product_id, quantity in zip(order.products, order.quantities):
-            stmt = select(Product).where(Product.id == product_id)
-            result = await session.execute(stmt)
-            product = result.scalar_one_or_none()
-            if not product:
-                raise HTTPException(status_code=404, detail=f"Product with ID {product_id} not found")
-            
-            new_order.products.append(product)
-            new_order.total_price += product.price * quantity
-
-        session.add(new_order)
-        await session.commit()
-        return {"id": new_order.id, "message": "Order created successfully"}
+class OrderSummaryLine(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    product_id: int
+    name: Optional[str] = None
+    quantity: int
+    unit_price: int
+
+class OrderLine(OrderSummaryLine):
+    total: int
+
+class OrderCreated(BaseModel):
+    id: int
+    message: str
+    status: str
+    total_price: int
+    products: List[OrderLine]
+
+class OrderSummary(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    customer_id: int
+    restaurant_id: int
+    status: str
+    total_price: int
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    lines: List[OrderSummaryLine] = []
+
+class OrderPage(BaseModel):
+    limit: int
+    next: Optional[str]
+    prev: Optional[str]
+    total: Optional[int] = None
+    orders: List[OrderSummary]
+
+def with_lines(stmt):
+    """ Orders and their lines in one join, names and prices come from the lines so products are not read """
+    return stmt.options(project(Order, OrderSummary), joinedload(Order.lines).options(project(OrderItem, OrderSummaryLine, "price")))
+
+async def place_order(session, order: OrderCreate, key: Optional[idempotency.Key] = None) -> Tuple[Order, List[cart.CartLine], dict]:
+    """ Writes the order in the write queue's session, the queue commits """
+    lines = await cart.price_cart(session, order.restaurant_id, order.products, order.quantity)
+
+    new_order = Order(customer_id=order.customer_id, restaurant_id=order.restaurant_id, total_price=sum(line.total for line in lines))
+    session.add(new_order)
+    await session.flush()
+
+    await cart.insert_order_lines(session, new_order.id, lines)
+    await reports.record_order_change(session, new_order, None, new_order.status, [line.as_tuple() for line in lines])
+    created = {
+        "id": new_order.id,
+        "message": "Order created successfully",
+        "status": new_order.status,
+        "total_price": new_order.total_price,
+        "products": [line.to_dict() for line in lines],
+    }
+    if key is not None:
+        idempotency.idempotency.record(session, key, created)
+    return new_order, lines, created
+
+async def submit_order(order: OrderCreate, key: Optional[idempotency.Key] = None) -> dict:
+    new_order, lines, created = await write_queue.submit(lambda session: place_order(session, order, key))
+    analytics.invalidate(new_order.restaurant_id)
+    broker.order_created(new_order, lines)
+    return created
+
+@app.post("/orders", tags=["orders"], response_model=OrderCreated)
+async def create_order(order: OrderCreate, token: dict = Depends(auth.JWTBearer()),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
+    """ With an Idempotency-Key a retry returns the first response (Idempotent-Replayed: true) instead of a second order """
+    if idempotency_key is None:
+        return await submit_order(order)
+    key = idempotency.Key(token["id"], idempotency_key, order.model_dump_json().encode())
+    return await idempotency.idempotency.run(key, lambda: submit_order(order, key))
     
-@app.get("/orders", tags=["orders"])
-async def get_orders(skip: int = 0, limit: int = 100, token: dict = Depends(auth.admin_required)):
-    async with async_session() as conn:
-        stmt = select(Order).offset(skip).limit(limit).options(joinedload(Order.products))
-        result = await conn.execute(stmt)
-        orders = result.unique().scalars().all()
-        return orders
+@app.get("/orders", tags=["orders"], response_model=Union[List[OrderSummary], OrderPage])
+async def get_orders(skip: int = 0, limit: int = 100, cursor: Optional[str] = None, include_total: bool = False, token: dict = Depends(auth.admin_required)):
+    async with read_session() as conn:
+        stmt = with_lines(select(Order))
+        if cursor is None:
+            result = await conn.execute(stmt.offset(skip).limit(limit))
+            orders = result.unique().scalars().all()
+            return orders
 
-@app.get("/orders/{restaurant_id}", tags=["orders"])
-async def get_orders_of_restaurant(restaurant_id: int, token: dict = Depends(auth.owner_or_admin_required)):
-    async with async_session() as conn:
-        stmt_restaurant = select(Restaurant).where(_and(Restaurant.owner_id == token["id"], Restaurant.id == restaurant_id))
-        result_restaurant = await conn.execute(stmt_restaurant)
-        restaurant = result_restaurant.scalar_one_or_none()
-        if not restaurant:
-            raise HTTPException(status_code=404, detail="Restaurant not found")
+        orders, next_cursor, prev_cursor = await pagination.keyset_page(conn, stmt, [Order.created_at, Order.id], limit, cursor)
+        page = {"limit": limit, "next": next_cursor, "prev": prev_cursor, "orders": orders}
+        if include_total:
+            page["total"] = (await conn.execute(select(func.count(Order.id)))).scalar()
+        return page
+
+@app.get("/orders/export", dependencies=[Depends(ratelimit.order_lists_limit)], tags=["orders"])
+async def export_orders(format: str = "ndjson", restaurant_id: Optional[int] = None, start: Optional[date] = None, end: Optional[date] = None, ownership: Ownership = Depends(ownership_required)):
+    if format not in export.FORMATS:
+        raise HTTPException(status_code=400, detail="Invalid format, expected ndjson or csv")
+    if start and end and end < start:
+        raise HTTPException(status_code=400, detail="end must not be before start")
 
-        stmt = select(Order).where(Product.restaurant_id == restaurant_id).options(joinedload(Order.products))
+    if restaurant_id is not None:
+        ownership.require(restaurant_id, "You are not authorized to export these orders")
+        restaurant_ids = [restaurant_id]
+    else:
+        restaurant_ids = None if ownership.is_admin else list(ownership.restaurant_ids)
+
+    stmt = export.export_statement(restaurant_ids, start, end)
+    body = export.stream_ndjson(stmt) if format == "ndjson" else export.stream_csv(stmt)
+    return StreamingResponse(body, media_type=export.FORMATS[format],
+                             headers={"Content-Disposition": f'attachment; filename="orders.{format}"'})
+
+@app.get("/orders/{restaurant_id}", dependencies=[Depends(ratelimit.order_lists_limit)], tags=["orders"], response_model=List[OrderSummary])
+async def get_orders_of_restaurant(restaurant_id: int, ownership: Ownership = Depends(ownership_required)):
+    ownership.require(restaurant_id, "You are not authorized to view these orders")
+    async with read_session() as conn:
+        stmt = with_lines(select(Order).where(Order.restaurant_id == restaurant_id))
         result = await conn.execute(stmt)
         orders = result.unique().scalars().all()
         return orders
     
-@app.get("/orders/{order_id}", tags=["orders"])
-async def get_order(order_id: int, token: dict = Depends(auth.owner_or_admin_required)):
-    async with async_session() as conn:
-        if token["role"] == "owner":
-            stmt_restaurant = select(Restaurant).where(Restaurant.owner_id == token["id"])
-            result_restaurant = await conn.execute(stmt_restaurant)
-            restaurants = result_restaurant.scalars().all()
-            if not restaurants:
-                raise HTTPException(status_code=404, detail="No restaurants found for this owner")
-
-            stmt_order = select(Order).where(Order.id == order_id).options(joinedload(Order.products))
-            result_order = await conn.execute(stmt_order)
-            order = result_order.scalar_one_or_none()
-            if order is None:
-                raise HTTPException(status_code=404, detail="Order not found")
-
-            if order.restaurant_id not in [restaurant.id for restaurant in restaurants]:
-                raise HTTPException(status_code=403, detail="You are not authorized to view this order")
-
-        elif token["role"] == "user":
-            stmt = select(Order).where(Order.id == order_id)
-            result = await conn.execute(stmt)
-            order = result.scalars().first()
-            if order is None:
-                raise HTTPException(status_code=404, detail="Order not found")
-            if order.customer_id != token["id"]:
-                raise HTTPException(status_code=403, detail="You are not authorized to view this order")
-        
-        stmt = select(Order).where(Order.id == order_id).options(joinedload(Order.products))
+@app.get("/orders/{order_id}", tags=["orders"], response_model=OrderSummary)
+async def get_order(order_id: int, ownership: Ownership = Depends(ownership_required)):
+    ownership.require_restaurants()
+
+    async with read_session() as conn:
+        stmt = with_lines(select(Order).where(Order.id == order_id))
         result = await conn.execute(stmt)
-        order = result.scalars().first()
+        order = result.unique().scalars().first()
         if order is None:
             raise HTTPException(status_code=404, detail="Order not found")
+        ownership.require(order.restaurant_id, "You are not authorized to view this order")
         return order
     
 @app.put("/orders/{order_id}", tags=["orders"])
-async def update_order(order_id: int, status: str, token: dict = Depends(auth.owner_or_admin_required)):
-    async with async_session() as conn:
-        stmt_restaurant = select(Restaurant).where(Restaurant.owner_id == token["id"])
-        result_restaurant = await conn.execute(stmt_restaurant)
-        restaurants = result_restaurant.scalars().all()
-        if not restaurants:
-            raise HTTPException(status_code=404, detail="No restaurants found for this owner")
-
-        stmt_order = select(Order).where(Order.id == order_id).options(joinedload(Order.products))
+async def update_order(order_id: int, status: str, ownership: Ownership = Depends(ownership_required)):
+    if status not in ["pending", "completed", "canceled"]:
+        raise HTTPException(status_code=400, detail="Invalid status")
+    ownership.require_restaurants()
+
+    async def change_status(conn):
+        stmt_order = select(Order).where(Order.id == order_id)
         result_order = await conn.execute(stmt_order)
         order = result_order.scalar_one_or_none()
         if order is None:
             raise HTTPException(status_code=404, detail="Order not found")
 
-        if order.restaurant_id not in [restaurant.id for restaurant in restaurants]:
-            raise HTTPException(status_code=403, detail="You are not authorized to update this order")
-        
+        ownership.require(order.restaurant_id, "You are not authorized to update this order")
+
+        old_status = order.status
         stmt = update(Order).where(Order.id == order_id).values(status=status)
         await conn.execute(stmt)
-        await conn.commit()
-        return {"message": "Order updated successfully"}
+        await reports.record_order_change(conn, order, old_status, status)
+        return order
+
+    order = await write_queue.submit(change_status)
+    analytics.invalidate(order.restaurant_id)
+    broker.order_updated(order, status)
+    return {"message": "Order updated successfully"}
 
 @app.delete("/orders/{order_id}", tags=["orders"])
-async def delete_order(order_id: int, token: dict = Depends(auth.owner_or_admin_required)):
-    async with async_session() as conn:
-        stmt_restaurant = select(Restaurant).where(Restaurant.owner_id == token["id"])
-        result_restaurant = await conn.execute(stmt_restaurant)
-        restaurants = result_restaurant.scalars().all()
-        if not restaurants:
-            raise HTTPException(status_code=404, detail="No restaurants found for this owner")
-
-        stmt_order = select(Order).where(Order.id == order_id).options(joinedload(Order.products))
+async def delete_order(order_id: int, ownership: Ownership = Depends(ownership_required)):
+    ownership.require_restaurants()
+
+    async def remove(conn):
+        stmt_order = select(Order).where(Order.id == order_id)
         result_order = await conn.execute(stmt_order)
         order = result_order.scalar_one_or_none()
         if order is None:
             raise HTTPException(status_code=404, detail="Order not found")
 
-        if order.restaurant_id not in [restaurant.id for restaurant in restaurants]:
-            raise HTTPException(status_code=403, detail="You are not authorized to delete this order")
+        ownership.require(order.restaurant_id, "You are not authorized to delete this order")
         
+        await reports.record_order_change(conn, order, order.status, None)
+        await conn.execute(delete(order_items).where(order_items.c.order_id == order_id))
         stmt = delete(Order).where(Order.id == order_id)
         await conn.execute(stmt)
-        await conn.commit()
-        return {"message": "Order deleted successfully"}
+        return order
+
+    order = await write_queue.submit(remove)
+    analytics.invalidate(order.restaurant_id)
+    broker.order_deleted(order)
+    return {"message": "Order deleted successfully"}
     
-@app.get("/orders/me/{restaurant_id}", tags=["orders"])
+@app.get("/orders/me/{restaurant_id}", dependencies=[Depends(ratelimit.order_lists_limit)], tags=["orders"], response_model=List[OrderSummary])
 async def get_my_orders(restaurant_id: int, token: dict = Depends(auth.JWTBearer())):
-    async with async_session() as conn:
+    async with read_session() as conn:
         print(token["id"])
-        stmt = select(Order).where(
+        stmt = with_lines(select(Order).where(
             and_(Order.restaurant_id == restaurant_id, Order.customer_id == token["id"])
-        ).options(joinedload(Order.products))        
+        ))        
         result = await conn.execute(stmt)
         orders = result.unique().scalars().all()
         return orders
+
+async def check_feed_access(restaurant_id: int, ownership: Ownership):
+    if not ownership.is_admin:
+        ownership.require(restaurant_id, "You are not authorized to follow these orders")
+        return
+    async with read_session() as conn:
+        result = await conn.execute(select(Restaurant.id).where(Restaurant.id == restaurant_id))
+        if result.scalar_one_or_none() is None:
+            raise HTTPException(status_code=404, detail="Restaurant not found")
+
+@app.get("/restaurants/{restaurant_id}/orders/events", tags=["orders"])
+async def get_order_events(restaurant_id: int, request: Request, last_event_id: Optional[str] = None, ownership: Ownership = Depends(ownership_required)):
+    """ Server-Sent Events of new, updated and deleted orders, EventSource resumes with Last-Event-ID """
+    await check_feed_access(restaurant_id, ownership)
+    last_event_id = request.headers.get("last-event-id") or last_event_id
+
+    async def events():
+        yield "retry: 2000\n\n"
+        async for event in broker.broker.stream(restaurant_id, last_event_id):
+            yield ": ping\n\n" if event is None else event.sse()
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.websocket("/restaurants/{restaurant_id}/orders/ws")
+async def order_events_ws(websocket: WebSocket, restaurant_id: int, last_event_id: Optional[str] = None, token: dict = Depends(auth.websocket_owner_or_admin_required)):
+    ownership = await ownership_required(token)
+    try:
+        await check_feed_access(restaurant_id, ownership)
+    except HTTPException as error:
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason=error.detail)
+
+    await websocket.accept()
+    try:
+        async for event in broker.broker.stream(restaurant_id, last_event_id):
+            await websocket.send_json({"type": "ping"} if event is None else event.to_dict())
+    except WebSocketDisconnect:
+        return
+    # Fell behind, reconnect with the id of the last event received
+    await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
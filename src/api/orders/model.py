@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, DateTime, Enum, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, LargeBinary, DateTime, Enum, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from src.services.SQLite.index import Base
 from datetime import datetime
@@ -17,5 +17,26 @@ class Order(Base):
 
     # Relationships
     customer = relationship("User", back_populates="orders", uselist=False)
-    products = relationship("Product", secondary=order_items, back_populates="orders")
-    restaurant = relationship("Restaurant", back_populates="orders")
\ No newline at end of file
+    lines = relationship("OrderItem", back_populates="order")
+    # Read only, lines are written through OrderItem / order_items
+    products = relationship("Product", secondary=order_items, back_populates="orders", viewonly=True)
+    restaurant = relationship("Restaurant", back_populates="orders")
+
+    __table_args__ = (
+        Index('ix_orders_created_at_id', 'created_at', 'id'),  # Keyset pages of GET /orders
+        # One restaurant's or customer's orders in created_at order: their lists, exports and analytics frames
+        Index('ix_orders_restaurant_id_created_at_id', 'restaurant_id', 'created_at', 'id'),
+        Index('ix_orders_customer_id_created_at_id', 'customer_id', 'created_at', 'id'),
+    )
+
+
+class IdempotencyKey(Base):
+    """ Response of a POST /orders sent with an Idempotency-Key, written in the transaction of the order itself """
+    __tablename__ = 'idempotency_keys'
+
+    user_id = Column(Integer, primary_key=True)  # Keys are scoped to the caller
+    key = Column(String, primary_key=True)
+    fingerprint = Column(String, nullable=False)  # Hash of the request body, a reused key must come with the same one
+    response = Column(LargeBinary, nullable=False)  # JSON body as sent the first time
+    expires = Column(Float, index=True, nullable=False)  # Epoch seconds, purged afterwards
+    created_at = Column(DateTime, default=datetime.now)
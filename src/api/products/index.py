@@ -1,12 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import select, update, func, delete
-from pydantic import BaseModel
-from src.services.SQLite.index import async_session
-from src.api.products.model import Product
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy import select, update, delete
+from pydantic import BaseModel, ConfigDict
+from src.services.SQLite.index import async_session, read_session
+from src.api.products.model import Product, ProductCount
 import src.services.auth.index as auth
-from src.api.users.model import User
-from sqlalchemy.orm import joinedload
-from typing import Optional
+import src.services.pagination.index as pagination
+from src.services.cache.index import request_key
+from src.services.catalog.index import MenuSnapshots, CATALOG_SNAPSHOT_TTL_SECONDS, CATALOG_SNAPSHOT_MAX_MENUS
+from src.services.ownership.index import Ownership, ownership_required
+from src.services.projection.index import project
+from typing import List, Optional, Union
+from datetime import datetime
 
 app = APIRouter()
 
@@ -20,115 +24,125 @@ class ProductCreate(BaseModel):
     image: Optional[str] = None
     visible: Optional[bool] = True
 
+class ProductRead(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
 
-@app.post("/products", tags=["products"])
-async def create_product(product: ProductCreate, token: dict = Depends(auth.owner_or_admin_required)):
+    id: int
+    name: str
+    description: Optional[str] = None
+    price: int
+    status: str
+    discount: Optional[int] = None
+    restaurant_id: int
+    image: Optional[str] = None
+    visible: bool
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+class ProductOffsetPage(BaseModel):
+    total: int
+    skip: int
+    limit: int
+    products: List[ProductRead]
+
+class ProductKeysetPage(BaseModel):
+    total: int
+    limit: int
+    next: Optional[str]
+    prev: Optional[str]
+    products: List[ProductRead]
+
+# GET /products/{restaurant_id} and /products/{product_id}, rebuilt by the handlers below after each write
+menus = MenuSnapshots(ProductRead, CATALOG_SNAPSHOT_TTL_SECONDS, CATALOG_SNAPSHOT_MAX_MENUS)
+
+
+@app.post("/products", tags=["products"], response_model=ProductRead)
+async def create_product(product: ProductCreate, ownership: Ownership = Depends(ownership_required)):
+    ownership.require(product.restaurant_id)
     async with async_session() as session:
         new_product = Product(**product.model_dump())
         session.add(new_product)
         await session.commit()
+        await menus.rebuild(new_product.restaurant_id)
         return new_product
 
-@app.get("/products", tags=["products"])
-async def get_products(skip: int = 0, limit: int = 100, token: dict = Depends(auth.admin_required)):
-    async with async_session() as conn:
-        total_stmt = select(func.count(Product.id))
-        total_result = await conn.execute(total_stmt)
-        total_count = total_result.scalar()
+async def product_count(conn, restaurant_id: int = 0) -> int:
+    """ Read from product_counts, restaurant_id 0 is every product """
+    result = await conn.execute(select(ProductCount.count).where(ProductCount.restaurant_id == restaurant_id))
+    return result.scalar() or 0
 
-        stmt = select(Product).offset(skip).limit(limit)
-        result = await conn.execute(stmt)
-        products = result.scalars().all()
+async def product_page(conn, stmt, restaurant_id: int, skip: int, limit: int, cursor: Optional[str]):
+    """ Offset page when cursor is None, keyset page on id otherwise (an empty cursor is the first page) """
+    total_count = await product_count(conn, restaurant_id)
 
+    if cursor is None:
+        result = await conn.execute(stmt.offset(skip).limit(limit))
         return {
             "total": total_count,
             "skip": skip,
             "limit": limit,
-            "products": products
+            "products": [ProductRead.model_validate(product) for product in result.scalars().all()]
         }
-    
-@app.get("/products/{restaurant_id}", tags=["products"])
-async def get_product_by_restaurant(restaurant_id: int, token: dict = Depends(auth.JWTBearer()), skip: int = 0, limit: int = 100):
-    async with async_session() as conn:
-        total_stmt = select(func.count(Product.id)).where(Product.restaurant_id == restaurant_id)
-        total_result = await conn.execute(total_stmt)
-        total_count = total_result.scalar()
-
-        # Query to get paginated products for the restaurant
-        stmt = select(Product).where(Product.restaurant_id == restaurant_id).offset(skip).limit(limit)
-        result = await conn.execute(stmt)
-        products = result.scalars().all()
 
-        return {
-            "total": total_count,
-            "skip": skip,
-            "limit": limit,
-            "products": products
-        }
+    products, next_cursor, prev_cursor = await pagination.keyset_page(conn, stmt, [Product.id], limit, cursor)
+    return {
+        "total": total_count,
+        "limit": limit,
+        "next": next_cursor,
+        "prev": prev_cursor,
+        "products": [ProductRead.model_validate(product) for product in products]
+    }
+
+@app.get("/products", tags=["products"], response_model=Union[ProductOffsetPage, ProductKeysetPage])
+async def get_products(skip: int = 0, limit: int = 100, cursor: Optional[str] = None, token: dict = Depends(auth.admin_required)):
+    async with read_session() as conn:
+        return await product_page(conn, select(Product).options(project(Product, ProductRead)), 0, skip, limit, cursor)
+    
+@app.get("/products/{restaurant_id}", tags=["products"], response_model=Union[ProductOffsetPage, ProductKeysetPage])
+async def get_product_by_restaurant(restaurant_id: int, request: Request, token: dict = Depends(auth.JWTBearer()), skip: int = 0, limit: int = 100, cursor: Optional[str] = None):
+    menu = await menus.menu(restaurant_id)
+    body = menu.offset_page(skip, limit) if cursor is None else menu.keyset_page(limit, cursor)
+    return menus.response(request, request_key(request), menu, body)
 
 
-@app.get("/products/{product_id}", tags=["products"])
+@app.get("/products/{product_id}", tags=["products"], response_model=ProductRead)
 async def get_product(product_id: int, token: dict = Depends(auth.JWTBearer())):
-    async with async_session() as conn:
-        stmt = select(Product).where(Product.id == product_id)
-        result = await conn.execute(stmt)
-        product = result.scalars().first()
-        if product is None:
-            raise HTTPException(status_code=404, detail="Product not found")
-        return product
+    body = await menus.product(product_id)
+    if body is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return Response(content=body, media_type="application/json")
     
-@app.put("/products/{product_id}", tags=["products"])
-async def update_product(product_id: int, product: ProductCreate, token: dict = Depends(auth.owner_or_admin_required)):
+@app.put("/products/{product_id}", tags=["products"], response_model=ProductRead)
+async def update_product(product_id: int, product: ProductCreate, ownership: Ownership = Depends(ownership_required)):
+    # Moving a product is only allowed into another restaurant of the same owner
+    ownership.require(product.restaurant_id)
+
     async with async_session() as conn:
-        stmt_user = select(User).where(User.id == token["id"]).options(joinedload(User.restaurants))
-        result_user = await conn.execute(stmt_user)
-        user = result_user.scalars().first()
-
-        if user is None:
-            raise HTTPException(status_code=404, detail="User not found")
-        
-        if user.role == "owner":
-            stmt_product = select(Product).where(Product.id == product_id)
-            result_product = await conn.execute(stmt_product)
-            product_db = result_product.scalars().first()
-
-            if product_db is None:
-                raise HTTPException(status_code=404, detail="Product not found")
-
-            user_restaurant_ids = [restaurant.id for restaurant in user.restaurants]  # Extract restaurant IDs
-            if product_db.restaurant_id not in user_restaurant_ids:
-                raise HTTPException(status_code=403, detail="You are not the owner of this product")
-            
+        old_restaurant_id = (await conn.execute(select(Product.restaurant_id).where(Product.id == product_id))).scalar()
+        if old_restaurant_id is None:
+            raise HTTPException(status_code=404, detail="Product not found")
+        ownership.require(old_restaurant_id, "You are not the owner of this product")
+
         stmt = update(Product).where(Product.id == product_id).values(**product.model_dump())
         await conn.execute(stmt)
         await conn.commit()
+        await menus.rebuild(old_restaurant_id, product.restaurant_id)
 
-        updated_product = await conn.execute(select(Product).where(Product.id == product_id))
+        updated_product = await conn.execute(select(Product).where(Product.id == product_id).options(project(Product, ProductRead)))
         return updated_product.scalars().first()
 
     
 @app.delete("/products/{product_id}", tags=["products"])
-async def delete_product(product_id: int, token: dict = Depends(auth.owner_or_admin_required)):
+async def delete_product(product_id: int, ownership: Ownership = Depends(ownership_required)):
     async with async_session() as conn:
-        stmt_user = select(User).where(User.id == token["id"]).options(joinedload(User.restaurants))
-        result_user = await conn.execute(stmt_user)
-        user = result_user.scalars().first()
-
-        if user is None:
-            raise HTTPException(status_code=404, detail="User not found")
-        
-        if user.role == "owner":
-            stmt_product = select(Product).where(Product.id == product_id)
-            result_product = await conn.execute(stmt_product)
-            product_db = result_product.scalars().first()
-            if product_db is None:
-                raise HTTPException(status_code=404, detail="Product not found")
-            user_restaurant_ids = [restaurant.id for restaurant in user.restaurants]
-            if product_db.restaurant_id not in user_restaurant_ids:
-                raise HTTPException(status_code=403, detail="You are not the owner of this product")
-            
+        old_restaurant_id = (await conn.execute(select(Product.restaurant_id).where(Product.id == product_id))).scalar()
+        if old_restaurant_id is None:
+            raise HTTPException(status_code=404, detail="Product not found")
+        ownership.require(old_restaurant_id, "You are not the owner of this product")
+
         stmt = delete(Product).where(Product.id == product_id)
         await conn.execute(stmt)
         await conn.commit()
+        await menus.rebuild(old_restaurant_id)
         return {"message": "Product deleted successfully"}
 
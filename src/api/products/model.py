@@ -1,6 +1,6 @@
-from sqlalchemy import Column, Integer, String, DateTime, Enum, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, Enum, ForeignKey, Boolean, Index, DDL, event
 from sqlalchemy.orm import relationship
-from src.services.SQLite.index import Base
+from src.services.SQLite.index import Base, REBUILD_STATEMENTS
 from datetime import datetime
 
 class Product(Base):
@@ -22,4 +22,62 @@ class Product(Base):
     
     # Relationships
     restaurant = relationship("Restaurant", back_populates="products", uselist=False)
-    orders = relationship("Order", secondary="order_items", back_populates="products")
\ No newline at end of file
+    orders = relationship("Order", secondary="order_items", back_populates="products", viewonly=True)
+
+    __table_args__ = (
+        Index('ix_products_restaurant_id_id', 'restaurant_id', 'id'),  # Menu pages
+    )
+
+class ProductCount(Base):
+    """ Number of products per restaurant, restaurant_id 0 holds the total. Kept by triggers on products """
+    __tablename__ = 'product_counts'
+
+    restaurant_id = Column(Integer, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+# Triggers so every insert path (handlers, seeder, bulk loads) keeps the counts exact,
+# created once all tables exist
+for ddl in [
+    """CREATE TRIGGER IF NOT EXISTS products_count_insert AFTER INSERT ON products BEGIN
+        INSERT INTO product_counts (restaurant_id, count) VALUES (NEW.restaurant_id, 1), (0, 1)
+        ON CONFLICT (restaurant_id) DO UPDATE SET count = count + 1;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS products_count_delete AFTER DELETE ON products BEGIN
+        UPDATE product_counts SET count = count - 1 WHERE restaurant_id IN (OLD.restaurant_id, 0);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS products_count_move AFTER UPDATE OF restaurant_id ON products
+    WHEN NEW.restaurant_id != OLD.restaurant_id BEGIN
+        UPDATE product_counts SET count = count - 1 WHERE restaurant_id = OLD.restaurant_id;
+        INSERT INTO product_counts (restaurant_id, count) VALUES (NEW.restaurant_id, 1)
+        ON CONFLICT (restaurant_id) DO UPDATE SET count = count + 1;
+    END""",
+]:
+    event.listen(Base.metadata, "after_create", DDL(ddl))
+REBUILD_STATEMENTS.extend([
+    "DELETE FROM product_counts",
+    "INSERT INTO product_counts (restaurant_id, count) SELECT restaurant_id, count(*) FROM products GROUP BY restaurant_id",
+    "INSERT INTO product_counts (restaurant_id, count) SELECT 0, count(*) FROM products",
+])
+
+# Full-text index of name and description for GET /search. unicode61 with remove_diacritics folds
+# "ragù" to "ragu", the prefix indexes make 2 and 3 letter prefix queries cheap
+for ddl in [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+        name, description, content='products', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_insert AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts (rowid, name, description) VALUES (NEW.id, NEW.name, NEW.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_delete AFTER DELETE ON products BEGIN
+        INSERT INTO products_fts (products_fts, rowid, name, description) VALUES ('delete', OLD.id, OLD.name, OLD.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_update AFTER UPDATE OF name, description ON products BEGIN
+        INSERT INTO products_fts (products_fts, rowid, name, description) VALUES ('delete', OLD.id, OLD.name, OLD.description);
+        INSERT INTO products_fts (rowid, name, description) VALUES (NEW.id, NEW.name, NEW.description);
+    END""",
+]:
+    event.listen(Base.metadata, "after_create", DDL(ddl))
+REBUILD_STATEMENTS.append("INSERT INTO products_fts (products_fts) VALUES ('rebuild')")
+# Not part of the metadata, so drop_all would leave a stale index behind
+event.listen(Base.metadata, "before_drop", DDL("DROP TABLE IF EXISTS products_fts"))
@@ -1,24 +1,62 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
+from fastapi.responses import StreamingResponse
 import src.services.auth.index as auth
-from src.services.QRCode.index import generate_qr_code
+import src.services.ratelimit.index as ratelimit
+from src.services.ownership.index import Ownership, ownership_required
+from src.services.QRCode.index import generate_qr_code, render_qr_code, stream_zip, stream_svg_sheet, FORMATS
 from pydantic import BaseModel
+from typing import Optional
 
 
 app = APIRouter()
 
+MAX_BATCH_TABLES = 500
+
 class QRCodeBase(BaseModel):
     restaurant_id: int
     table_number: int
 
+class QRCodeBatch(BaseModel):
+    restaurant_id: int
+    first_table: int = 1
+    last_table: int
+    format: Optional[str] = "zip"  # zip or svg (one printable sheet)
+    image: Optional[str] = "png"  # png or svg files inside the zip
+
 
-@app.post("/qrcodes", tags=["qrcodes"])
-async def create_qrcode(QRCode: QRCodeBase, 
+@app.post("/qrcodes", dependencies=[Depends(ratelimit.qrcodes_limit)], tags=["qrcodes"], response_model=str)
+async def create_qrcode(QRCode: QRCodeBase, format: str = "data_uri",
     token: dict = Depends(auth.JWTBearer())):
     user_id = token.get("id")
-    qr_code = generate_qr_code({
-        "restaurant_id": QRCode.restaurant_id,
-        "table_number": QRCode.table_number,
-        "user_id": user_id
-    })
+    if format == "data_uri":
+        qr_code = await generate_qr_code({
+            "restaurant_id": QRCode.restaurant_id,
+            "table_number": QRCode.table_number,
+            "user_id": user_id
+        })
+        return qr_code
+
+    if format not in FORMATS:
+        raise HTTPException(status_code=400, detail="Invalid format, expected data_uri, png or svg")
+    image = await render_qr_code(QRCode.restaurant_id, QRCode.table_number, format)
+    return Response(content=image, media_type=FORMATS[format])
+
+
+@app.post("/qrcodes/batch", dependencies=[Depends(ratelimit.qrcodes_limit)], tags=["qrcodes"])
+async def create_qrcode_batch(batch: QRCodeBatch, ownership: Ownership = Depends(ownership_required)):
+    ownership.require(batch.restaurant_id, "You are not authorized to create QR codes for this restaurant")
+    if batch.first_table < 1 or batch.last_table < batch.first_table:
+        raise HTTPException(status_code=400, detail="Invalid table range")
+    if batch.last_table - batch.first_table + 1 > MAX_BATCH_TABLES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_TABLES} tables per batch")
+
+    tables = range(batch.first_table, batch.last_table + 1)
+    name = f"restaurant-{batch.restaurant_id}-tables-{batch.first_table}-{batch.last_table}"
 
-    return qr_code
\ No newline at end of file
+    if batch.format == "svg":
+        return StreamingResponse(stream_svg_sheet(batch.restaurant_id, tables), media_type="image/svg+xml",
+                                 headers={"Content-Disposition": f'attachment; filename="{name}.svg"'})
+    if batch.format != "zip" or batch.image not in FORMATS:
+        raise HTTPException(status_code=400, detail="Invalid format, expected zip (of png or svg) or svg")
+    return StreamingResponse(stream_zip(batch.restaurant_id, tables, batch.image), media_type="application/zip",
+                             headers={"Content-Disposition": f'attachment; filename="{name}.zip"'})
@@ -0,0 +1,119 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
+from sqlalchemy.orm import load_only
+from src.services.SQLite.index import read_session
+from src.api.restaurants.model import Restaurant
+import src.services.auth.index as auth
+import src.services.reports.index as reports
+import src.services.analytics.index as analytics
+from datetime import date, timedelta
+from typing import List, Optional
+from pydantic import BaseModel
+
+app = APIRouter()
+
+class ReportRestaurant(BaseModel):
+    name: str
+    id: int
+    generation_date: str
+
+class DailyEarnings(BaseModel):
+    date: str
+    earnings: float
+
+class DailyGrossProfit(BaseModel):
+    date: str
+    total_revenue: float
+    total_cost: float
+    gross_profit: float
+
+class DailyOrders(BaseModel):
+    date: str
+    orders: int
+
+class ProductSales(BaseModel):
+    id: int
+    name: Optional[str] = None
+    quantity_sold: int
+    total_revenue: float
+
+class ProductSold(BaseModel):
+    name: Optional[str] = None
+    quantity_sold: int
+
+class Report(BaseModel):
+    restaurant_info: ReportRestaurant
+    monthly_earnings: List[DailyEarnings]
+    monthly_gross_profit: List[DailyGrossProfit]
+    best_selling_product: Optional[ProductSales] = None
+    products_sold: List[ProductSold]
+    top_5_products: List[ProductSales]
+    daily_orders: List[DailyOrders]
+
+class AnalyticsSummary(BaseModel):
+    orders: int
+    earnings: float
+    products_sold: int
+    daily_earnings: List[DailyEarnings]
+    daily_orders: List[DailyOrders]
+    products: List[ProductSales]
+    top_products: List[ProductSales]
+
+class AnalyticsHeatmap(BaseModel):
+    weekdays: List[str]
+    hours: List[List[int]]
+
+class BasketSize(BaseModel):
+    items: int
+    orders: int
+
+class AnalyticsBaskets(BaseModel):
+    orders: int
+    mean: float
+    median: float
+    distribution: List[BasketSize]
+
+async def get_restaurant_for_report(conn, restaurant_id: int, token: dict) -> Restaurant:
+    stmt = select(Restaurant).where(Restaurant.id == restaurant_id).options(load_only(Restaurant.id, Restaurant.name, Restaurant.owner_id))
+    result = await conn.execute(stmt)
+    restaurant = result.scalars().first()
+    if restaurant is None:
+        raise HTTPException(status_code=404, detail="Restaurant not found")
+
+    if token["role"] != "admin" and restaurant.owner_id != token["id"]:
+        raise HTTPException(status_code=403, detail="You are not authorized to view this report")
+    return restaurant
+
+@app.get("/restaurants/{restaurant_id}/report", tags=["reports"], response_model=Report)
+async def get_restaurant_report(restaurant_id: int, month: Optional[str] = None, token: dict = Depends(auth.owner_or_admin_required)):
+    month = month or reports.month_of(date.today())
+    try:
+        reports.parse_month(month)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid month, expected YYYY-MM")
+
+    async with read_session() as conn:
+        restaurant = await get_restaurant_for_report(conn, restaurant_id, token)
+        return await reports.build_report(conn, restaurant, month)
+
+async def run_analytics(restaurant_id: int, metric, start: Optional[date], end: Optional[date], token: dict) -> dict:
+    if start and end and end < start:
+        raise HTTPException(status_code=400, detail="end must not be before start")
+
+    async with read_session() as conn:
+        await get_restaurant_for_report(conn, restaurant_id, token)
+
+    # end is inclusive for clients, exclusive for the engine
+    return await analytics.compute(restaurant_id, metric, start, end + timedelta(days=1) if end else None)
+
+@app.get("/restaurants/{restaurant_id}/analytics/summary", tags=["reports"], response_model=AnalyticsSummary)
+async def get_analytics_summary(restaurant_id: int, start: Optional[date] = None, end: Optional[date] = None, token: dict = Depends(auth.owner_or_admin_required)):
+    return await run_analytics(restaurant_id, analytics.summary, start, end, token)
+
+@app.get("/restaurants/{restaurant_id}/analytics/heatmap", tags=["reports"], response_model=AnalyticsHeatmap)
+async def get_analytics_heatmap(restaurant_id: int, start: Optional[date] = None, end: Optional[date] = None, token: dict = Depends(auth.owner_or_admin_required)):
+    return await run_analytics(restaurant_id, analytics.heatmap, start, end, token)
+
+@app.get("/restaurants/{restaurant_id}/analytics/baskets", tags=["reports"], response_model=AnalyticsBaskets)
+async def get_analytics_baskets(restaurant_id: int, start: Optional[date] = None, end: Optional[date] = None, token: dict = Depends(auth.owner_or_admin_required)):
+    return await run_analytics(restaurant_id, analytics.baskets, start, end, token)
@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Integer, String, Date, DateTime, ForeignKey
+from src.services.SQLite.index import Base
+from datetime import datetime
+
+class RestaurantDailySales(Base):
+    __tablename__ = 'restaurant_daily_sales'
+
+    restaurant_id = Column(Integer, ForeignKey('restaurants.id'), primary_key=True)
+    day = Column(Date, primary_key=True)
+    orders_count = Column(Integer, nullable=False, default=0)  # Orders placed that day and not canceled
+    earnings = Column(Integer, nullable=False, default=0)  # Completed orders only
+    products_sold = Column(Integer, nullable=False, default=0)  # Completed orders only
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+class RestaurantProductSales(Base):
+    __tablename__ = 'restaurant_product_sales'
+
+    restaurant_id = Column(Integer, ForeignKey('restaurants.id'), primary_key=True)
+    month = Column(String, primary_key=True)  # YYYY-MM
+    product_id = Column(Integer, ForeignKey('products.id'), primary_key=True)
+    quantity_sold = Column(Integer, nullable=False, default=0)
+    revenue = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
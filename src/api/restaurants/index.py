@@ -1,11 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import select, update, insert, delete
-from pydantic import BaseModel
-from src.services.SQLite.index import async_session
-from src.api.restaurants.model import Restaurant
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy import select, update, insert, delete, func, and_, or_
+from pydantic import BaseModel, ConfigDict
+from src.services.SQLite.index import async_session, read_session
+from src.api.restaurants.model import Restaurant, restaurant_locations
+from src.api.users.model import User
 import src.services.auth.index as auth
+import src.services.pagination.index as pagination
+from src.services.cache.index import catalog_cache, request_key
+from src.api.products.index import menus
+import src.services.ownership.index as ownership
+from src.services.projection.index import project
+import src.services.geo.index as geo
 from sqlalchemy.orm import joinedload
-from typing import Optional
+from typing import List, Optional, Union
+import math
+from datetime import datetime
 
 app = APIRouter()
 
@@ -21,6 +30,8 @@ class RestaurantCreate(BaseModel):
     description: Optional[str] = None
     status: Optional[str] = None
     image: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
 
 class RestaurantUpdate(BaseModel):
     name: str
@@ -34,38 +45,175 @@ class RestaurantUpdate(BaseModel):
     description: Optional[str] = None
     status: Optional[str] = "under_review"
     image: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
 
-@app.get("/restaurants", tags=["restaurants"])
-async def get_restaurants(skip: int = 0, limit: int = 100):
-    async with async_session() as conn:
-        stmt = select(Restaurant).offset(skip).limit(limit).options(joinedload(Restaurant.owner))
-        result = await conn.execute(stmt)
-        restaurants = result.scalars().all()
-        return restaurants
+class RestaurantOwner(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    name: str
+    surname: str
+
+class RestaurantRead(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    name: str
+    address: str
+    city: str
+    country: str
+    postal_code: Optional[str] = None
+    phone_number: Optional[str] = None
+    email: str
+    website: Optional[str] = None
+    description: Optional[str] = None
+    status: str
+    image: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    owner_id: int
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    owner: Optional[RestaurantOwner] = None
+
+class NearbyRestaurant(RestaurantRead):
+    distance_km: float
+
+class RestaurantPage(BaseModel):
+    limit: int
+    next: Optional[str]
+    prev: Optional[str]
+    total: Optional[int] = None
+    restaurants: List[RestaurantRead]
+
+def with_owner(stmt):
+    """ Restaurant columns and the public owner columns, updated_at of the owner feeds the ETag """
+    return stmt.options(project(Restaurant, RestaurantRead), joinedload(Restaurant.owner).options(project(User, RestaurantOwner, "updated_at")))
+
+def to_read(restaurants) -> List[RestaurantRead]:
+    return [RestaurantRead.model_validate(restaurant) for restaurant in restaurants]
+
+def check_coordinates(restaurant) -> None:
+    if (restaurant.latitude is None) != (restaurant.longitude is None):
+        raise HTTPException(status_code=400, detail="latitude and longitude must be set together")
+    if restaurant.latitude is not None and not (-90 <= restaurant.latitude <= 90 and -180 <= restaurant.longitude <= 180):
+        raise HTTPException(status_code=400, detail="Invalid coordinates")
+
+def owner_tags(restaurants, tag: str):
+    """ The embedded owner changes with the user, so entries are also tagged with owner:{id} """
+    return [tag] + [f"owner:{restaurant.owner_id}" for restaurant in restaurants]
+
+def etag_rows(restaurants):
+    return list(restaurants) + [restaurant.owner for restaurant in restaurants if restaurant.owner is not None]
+
+@app.get("/restaurants", tags=["restaurants"], response_model=Union[List[RestaurantRead], RestaurantPage])
+async def get_restaurants(request: Request, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, include_total: bool = False):
+    key = request_key(request)
+    cached = catalog_cache.get(key)
+    if cached:
+        return cached.response(request)
+
+    generation = catalog_cache.generation
+    async with read_session() as conn:
+        stmt = with_owner(select(Restaurant))
+        if cursor is None:
+            result = await conn.execute(stmt.offset(skip).limit(limit))
+            restaurants = result.scalars().all()
+            return catalog_cache.put(key, to_read(restaurants), etag_rows(restaurants), owner_tags(restaurants, "restaurants"), generation).response(request)
+
+        restaurants, next_cursor, prev_cursor = await pagination.keyset_page(conn, stmt, [Restaurant.id], limit, cursor)
+        page = {"limit": limit, "next": next_cursor, "prev": prev_cursor, "restaurants": to_read(restaurants)}
+        if include_total:
+            page["total"] = (await conn.execute(select(func.count(Restaurant.id)))).scalar()
+        return catalog_cache.put(key, page, etag_rows(restaurants), owner_tags(restaurants, "restaurants"), generation, [page.get("total")]).response(request)
     
-@app.get("/restaurants/me", tags=["restaurants"])
+@app.get("/restaurants/me", tags=["restaurants"], response_model=List[RestaurantRead])
 async def get_my_restaurants(token: dict = Depends(auth.owner_required)):
-    async with async_session() as conn:
-        stmt = select(Restaurant).where(Restaurant.owner_id == token["id"]).options(joinedload(Restaurant.owner))
+    async with read_session() as conn:
+        stmt = with_owner(select(Restaurant).where(Restaurant.owner_id == token["id"]))
         result = await conn.execute(stmt)
         restaurants = result.scalars().all()
         return restaurants
 
-@app.get("/restaurants/{restaurant_id}", tags=["restaurants"])
-async def get_restaurant(restaurant_id: int):
-    async with async_session() as conn:
-        stmt = select(Restaurant).where(Restaurant.id == restaurant_id).options(joinedload(Restaurant.owner))
+async def nearby_candidates(conn, lat: float, lon: float, radius: float, error: Optional[float], limit: Optional[int]):
+    """
+    (restaurant, planar km) for the located restaurants in the bounding boxes. With a planar error bound they
+    are the limit closest in planar distance, computed on the R*Tree boxes alone, planar km is None otherwise.
+    """
+    box = restaurant_locations.c
+    stmt = select(box.id).where(or_(*[
+        and_(box.max_lat >= min_lat, box.min_lat <= max_lat, box.max_lon >= min_lon, box.min_lon <= max_lon)
+        for min_lat, max_lat, min_lon, max_lon in geo.bounding_boxes(lat, lon, radius)
+    ]))
+    if error is None:
+        candidates = stmt.subquery()
+        result = await conn.execute(with_owner(select(Restaurant)).join(candidates, candidates.c.id == Restaurant.id))
+        return [(restaurant, None) for restaurant in result.scalars().all()]
+
+    planar = geo.planar_squared_km(lat, lon, box.min_lat, box.min_lon).label("planar")
+    stmt = stmt.add_columns(planar).where(planar <= ((radius + geo.ROUNDING_KM) / (1 - error)) ** 2).order_by(planar, box.id)
+    candidates = (stmt.limit(limit) if limit else stmt).subquery()
+    result = await conn.execute(
+        with_owner(select(Restaurant, candidates.c.planar)).join(candidates, candidates.c.id == Restaurant.id).order_by(candidates.c.planar, Restaurant.id)
+    )
+    return [(restaurant, math.sqrt(planar)) for restaurant, planar in result.all()]
+
+def rank_nearby(lat: float, lon: float, radius: float, candidates) -> List[tuple]:
+    """ (restaurant, km) of the candidates inside the circle, closest first """
+    if not candidates:
+        return []
+    restaurants = [restaurant for restaurant, _ in candidates]
+    distances = geo.distances_km(lat, lon, [restaurant.latitude for restaurant in restaurants], [restaurant.longitude for restaurant in restaurants])
+    return sorted(((restaurant, float(km)) for restaurant, km in zip(restaurants, distances) if km <= radius), key=lambda hit: (hit[1], hit[0].id))
+
+@app.get("/restaurants/nearby", tags=["restaurants"], response_model=List[NearbyRestaurant])
+async def get_nearby_restaurants(lat: float, lon: float, radius: float = 5, limit: int = 20):
+    """
+    Closest located restaurants within radius km. The R*Tree narrows to a bounding box and orders it by a planar
+    approximation, twice limit candidates are then ranked by exact haversine distance.
+    """
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise HTTPException(status_code=400, detail="Invalid coordinates")
+    if not 0 < radius <= geo.NEARBY_MAX_RADIUS_KM or not 0 < limit <= 100:
+        raise HTTPException(status_code=400, detail=f"radius must be between 0 and {geo.NEARBY_MAX_RADIUS_KM:g} km and limit between 1 and 100")
+
+    error = geo.planar_error(lat, lon, radius)
+    fetched = 2 * limit if error is not None else None
+    async with read_session() as conn:
+        candidates = await nearby_candidates(conn, lat, lon, radius, error, fetched)
+        nearest = rank_nearby(lat, lon, radius, candidates)[:limit]
+        if fetched and len(candidates) == fetched:
+            # Restaurants past the fetched ones are at least cutoff away, when the farthest kept one is
+            # not closer than that the planar order may have left out a closer one: rank every candidate
+            cutoff = geo.planar_cutoff_km(candidates[-1][1], error)
+            if len(nearest) < limit or nearest[-1][1] > cutoff:
+                nearest = rank_nearby(lat, lon, radius, await nearby_candidates(conn, lat, lon, radius, error, None))[:limit]
+
+    return [NearbyRestaurant(**RestaurantRead.model_validate(restaurant).model_dump(), distance_km=round(km, 3)) for restaurant, km in nearest]
+
+@app.get("/restaurants/{restaurant_id}", tags=["restaurants"], response_model=RestaurantRead)
+async def get_restaurant(restaurant_id: int, request: Request):
+    key = request_key(request)
+    cached = catalog_cache.get(key)
+    if cached:
+        return cached.response(request)
+
+    generation = catalog_cache.generation
+    async with read_session() as conn:
+        stmt = with_owner(select(Restaurant).where(Restaurant.id == restaurant_id))
         result = await conn.execute(stmt)
         restaurant = result.scalars().first()
         if restaurant is None:
             raise HTTPException(status_code=404, detail="Restaurant not found")
-        return restaurant
+        return catalog_cache.put(key, RestaurantRead.model_validate(restaurant), etag_rows([restaurant]), owner_tags([restaurant], f"restaurant:{restaurant_id}"), generation).response(request)
 
-@app.post("/restaurants", tags=["restaurants"])
+@app.post("/restaurants", tags=["restaurants"], response_model=RestaurantRead)
 async def create_restaurant(restaurant_create: RestaurantCreate, token: dict = Depends(auth.owner_or_admin_required)):
     async with async_session() as conn:
         if restaurant_create.status and restaurant_create.status not in ["open", "closed", "under_review"]:
             raise HTTPException(status_code=400, detail="Invalid status")
+        check_coordinates(restaurant_create)
         
         stmt = select(Restaurant).where(
             (Restaurant.email == restaurant_create.email) | 
@@ -80,14 +228,16 @@ async def create_restaurant(restaurant_create: RestaurantCreate, token: dict = D
         stmt = insert(Restaurant).values(**restaurant_create.model_dump(), owner_id=token["id"])
         result = await conn.execute(stmt)
         await conn.commit()
+        catalog_cache.invalidate("restaurants")
+        ownership.index.invalidate(token["id"])
         
-        stmt = select(Restaurant).where(Restaurant.id == result.lastrowid).options(joinedload(Restaurant.owner))
+        stmt = with_owner(select(Restaurant).where(Restaurant.id == result.lastrowid))
         result = await conn.execute(stmt)
         restaurant = result.scalars().first()
         
         return restaurant
 
-@app.put("/restaurants/{restaurant_id}", tags=["restaurants"])
+@app.put("/restaurants/{restaurant_id}", tags=["restaurants"], response_model=RestaurantRead)
 async def update_restaurant(restaurant_id: int, restaurant_update: RestaurantUpdate, token: dict = Depends(auth.owner_or_admin_required)):
     async with async_session() as conn:
         stmt = select(Restaurant).where(Restaurant.id == restaurant_id, Restaurant.owner_id == token["id"])
@@ -97,13 +247,15 @@ async def update_restaurant(restaurant_id: int, restaurant_update: RestaurantUpd
             raise HTTPException(status_code=404, detail="Restaurant not found or unauthorized")
         
         print(restaurant_update)
+        check_coordinates(restaurant_update)
 
         stmt = update(Restaurant).where(Restaurant.id == restaurant_id).values(**restaurant_update.model_dump(exclude_unset=True))
         await conn.execute(stmt)
-        stmt = select(Restaurant).where(Restaurant.id == restaurant_id)
+        stmt = with_owner(select(Restaurant).where(Restaurant.id == restaurant_id)).execution_options(populate_existing=True)
         result = await conn.execute(stmt)
         restaurant = result.scalars().first()
         await conn.commit()
+        catalog_cache.invalidate("restaurants", f"restaurant:{restaurant_id}")
         return restaurant
 
 @app.delete("/restaurants/{restaurant_id}", tags=["restaurants"])
@@ -122,6 +274,9 @@ async def delete_restaurant(restaurant_id: int, token: dict = Depends(auth.owner
         stmt = delete(Restaurant).where(Restaurant.id == restaurant_id)
         result = await conn.execute(stmt)
         await conn.commit()
+        catalog_cache.invalidate("restaurants", f"restaurant:{restaurant_id}")
+        ownership.index.invalidate(restaurant.owner_id)
+        menus.forget(restaurant_id)
 
         if result.rowcount == 0:
             raise HTTPException(status_code=404, detail="Restaurant not found")
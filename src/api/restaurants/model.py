@@ -1,6 +1,6 @@
-from sqlalchemy import Column, Integer, String, DateTime, Enum, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, DateTime, Enum, ForeignKey, DDL, event, table, column
 from sqlalchemy.orm import relationship
-from src.services.SQLite.index import Base
+from src.services.SQLite.index import Base, REBUILD_STATEMENTS
 from datetime import datetime
 
 class Restaurant(Base):
@@ -14,13 +14,16 @@ class Restaurant(Base):
     postal_code = Column(String, nullable=True)
     status = Column(Enum("open", "closed", "under_review"), nullable=False, default='under_review')
     
-    owner_id = Column(Integer, ForeignKey('users.id'), nullable=False)  # Link to the User (Owner)
+    owner_id = Column(Integer, ForeignKey('users.id'), nullable=False, index=True)  # Link to the User (Owner)
     
     phone_number = Column(String, nullable=True)
     email = Column(String, nullable=False, unique=True, index=True)
     website = Column(String, nullable=True)
     description = Column(String, nullable=True)
     image = Column(String, nullable=True)
+    # WGS84 degrees, restaurants without coordinates are left out of GET /restaurants/nearby
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
 
     created_at = Column(DateTime, default=datetime.now)
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
@@ -29,3 +32,51 @@ class Restaurant(Base):
     owner = relationship("User", back_populates="restaurants")
     products = relationship("Product", back_populates="restaurant")
     orders = relationship("Order", back_populates="restaurant")
+
+# Full-text index of name, city and description for GET /search, see products_fts
+for ddl in [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS restaurants_fts USING fts5(
+        name, city, description, content='restaurants', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS restaurants_fts_insert AFTER INSERT ON restaurants BEGIN
+        INSERT INTO restaurants_fts (rowid, name, city, description) VALUES (NEW.id, NEW.name, NEW.city, NEW.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS restaurants_fts_delete AFTER DELETE ON restaurants BEGIN
+        INSERT INTO restaurants_fts (restaurants_fts, rowid, name, city, description) VALUES ('delete', OLD.id, OLD.name, OLD.city, OLD.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS restaurants_fts_update AFTER UPDATE OF name, city, description ON restaurants BEGIN
+        INSERT INTO restaurants_fts (restaurants_fts, rowid, name, city, description) VALUES ('delete', OLD.id, OLD.name, OLD.city, OLD.description);
+        INSERT INTO restaurants_fts (rowid, name, city, description) VALUES (NEW.id, NEW.name, NEW.city, NEW.description);
+    END""",
+]:
+    event.listen(Base.metadata, "after_create", DDL(ddl))
+REBUILD_STATEMENTS.append("INSERT INTO restaurants_fts (restaurants_fts) VALUES ('rebuild')")
+event.listen(Base.metadata, "before_drop", DDL("DROP TABLE IF EXISTS restaurants_fts"))
+
+# R*Tree of the restaurant coordinates for GET /restaurants/nearby, one point (min == max) per located
+# restaurant, stored as 32-bit floats. Triggers keep it in sync, so the seeders are indexed as well.
+restaurant_locations = table("restaurants_rtree", column("id"), column("min_lat"), column("max_lat"), column("min_lon"), column("max_lon"))
+
+for ddl in [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS restaurants_rtree USING rtree(id, min_lat, max_lat, min_lon, max_lon)",
+    """CREATE TRIGGER IF NOT EXISTS restaurants_rtree_insert AFTER INSERT ON restaurants
+    WHEN NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL BEGIN
+        INSERT INTO restaurants_rtree VALUES (NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS restaurants_rtree_delete AFTER DELETE ON restaurants BEGIN
+        DELETE FROM restaurants_rtree WHERE id = OLD.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS restaurants_rtree_update AFTER UPDATE OF latitude, longitude ON restaurants BEGIN
+        DELETE FROM restaurants_rtree WHERE id = OLD.id;
+        INSERT INTO restaurants_rtree SELECT NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude
+        WHERE NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL;
+    END""",
+]:
+    event.listen(Base.metadata, "after_create", DDL(ddl))
+REBUILD_STATEMENTS.extend([
+    "DELETE FROM restaurants_rtree",
+    """INSERT INTO restaurants_rtree SELECT id, latitude, latitude, longitude, longitude FROM restaurants
+    WHERE latitude IS NOT NULL AND longitude IS NOT NULL""",
+])
+event.listen(Base.metadata, "before_drop", DDL("DROP TABLE IF EXISTS restaurants_rtree"))
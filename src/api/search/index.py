@@ -0,0 +1,52 @@
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel, ConfigDict
+from src.services.SQLite.index import read_session
+import src.services.auth.index as auth
+import src.services.search.index as search
+from typing import List, Optional
+
+app = APIRouter()
+
+class ProductHit(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    name: str
+    description: Optional[str] = None
+    price: int
+    discount: Optional[int] = None
+    image: Optional[str] = None
+    restaurant_id: int
+    rank: float
+
+class RestaurantHit(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    name: str
+    city: str
+    description: Optional[str] = None
+    image: Optional[str] = None
+    status: str
+    rank: float
+
+class SearchResults(BaseModel):
+    q: str
+    skip: int
+    limit: int
+    products: List[ProductHit]
+    restaurants: List[RestaurantHit]
+
+@app.get("/search", tags=["search"], response_model=SearchResults)
+async def search_catalog(q: str, type: str = "all", restaurant_id: Optional[int] = None, skip: int = 0, limit: int = 20, token: dict = Depends(auth.JWTBearer())):
+    """ Products and restaurants best match first (lower rank is better), every word matches as a prefix, accents are ignored """
+    if type not in ["all", "products", "restaurants"]:
+        raise HTTPException(status_code=400, detail="Invalid type, expected all, products or restaurants")
+    if skip < 0 or not 0 < limit <= 100:
+        raise HTTPException(status_code=400, detail="skip must not be negative and limit must be between 1 and 100")
+
+    async with read_session() as conn:
+        products = await search.search_products(conn, q, skip, limit, restaurant_id) if type != "restaurants" else []
+        # restaurant_id narrows the search to one menu
+        restaurants = await search.search_restaurants(conn, q, skip, limit) if type != "products" and restaurant_id is None else []
+    return {"q": q, "skip": skip, "limit": limit, "products": products, "restaurants": restaurants}
@@ -1,11 +1,16 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import select, update, insert, delete
-from pydantic import BaseModel
-from src.services.SQLite.index import async_session
+from sqlalchemy import select, update, insert, delete, func
+from pydantic import BaseModel, ConfigDict
+from src.services.SQLite.index import async_session, read_session
 from src.api.users.model import User
+from src.api.restaurants.model import Restaurant
 import src.services.auth.index as auth
+import src.services.pagination.index as pagination
+from src.services.cache.index import catalog_cache
+import src.services.ownership.index as ownership
+from src.services.projection.index import project
 from sqlalchemy.orm import joinedload
-from typing import Optional
+from typing import List, Optional, Union
 from datetime import datetime
 
 app = APIRouter()
@@ -31,25 +36,66 @@ class UserCreate(BaseModel):
     email: str
     password: str
 
-@app.get("/users", tags=["users"])
-async def get_users(skip: int = 0, limit: int = 100, token: dict = Depends(auth.admin_required)):
-    async with async_session() as conn:
-        stmt = select(User).offset(skip).limit(limit).options(joinedload(User.restaurants))
-        result = await conn.execute(stmt)
-        users = result.scalars().all()
-        return users
+class UserRestaurant(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    name: str
+
+class UserRead(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
 
-@app.get("/users/{user_id}", tags=["users"])
+    id: int
+    name: str
+    surname: str
+    email: str
+    role: str
+    phone_number: Optional[str] = None
+    address: Optional[str] = None
+    date_of_birth: Optional[datetime] = None
+    profile_picture: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+class UserWithRestaurants(UserRead):
+    restaurants: List[UserRestaurant] = []
+
+class UserPage(BaseModel):
+    limit: int
+    next: Optional[str]
+    prev: Optional[str]
+    total: Optional[int] = None
+    users: List[UserWithRestaurants]
+
+def with_restaurants(stmt):
+    return stmt.options(project(User, UserRead), joinedload(User.restaurants).options(project(Restaurant, UserRestaurant)))
+
+@app.get("/users", tags=["users"], response_model=Union[List[UserWithRestaurants], UserPage])
+async def get_users(skip: int = 0, limit: int = 100, cursor: Optional[str] = None, include_total: bool = False, token: dict = Depends(auth.admin_required)):
+    async with read_session() as conn:
+        stmt = with_restaurants(select(User))
+        if cursor is None:
+            result = await conn.execute(stmt.offset(skip).limit(limit))
+            users = result.unique().scalars().all()
+            return users
+
+        users, next_cursor, prev_cursor = await pagination.keyset_page(conn, stmt, [User.id], limit, cursor)
+        page = {"limit": limit, "next": next_cursor, "prev": prev_cursor, "users": users}
+        if include_total:
+            page["total"] = (await conn.execute(select(func.count(User.id)))).scalar()
+        return page
+
+@app.get("/users/{user_id}", tags=["users"], response_model=UserWithRestaurants)
 async def get_user(user_id: int, token: dict = Depends(auth.admin_required)):
-    async with async_session() as conn:
-        stmt = select(User).where(User.id == user_id).options(joinedload(User.restaurants))
+    async with read_session() as conn:
+        stmt = with_restaurants(select(User).where(User.id == user_id))
         result = await conn.execute(stmt)
-        user = result.scalars().first()
+        user = result.unique().scalars().first()
         if user is None:
             raise HTTPException(status_code=404, detail="User not found")
         return user
     
-@app.put("/users/me", tags=["users"])
+@app.put("/users/me", tags=["users"], response_model=UserRead)
 async def update_user_me(user_update: UserUpdate, token: dict = Depends(auth.JWTBearer())):
     async with async_session() as conn:
         stmt = select(User).where(User.id == token["id"])
@@ -67,9 +113,10 @@ async def update_user_me(user_update: UserUpdate, token: dict = Depends(auth.JWT
         stmt = update(User).where(User.id == token["id"]).values(**update_data)
         await conn.execute(stmt)
 
-        user = await conn.execute(select(User).where(User.id == token["id"]))
+        user = await conn.execute(select(User).where(User.id == token["id"]).options(project(User, UserRead)).execution_options(populate_existing=True))
 
         await conn.commit()
+        catalog_cache.invalidate(f"owner:{token['id']}")
 
         return user.scalars().first()
 
@@ -85,6 +132,7 @@ async def update_user(user_id: int, user_update: UserUpdate, token: dict = Depen
         stmt = update(User).where(User.id == user_id).values(**user_update.model_dump())
         await conn.execute(stmt)
         await conn.commit()
+        catalog_cache.invalidate(f"owner:{user_id}")
         return {"message": "User updated successfully"}
 
 @app.post("/users", tags=["users"])
@@ -101,6 +149,8 @@ async def delete_user(user_id: int, token: dict = Depends(auth.admin_required)):
         stmt = delete(User).where(User.id == user_id)
         result = await conn.execute(stmt)
         await conn.commit()
+        catalog_cache.invalidate(f"owner:{user_id}")
+        ownership.index.invalidate(user_id)
         if result.rowcount == 0:
             raise HTTPException(status_code=404, detail="User not found")
         return {"message": "User deleted successfully"}
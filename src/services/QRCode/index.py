@@ -1,13 +1,184 @@
-import segno
-from typing import Dict
+import asyncio
+import base64
+import hashlib
+import io
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import AsyncIterator, Dict, List, Optional
 import os
 from dotenv import load_dotenv 
 load_dotenv()
 
 front_end_url = os.getenv("FRONTEND2_URL", "https://python-final-project-front-end.vercel.app")
 
-def generate_qr_code(data: Dict) -> str:
-    url = f"{front_end_url}/restaurant/{data['restaurant_id']}/table/{data['table_number']}"
-    print(url)
-    qr = segno.make(url, error='H')
-    return qr.png_data_uri(scale=5)
\ No newline at end of file
+# segno renders in pure Python, "process" spreads batches over every core
+QRCODE_POOL = os.getenv("QRCODE_POOL", "thread")
+QRCODE_WORKERS = int(os.getenv("QRCODE_WORKERS", os.cpu_count() or 2))
+QRCODE_CACHE_SIZE = int(os.getenv("QRCODE_CACHE_SIZE", 4096))
+
+FORMATS = {"png": "image/png", "svg": "image/svg+xml"}
+
+
+def table_url(restaurant_id: int, table_number: int) -> str:
+    return f"{front_end_url}/restaurant/{restaurant_id}/table/{table_number}"
+
+
+def _render(url: str, kind: str, scale: int, error: str) -> bytes:
+    # Imported on the first render, in the worker that renders it
+    import segno
+    qr = segno.make(url, error=error)
+    out = io.BytesIO()
+    if kind == "svg":
+        qr.save(out, kind="svg", scale=scale, xmldecl=False, nl=False)
+    else:
+        qr.save(out, kind="png", scale=scale)
+    return out.getvalue()
+
+
+class QRCodeCache:
+    """ Rendered codes keyed by a hash of everything that affects the image, with the renders still running """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self.pending: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def key(url: str, kind: str, scale: int, error: str) -> str:
+        return hashlib.sha256(f"{url}|{kind}|{scale}|{error}".encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[bytes]:
+        image = self.entries.get(key)
+        if image is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return image
+
+    def put(self, key: str, image: bytes):
+        self.entries[key] = image
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def finish(self, key: str, future: asyncio.Future):
+        self.pending.pop(key, None)
+        if not future.cancelled() and future.exception() is None:
+            self.put(key, future.result())
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self.entries), "max_size": self.max_size, "pending": len(self.pending),
+            "hits": self.hits, "misses": self.misses, "coalesced": self.coalesced,
+        }
+
+
+cache = QRCodeCache(QRCODE_CACHE_SIZE)
+executor: Optional[Executor] = None
+
+
+def get_executor() -> Executor:
+    global executor
+    if executor is None:
+        if QRCODE_POOL == "process":
+            executor = ProcessPoolExecutor(max_workers=QRCODE_WORKERS)
+        else:
+            executor = ThreadPoolExecutor(max_workers=QRCODE_WORKERS, thread_name_prefix="qrcodes")
+    return executor
+
+
+def shutdown():
+    global executor
+    if executor is not None:
+        executor.shutdown(wait=False)
+        executor = None
+
+
+async def render_qr_code(restaurant_id: int, table_number: int, kind: str = "png", scale: int = 5, error: str = "H") -> bytes:
+    """ PNG or SVG bytes of a table code, rendered at most once per style """
+    url = table_url(restaurant_id, table_number)
+    key = cache.key(url, kind, scale, error)
+    image = cache.get(key)
+    if image is not None:
+        return image
+    # Concurrent requests for a code being rendered wait for the same render
+    future = cache.pending.get(key)
+    if future is None:
+        future = cache.pending[key] = asyncio.get_running_loop().run_in_executor(get_executor(), _render, url, kind, scale, error)
+        future.add_done_callback(lambda done: cache.finish(key, done))
+    else:
+        cache.coalesced += 1
+    # A cancelled caller (a closed ZIP stream) leaves the render to the others
+    return await asyncio.shield(future)
+
+
+async def generate_qr_code(data: Dict) -> str:
+    """ PNG data URI, the original /qrcodes response """
+    image = await render_qr_code(data["restaurant_id"], data["table_number"])
+    return "data:image/png;base64," + base64.b64encode(image).decode()
+
+
+class _ChunkWriter:
+    """ Unseekable file for zipfile, collects what it writes until drained """
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def _render_tasks(restaurant_id: int, tables: range, kind: str, scale: int, error: str):
+    # Started together so the pool renders in parallel, consumed in table order
+    return [asyncio.ensure_future(render_qr_code(restaurant_id, table, kind, scale, error)) for table in tables]
+
+
+async def stream_zip(restaurant_id: int, tables: range, kind: str = "png", scale: int = 5, error: str = "H") -> AsyncIterator[bytes]:
+    """ ZIP with one file per table, each entry is sent as soon as its code is ready """
+    tasks = _render_tasks(restaurant_id, tables, kind, scale, error)
+    writer = _ChunkWriter()
+    try:
+        with zipfile.ZipFile(writer, "w", compression=zipfile.ZIP_STORED) as archive:
+            for table, task in zip(tables, tasks):
+                archive.writestr(f"restaurant-{restaurant_id}-table-{table}.{kind}", await task)
+                yield writer.drain()
+        yield writer.drain()
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def stream_svg_sheet(restaurant_id: int, tables: range, scale: int = 5, error: str = "H", columns: int = 4) -> AsyncIterator[bytes]:
+    """ One printable SVG with every table code in a grid, labelled with its table number """
+    tasks = _render_tasks(restaurant_id, tables, "svg", scale, error)
+    try:
+        # The highest table number has the longest URL, so its code is the largest and sizes the cells
+        last = (await tasks[-1]).decode()
+        size = int(last.split('width="', 1)[1].split('"', 1)[0])
+        cell = size + 40
+        rows = -(-len(tables) // columns)
+        yield (
+            f'<?xml version="1.0" encoding="utf-8"?>\n<svg xmlns="http://www.w3.org/2000/svg" '
+            f'width="{cell * columns}" height="{cell * rows}" font-family="sans-serif" font-size="16">'
+        ).encode()
+        for index, (table, task) in enumerate(zip(tables, tasks)):
+            x, y = index % columns * cell + 20, index // columns * cell + 10
+            code = (await task).decode().replace("<svg ", f'<svg x="{x}" y="{y}" ', 1)
+            yield f'{code}<text x="{x + size // 2}" y="{y + size + 22}" text-anchor="middle">Table {table}</text>'.encode()
+        yield b"</svg>"
+    finally:
+        for task in tasks:
+            task.cancel()
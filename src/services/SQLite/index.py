@@ -1,26 +1,177 @@
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, text, Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlalchemy.ext.declarative import declarative_base
+from typing import List
+import importlib
+from src.services.metrics.index import track_statements
 
 Base = declarative_base()
 
+# Stored in PRAGMA user_version. Bump it with every change to the models so a warm start upgrades the database
+SCHEMA_VERSION = 4
+
+# Statements recomputing trigger-maintained tables (counts, search indexes) from their sources, registered
+# next to the triggers by the models and run when prepare_database upgrades an older database
+REBUILD_STATEMENTS: List[str] = []
+
+# Every module declaring tables on Base. Imported by register_models, so a CLI or benchmark that only
+# needs some of them still creates (and stamps SCHEMA_VERSION on) the whole schema. Add new model modules here
+MODEL_MODULES = [
+    "src.api.users.model",
+    "src.api.restaurants.model",
+    "src.api.products.model",
+    "src.api.orderItems.model",
+    "src.api.orders.model",
+    "src.api.reports.model",
+    "src.api.auth.model",
+]
+
+
+def register_models():
+    """ Add every table of MODEL_MODULES to Base.metadata, the models import this module so it cannot import them first """
+    for module in MODEL_MODULES:
+        importlib.import_module(module)
+
 
 import os
 from dotenv import load_dotenv 
 load_dotenv() 
 
-sync_engine = create_engine((os.getenv("ENGINE_PATH_DB")), echo=True)
+# "development" keeps one engine with SQLite defaults, "production" enables WAL
+# with a pool of read-only connections and a single serialized writer connection
+DB_PROFILE = os.getenv("DB_PROFILE", "development")
+# Log every statement to stdout, statement counts and timings are always at /metrics
+DB_ECHO = os.getenv("DB_ECHO", "false").lower() in ("1", "true", "yes")
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", 8))
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", 5000))
+DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", 65536))
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", 268435456))
+
+PRODUCTION_PRAGMAS = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    f"PRAGMA cache_size=-{DB_CACHE_SIZE_KB}",
+    f"PRAGMA mmap_size={DB_MMAP_SIZE}",
+    f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}",
+    "PRAGMA temp_store=MEMORY",
+]
+
+
+def set_pragmas(engine, pragmas):
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+
+def is_memory_database(url: str) -> bool:
+    return url.endswith(":memory:") or url.rstrip("/") in ("sqlite:", "sqlite+aiosqlite:")
+
+
+def create_engines(sync_url: str, async_url: str, profile: str = DB_PROFILE):
+    """ Returns (sync_engine, write_engine, read_engine), read_engine is write_engine outside production """
+    engines = _create_engines(sync_url, async_url, profile)
+    for engine in set(engines):
+        track_statements(engine if isinstance(engine, Engine) else engine.sync_engine)
+    return engines
+
 
-async_engine = create_async_engine((os.getenv("ASYNC_ENGINE_PATH_DB")), echo=True)
+def _create_engines(sync_url: str, async_url: str, profile: str):
+    if profile != "production" or is_memory_database(async_url):
+        sync_engine = create_engine(sync_url, echo=DB_ECHO)
+        write_engine = create_async_engine(async_url, echo=DB_ECHO)
+        return sync_engine, write_engine, write_engine
+
+    sync_engine = create_engine(sync_url, echo=DB_ECHO)
+    set_pragmas(sync_engine, PRODUCTION_PRAGMAS)
+
+    # One connection, so writers wait for the pool instead of failing with "database is locked"
+    write_engine = create_async_engine(async_url, poolclass=AsyncAdaptedQueuePool, pool_size=1, max_overflow=0, pool_timeout=30, echo=DB_ECHO)
+    set_pragmas(write_engine.sync_engine, PRODUCTION_PRAGMAS)
+
+    # WAL lets these read a consistent snapshot while the writer commits
+    read_engine = create_async_engine(async_url, poolclass=AsyncAdaptedQueuePool, pool_size=DB_READ_POOL_SIZE, max_overflow=0, pool_timeout=30, echo=DB_ECHO)
+    set_pragmas(read_engine.sync_engine, PRODUCTION_PRAGMAS + ["PRAGMA query_only=ON"])
+    return sync_engine, write_engine, read_engine
+
+
+sync_engine, async_engine, read_engine = create_engines(os.getenv("ENGINE_PATH_DB"), os.getenv("ASYNC_ENGINE_PATH_DB"))
 
 async_session = sessionmaker(
     bind=async_engine, expire_on_commit=False, class_=AsyncSession
 )
 
+# Handlers that only read use read_session, anything that mutates uses write_session
+write_session = async_session
+read_session = sessionmaker(
+    bind=read_engine, expire_on_commit=False, class_=AsyncSession
+)
+
 async def reset_database():
+    register_models()
     async with async_engine.begin() as conn:
         await conn.run_sync(Base.metadata.drop_all)
         await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(text(f"PRAGMA user_version = {SCHEMA_VERSION}"))
+
+
+def _create_missing(connection) -> List[str]:
+    """
+    Create the tables, nullable columns and indexes the database lacks, then run the after_create DDL
+    (triggers and virtual tables, all IF NOT EXISTS). Returns what was added.
+    """
+    inspector = inspect(connection)
+    existing = set(inspector.get_table_names())
+    added = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing:
+            added.append(table.name)
+            continue
+        columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in columns:
+                continue
+            if not column.nullable or column.primary_key or column.unique:
+                raise RuntimeError(f"{table.name}.{column.name} cannot be added to existing rows, start once with STARTUP_MODE=reset")
+            connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(connection.dialect)}"))
+            added.append(f"{table.name}.{column.name}")
+        indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in indexes:
+                index.create(connection)
+                added.append(index.name)
+    Base.metadata.create_all(connection)
+    return added
+
+
+async def prepare_database() -> List[str]:
+    """
+    Warm start: a database at SCHEMA_VERSION only gets the tables it lacks, found with one sqlite_master query.
+    An older or unversioned one gets what it is missing, and the trigger-maintained tables are rebuilt since
+    rows may predate their triggers.
+    """
+    register_models()
+    async with async_engine.begin() as conn:
+        version = (await conn.execute(text("PRAGMA user_version"))).scalar()
+        if version == SCHEMA_VERSION:
+            existing = set((await conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'table'"))).scalars())
+            missing = [table for table in Base.metadata.sorted_tables if table.name not in existing]
+            if missing:
+                await conn.run_sync(lambda connection: Base.metadata.create_all(connection, tables=missing))
+            return [table.name for table in missing]
+        if version > SCHEMA_VERSION:
+            raise RuntimeError(f"Database schema version {version} is newer than this release ({SCHEMA_VERSION})")
+
+        had_tables = bool(await conn.run_sync(lambda connection: inspect(connection).get_table_names()))
+        added = await conn.run_sync(_create_missing)
+        if had_tables:
+            for statement in REBUILD_STATEMENTS:
+                await conn.execute(text(statement))
+        await conn.execute(text(f"PRAGMA user_version = {SCHEMA_VERSION}"))
+        return added
 
 
@@ -0,0 +1,223 @@
+import asyncio
+import calendar
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import Dict, Optional, Tuple
+import numpy as np
+from sqlalchemy import select, func, cast, Integer
+from src.services.SQLite.index import sync_engine
+from src.api.orders.model import Order
+from src.api.orderItems.model import order_items
+from src.api.products.model import Product
+
+import os
+from dotenv import load_dotenv 
+load_dotenv()
+
+ANALYTICS_WORKERS = int(os.getenv("ANALYTICS_WORKERS", 2))
+ANALYTICS_CACHE_SIZE = int(os.getenv("ANALYTICS_CACHE_SIZE", 64))
+# Bounds how long orders placed through another worker go unseen, orders placed here invalidate at once
+ANALYTICS_CACHE_TTL_SECONDS = float(os.getenv("ANALYTICS_CACHE_TTL_SECONDS", 60))
+
+STATUS_CODES = {"pending": 0, "completed": 1, "canceled": 2}
+COMPLETED = STATUS_CODES["completed"]
+CANCELED = STATUS_CODES["canceled"]
+
+SECONDS_PER_DAY = 86400
+
+executor = ThreadPoolExecutor(max_workers=ANALYTICS_WORKERS, thread_name_prefix="analytics")
+
+
+class OrderFrame:
+    """ One row per order line of a restaurant, stored column by column """
+    __slots__ = ("order_id", "created_at", "status", "product_id", "quantity", "price")
+
+    def __init__(self, order_id, created_at, status, product_id, quantity, price):
+        self.order_id = order_id
+        self.created_at = created_at  # Seconds since epoch, int64
+        self.status = status
+        self.product_id = product_id  # -1 for orders without lines
+        self.quantity = quantity
+        self.price = price
+
+    def __len__(self):
+        return len(self.order_id)
+
+    def between(self, start: Optional[int] = None, end: Optional[int] = None) -> "OrderFrame":
+        mask = np.ones(len(self), dtype=bool)
+        if start is not None:
+            mask &= self.created_at >= start
+        if end is not None:
+            mask &= self.created_at < end
+        return OrderFrame(*(getattr(self, column)[mask] for column in self.__slots__))
+
+    def orders(self):
+        """ Index of the first line of every order and the order index of every line """
+        _, first, inverse = np.unique(self.order_id, return_index=True, return_inverse=True)
+        return first, inverse
+
+
+def load_frame(restaurant_id: int) -> OrderFrame:
+    stmt = select(
+        Order.id,
+        cast(func.strftime("%s", Order.created_at), Integer),
+        Order.status,
+        func.coalesce(order_items.c.product_id, -1),
+        func.coalesce(order_items.c.quantity, 0),
+        func.coalesce(order_items.c.price, 0),
+    ).outerjoin(order_items, order_items.c.order_id == Order.id).where(Order.restaurant_id == restaurant_id)
+
+    with sync_engine.connect() as conn:
+        rows = conn.execute(stmt).all()
+
+    count = len(rows)
+    columns = list(zip(*rows)) if rows else [()] * 6
+    return OrderFrame(
+        np.fromiter(columns[0], dtype=np.int64, count=count),
+        np.fromiter(columns[1], dtype=np.int64, count=count),
+        np.fromiter((STATUS_CODES[status] for status in columns[2]), dtype=np.int8, count=count),
+        np.fromiter(columns[3], dtype=np.int64, count=count),
+        np.fromiter(columns[4], dtype=np.int64, count=count),
+        np.fromiter(columns[5], dtype=np.int64, count=count),
+    )
+
+
+class FrameCache:
+    """ LRU of restaurant frames kept for ttl seconds, a load started before an invalidation is never stored """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        # restaurant id -> (frame, monotonic expiry)
+        self.frames: "OrderedDict[int, Tuple[OrderFrame, float]]" = OrderedDict()
+        self.generations: Dict[int, int] = {}
+        self.lock = threading.Lock()
+
+    def get(self, restaurant_id: int) -> OrderFrame:
+        with self.lock:
+            entry = self.frames.get(restaurant_id)
+            if entry is not None and entry[1] > time.monotonic():
+                self.frames.move_to_end(restaurant_id)
+                return entry[0]
+            generation = self.generations.get(restaurant_id, 0)
+
+        frame = load_frame(restaurant_id)
+
+        with self.lock:
+            if self.generations.get(restaurant_id, 0) == generation:
+                self.frames[restaurant_id] = (frame, time.monotonic() + self.ttl)
+                self.frames.move_to_end(restaurant_id)
+                if len(self.frames) > self.max_size:
+                    self.frames.popitem(last=False)
+        return frame
+
+    def invalidate(self, restaurant_id: int):
+        with self.lock:
+            self.generations[restaurant_id] = self.generations.get(restaurant_id, 0) + 1
+            self.frames.pop(restaurant_id, None)
+
+
+cache = FrameCache(ANALYTICS_CACHE_SIZE, ANALYTICS_CACHE_TTL_SECONDS)
+
+
+def invalidate(restaurant_id: int):
+    cache.invalidate(restaurant_id)
+
+
+def _timestamp(day: Optional[date]) -> Optional[int]:
+    # SQLite strftime('%s') reads the naive created_at as UTC, so do the same here
+    return calendar.timegm(day.timetuple()) if day else None
+
+
+def _day(days_since_epoch) -> str:
+    return date.fromordinal(date(1970, 1, 1).toordinal() + int(days_since_epoch)).isoformat()
+
+
+def _money(cents) -> float:
+    return round(float(cents) / 100, 2)
+
+
+def _product_names(product_ids) -> Dict[int, str]:
+    if not len(product_ids):
+        return {}
+    with sync_engine.connect() as conn:
+        rows = conn.execute(select(Product.id, Product.name).where(Product.id.in_([int(product_id) for product_id in product_ids]))).all()
+    return dict(rows)
+
+
+def summary(frame: OrderFrame, top: int = 5) -> dict:
+    """ The DataSet.txt metrics: daily earnings and orders, products sold and top products """
+    first, _ = frame.orders()
+    order_days = frame.created_at[first] // SECONDS_PER_DAY
+    placed = frame.status[first] != CANCELED
+
+    sold = (frame.status == COMPLETED) & (frame.product_id >= 0)
+    line_days = frame.created_at[sold] // SECONDS_PER_DAY
+    line_revenue = frame.quantity[sold] * frame.price[sold]
+
+    days = np.union1d(order_days[placed], line_days)
+    orders_per_day = np.bincount(np.searchsorted(days, order_days[placed]), minlength=len(days))
+    earnings_per_day = np.bincount(np.searchsorted(days, line_days), weights=line_revenue, minlength=len(days))
+
+    product_ids, product_index = np.unique(frame.product_id[sold], return_inverse=True)
+    quantity_sold = np.bincount(product_index, weights=frame.quantity[sold], minlength=len(product_ids))
+    revenue = np.bincount(product_index, weights=line_revenue, minlength=len(product_ids))
+    ranking = np.argsort(-quantity_sold, kind="stable")
+    names = _product_names(product_ids)
+
+    products = [
+        {"id": int(product_ids[i]), "name": names.get(int(product_ids[i])), "quantity_sold": int(quantity_sold[i]),
+         "total_revenue": _money(revenue[i])}
+        for i in ranking
+    ]
+
+    return {
+        "orders": int(placed.sum()),
+        "earnings": _money(line_revenue.sum()),
+        "products_sold": int(frame.quantity[sold].sum()),
+        "daily_earnings": [{"date": _day(day), "earnings": _money(value)} for day, value in zip(days, earnings_per_day)],
+        "daily_orders": [{"date": _day(day), "orders": int(value)} for day, value in zip(days, orders_per_day)],
+        "products": products,
+        "top_products": products[:top],
+    }
+
+
+def heatmap(frame: OrderFrame) -> dict:
+    """ Orders per weekday (Monday first) and hour of day """
+    first, _ = frame.orders()
+    created_at = frame.created_at[first][frame.status[first] != CANCELED]
+    weekday = (created_at // SECONDS_PER_DAY + 3) % 7  # 1970-01-01 was a Thursday
+    hour = (created_at % SECONDS_PER_DAY) // 3600
+    counts = np.bincount(weekday * 24 + hour, minlength=7 * 24).reshape(7, 24)
+    return {"weekdays": ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"], "hours": counts.tolist()}
+
+
+def baskets(frame: OrderFrame) -> dict:
+    """ Distribution of the number of items per non canceled order """
+    first, inverse = frame.orders()
+    sizes = np.bincount(inverse, weights=frame.quantity, minlength=len(first)).astype(np.int64)
+    sizes = sizes[frame.status[first] != CANCELED]
+    if not len(sizes):
+        return {"orders": 0, "mean": 0.0, "median": 0.0, "distribution": []}
+    distribution = np.bincount(sizes)
+    present = np.nonzero(distribution)[0]
+    return {
+        "orders": int(len(sizes)),
+        "mean": round(float(sizes.mean()), 2),
+        "median": float(np.median(sizes)),
+        "distribution": [{"items": int(size), "orders": int(distribution[size])} for size in present],
+    }
+
+
+def _run(restaurant_id: int, metric, start: Optional[date], end: Optional[date]) -> dict:
+    frame = cache.get(restaurant_id).between(_timestamp(start), _timestamp(end))
+    return metric(frame)
+
+
+async def compute(restaurant_id: int, metric, start: Optional[date] = None, end: Optional[date] = None) -> dict:
+    """ Load (or reuse) the restaurant frame and run metric on it off the event loop, end is exclusive """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, _run, restaurant_id, metric, start, end)
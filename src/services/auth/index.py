@@ -1,36 +1,101 @@
 import jwt
+import hashlib
+import uuid
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Dict
-from fastapi import Request, HTTPException, Depends
+from typing import Dict, Optional
+from fastapi import Request, HTTPException, Depends, WebSocket, WebSocketException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+import src.services.revocation.index as revocation
 
 import os
 from dotenv import load_dotenv 
 load_dotenv() 
 
+# Resolved once at startup instead of on every encode/decode
+JWT_SECRET = os.getenv("JWT_SECRET", "secret")
+JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 4328))
+JWT_CACHE_SIZE = int(os.getenv("JWT_CACHE_SIZE", 10000))
+
 def sign_jwt(user) -> Dict[str, str]:
-    expires_at = datetime.now() + timedelta(minutes=int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 4328)))
+    expires_at = datetime.now() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
 
     payload = {
         "id": user.id,
         "email": user.email,
         "role": user.role,
-        "expires": expires_at.timestamp()
+        "expires": expires_at.timestamp(),
+        # Token id, what logout and revoke put on the denylist
+        "jti": uuid.uuid4().hex,
     }
-    token = jwt.encode(payload, os.getenv("JWT_SECRET", "secret"), algorithm=os.getenv("JWT_ALGORITHM", "HS256"))
+    token = jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
     userToSend = user
     userToSend.hashed_password = None
 
     return {"token": { "access_token": token, "expires_in": int(expires_at.timestamp()) }, "token_type": "bearer", "user": userToSend}
 
+
+class TokenCache:
+    """ Bounded LRU of verified token -> claims, an entry is dropped once its own "expires" has passed """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.entries: "OrderedDict[str, dict]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> Optional[dict]:
+        claims = self.entries.get(token)
+        if claims is None:
+            self.misses += 1
+            return None
+        if claims["expires"] < datetime.now().timestamp():
+            del self.entries[token]
+            self.misses += 1
+            return None
+        self.entries.move_to_end(token)
+        self.hits += 1
+        return claims
+
+    def put(self, token: str, claims: dict):
+        self.entries[token] = claims
+        self.entries.move_to_end(token)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self) -> dict:
+        return {"size": len(self.entries), "max_size": self.max_size, "hits": self.hits, "misses": self.misses}
+
+
+token_cache = TokenCache(JWT_CACHE_SIZE)
+
+def legacy_jti(token: str) -> str:
+    """ Tokens signed before they carried a jti stay valid until they expire, they are revoked by their hash instead """
+    return "sha256:" + hashlib.sha256(token.encode()).hexdigest()
+
 def decode_jwt(token: str) -> dict:
+    claims = token_cache.get(token)
+    if claims is not None:
+        return claims
     try:
-        decoded_token = jwt.decode(token, os.getenv("JWT_SECRET", "secret"), algorithms=[(os.getenv("JWT_ALGORITHM", "HS256"))])
-        return decoded_token if decoded_token["expires"] >= datetime.now().timestamp() else None
+        decoded_token = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        if decoded_token["expires"] < datetime.now().timestamp():
+            return None
+        decoded_token.setdefault("jti", legacy_jti(token))
+        token_cache.put(token, decoded_token)
+        return decoded_token
     except:
         return {}
 
+async def is_revoked(payload: dict) -> bool:
+    """ payload from decode_jwt, which always has a jti """
+    return await revocation.denylist.is_revoked(payload["jti"])
+
 class JWTBearer(HTTPBearer):
     def __init__(self, auto_error: bool = True):
         super(JWTBearer, self).__init__(auto_error=auto_error)
@@ -40,23 +105,12 @@ class JWTBearer(HTTPBearer):
         if credentials:
             if not credentials.scheme == "Bearer":
                 raise HTTPException(status_code=403, detail="Invalid authentication scheme.")
-            if not self.verify_jwt(credentials.credentials):
-                raise HTTPException(status_code=403, detail="Invalid token or expired token.")
             payload = decode_jwt(credentials.credentials)
-            return payload 
+            if not payload or await is_revoked(payload):
+                raise HTTPException(status_code=403, detail="Invalid token or expired token.")
+            return payload
         else:
             raise HTTPException(status_code=403, detail="Invalid authorization code.")
-
-    def verify_jwt(self, jwtoken: str) -> bool:
-        isTokenValid: bool = False
-        try:
-            payload = decode_jwt(jwtoken)
-        except:
-            payload = None
-        if payload:
-            isTokenValid = True
-
-        return isTokenValid
     
 def admin_required(token: dict = Depends(JWTBearer())):
     if token.get("role") != "admin":
@@ -71,4 +125,16 @@ def owner_required(token: dict = Depends(JWTBearer())):
 def owner_or_admin_required(token: dict = Depends(JWTBearer())):
     if token.get("role") not in ["owner", "admin"]:
         raise HTTPException(status_code=403, detail="Owner or Admin privileges required.")
-    return token
\ No newline at end of file
+    return token
+
+async def websocket_owner_or_admin_required(websocket: WebSocket, token: Optional[str] = None):
+    """ Browsers cannot set headers on a WebSocket, so the token may also come as ?token= """
+    scheme, _, credentials = websocket.headers.get("authorization", "").partition(" ")
+    if scheme != "Bearer":
+        credentials = token
+    payload = decode_jwt(credentials) if credentials else None
+    if not payload or await is_revoked(payload):
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason="Invalid token or expired token.")
+    if payload.get("role") not in ["owner", "admin"]:
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason="Owner or Admin privileges required.")
+    return payload
@@ -0,0 +1,162 @@
+import asyncio
+import itertools
+import json
+import time
+from collections import deque
+from typing import AsyncIterator, Deque, Dict, Optional, Set
+import os
+from dotenv import load_dotenv
+load_dotenv()
+
+# In-process only: every worker has its own broker, run the feed behind a single worker
+FEED_QUEUE_SIZE = int(os.getenv("FEED_QUEUE_SIZE", 256))
+FEED_HISTORY_SIZE = int(os.getenv("FEED_HISTORY_SIZE", 512))
+FEED_HEARTBEAT_SECONDS = float(os.getenv("FEED_HEARTBEAT_SECONDS", 15))
+
+
+class Event:
+    __slots__ = ("id", "sequence", "restaurant_id", "type", "data")
+
+    def __init__(self, id: str, sequence: int, restaurant_id: int, type: str, data: dict):
+        self.id = id
+        self.sequence = sequence
+        self.restaurant_id = restaurant_id
+        self.type = type
+        self.data = data
+
+    def to_dict(self) -> dict:
+        return {"id": self.id, "type": self.type, "data": self.data}
+
+    def sse(self) -> str:
+        return f"id: {self.id}\nevent: {self.type}\ndata: {json.dumps(self.data, separators=(',', ':'), default=str)}\n\n"
+
+
+class Subscription:
+    """ Bounded queue of one client, a client that falls behind is closed and resumes from its last event id """
+
+    def __init__(self, restaurant_id: int, size: int):
+        self.restaurant_id = restaurant_id
+        self.queue: "asyncio.Queue[Optional[Event]]" = asyncio.Queue(size)
+        self.overflowed = False
+
+    def push(self, event: Optional[Event]) -> bool:
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def close(self):
+        # Whatever is queued is dropped, the client gets it again from the history on reconnect
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+    async def next(self, timeout: float) -> Optional[Event]:
+        """ Next event, None once closed, raises TimeoutError when nothing happened for timeout seconds """
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class Broker:
+    def __init__(self, queue_size: int, history_size: int):
+        self.queue_size = queue_size
+        self.history_size = history_size
+        # Event ids are "<epoch>:<sequence>", an id from before a restart is recognised as unknown
+        self.epoch = str(int(time.time()))
+        self.sequence = itertools.count(1)
+        self.history: Dict[int, Deque[Event]] = {}
+        self.evicted: Dict[int, int] = {}
+        self.subscribers: Dict[int, Set[Subscription]] = {}
+        self.dropped = 0
+
+    def publish(self, restaurant_id: int, type: str, data: dict) -> Event:
+        sequence = next(self.sequence)
+        event = Event(f"{self.epoch}:{sequence}", sequence, restaurant_id, type, data)
+
+        history = self.history.setdefault(restaurant_id, deque())
+        history.append(event)
+        if len(history) > self.history_size:
+            self.evicted[restaurant_id] = history.popleft().sequence
+
+        for subscription in list(self.subscribers.get(restaurant_id, ())):
+            if not subscription.push(event):
+                subscription.overflowed = True
+                subscription.close()
+                self.unsubscribe(subscription)
+                self.dropped += 1
+        return event
+
+    def missed(self, restaurant_id: int, last_event_id: str) -> Optional[list]:
+        """ Events after last_event_id, None when some of them are no longer in the history """
+        epoch, _, sequence = last_event_id.partition(":")
+        if epoch != self.epoch or not sequence.isdigit():
+            return None
+        sequence = int(sequence)
+        if sequence < self.evicted.get(restaurant_id, 0):
+            return None
+        return [event for event in self.history.get(restaurant_id, ()) if event.sequence > sequence]
+
+    def subscribe(self, restaurant_id: int, last_event_id: Optional[str] = None) -> Subscription:
+        subscription = Subscription(restaurant_id, self.queue_size)
+        if last_event_id:
+            missed = self.missed(restaurant_id, last_event_id)
+            if missed is None or len(missed) > self.queue_size:
+                # Too far behind to replay (or more than its queue holds), the client reloads the order
+                # list and follows from here
+                missed = [Event(f"{self.epoch}:{next(self.sequence)}", 0, restaurant_id, "reset", {})]
+            for event in missed:
+                subscription.push(event)
+        self.subscribers.setdefault(restaurant_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self.subscribers.get(subscription.restaurant_id)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self.subscribers[subscription.restaurant_id]
+
+    async def stream(self, restaurant_id: int, last_event_id: Optional[str] = None, heartbeat: float = FEED_HEARTBEAT_SECONDS) -> AsyncIterator[Optional[Event]]:
+        """ Events of a restaurant from last_event_id on, None after heartbeat seconds without one, ends when the client falls behind """
+        subscription = self.subscribe(restaurant_id, last_event_id)
+        try:
+            while True:
+                try:
+                    event = await subscription.next(heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if event is None:
+                    return
+                yield event
+        finally:
+            self.unsubscribe(subscription)
+
+    def stats(self) -> dict:
+        return {
+            "restaurants": len(self.subscribers),
+            "subscribers": sum(len(subscribers) for subscribers in self.subscribers.values()),
+            "dropped": self.dropped,
+        }
+
+
+broker = Broker(FEED_QUEUE_SIZE, FEED_HISTORY_SIZE)
+
+
+def order_created(order, lines) -> Event:
+    return broker.publish(order.restaurant_id, "order.created", {
+        "id": order.id,
+        "customer_id": order.customer_id,
+        "status": order.status,
+        "total_price": order.total_price,
+        "created_at": order.created_at.isoformat() if order.created_at else None,
+        "products": [line.to_dict() for line in lines],
+    })
+
+
+def order_updated(order, status: str) -> Event:
+    return broker.publish(order.restaurant_id, "order.updated", {"id": order.id, "status": status})
+
+
+def order_deleted(order) -> Event:
+    return broker.publish(order.restaurant_id, "order.deleted", {"id": order.id})
@@ -0,0 +1,124 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Set
+import orjson
+from fastapi import Request, Response
+from pydantic import BaseModel
+
+import os
+from dotenv import load_dotenv 
+load_dotenv()
+
+CATALOG_CACHE_SIZE = int(os.getenv("CATALOG_CACHE_SIZE", 2048))
+# Bounds how long another worker's catalog changes go unseen, changes made here invalidate at once
+CATALOG_CACHE_TTL_SECONDS = float(os.getenv("CATALOG_CACHE_TTL_SECONDS", 60))
+
+
+def request_key(request: Request) -> str:
+    """ Route path plus query parameters in a stable order """
+    return request.url.path + "?" + "&".join(f"{name}={value}" for name, value in sorted(request.query_params.multi_items()))
+
+
+def _encode_default(value):
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def encode(content) -> bytes:
+    """ Response models (also nested in dicts and lists) to JSON bytes """
+    return orjson.dumps(content, default=_encode_default)
+
+
+def make_etag(key: str, rows: Iterable, extra: Iterable = ()) -> str:
+    """ Strong ETag from the id and updated_at of every row in the response, plus values such as totals """
+    digest = hashlib.sha1(key.encode())
+    for value in extra:
+        digest.update(f"|{value}".encode())
+    for row in rows:
+        digest.update(f"|{row.id}:{row.updated_at.isoformat() if row.updated_at else ''}".encode())
+    return f'"{digest.hexdigest()}"'
+
+
+class CachedResponse:
+    __slots__ = ("body", "etag", "tags", "expires")
+
+    def __init__(self, body: bytes, etag: str, tags: Set[str], expires: float = float("inf")):
+        self.body = body
+        self.etag = etag
+        self.tags = tags
+        self.expires = expires  # time.monotonic()
+
+    def response(self, request: Request) -> Response:
+        headers = {"ETag": self.etag, "Cache-Control": "no-cache"}
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and self.etag in [tag.strip() for tag in if_none_match.split(",")]:
+            return Response(status_code=304, headers=headers)
+        return Response(content=self.body, media_type="application/json", headers=headers)
+
+
+class ResponseCache:
+    """
+    LRU of serialized responses kept for ttl seconds. Every entry carries tags and invalidate(tag) drops all
+    entries with it. A response computed while an invalidation happened is served but not stored.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self.tagged: Dict[str, Set[str]] = {}
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        entry = self.entries.get(key)
+        if entry is not None and entry.expires <= time.monotonic():
+            self.remove(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key: str, content, rows: Iterable, tags: Iterable[str], generation: int, extra: Iterable = ()) -> CachedResponse:
+        entry = CachedResponse(encode(content), make_etag(key, rows, extra), set(tags), time.monotonic() + self.ttl)
+        if generation != self.generation:
+            return entry
+
+        self.remove(key)
+        self.entries[key] = entry
+        for tag in entry.tags:
+            self.tagged.setdefault(tag, set()).add(key)
+        while len(self.entries) > self.max_entries:
+            self.remove(next(iter(self.entries)))
+        return entry
+
+    def remove(self, key: str):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry.tags:
+            keys = self.tagged.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tagged[tag]
+
+    def invalidate(self, *tags: str):
+        self.generation += 1
+        for tag in tags:
+            for key in list(self.tagged.get(tag, ())):
+                self.remove(key)
+
+    def stats(self) -> dict:
+        return {"entries": len(self.entries), "max_entries": self.max_entries, "ttl_seconds": self.ttl, "hits": self.hits, "misses": self.misses}
+
+
+# GET /restaurants and /restaurants/{restaurant_id}, tagged with "restaurants" (every list page)
+# and "restaurant:{id}". Menus are served by the products router's MenuSnapshots
+catalog_cache = ResponseCache(CATALOG_CACHE_SIZE, CATALOG_CACHE_TTL_SECONDS)
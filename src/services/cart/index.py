@@ -0,0 +1,85 @@
+from typing import Dict, List, Optional
+from fastapi import HTTPException
+from sqlalchemy import select
+from src.api.products.model import Product
+from src.api.orderItems.model import order_items
+
+
+def discounted_price(price: int, discount: Optional[int]) -> int:
+    """ Unit price in cents after a percentage discount, rounded half up """
+    if not discount:
+        return price
+    return (price * (100 - discount) + 50) // 100
+
+
+class CartLine:
+    __slots__ = ("product_id", "name", "quantity", "unit_price")
+
+    def __init__(self, product_id: int, name: str, quantity: int, unit_price: int):
+        self.product_id = product_id
+        self.name = name
+        self.quantity = quantity
+        self.unit_price = unit_price
+
+    @property
+    def total(self) -> int:
+        return self.quantity * self.unit_price
+
+    def as_tuple(self):
+        return (self.product_id, self.quantity, self.unit_price)
+
+    def to_dict(self) -> dict:
+        return {
+            "product_id": self.product_id,
+            "name": self.name,
+            "quantity": self.quantity,
+            "unit_price": self.unit_price,
+            "total": self.total,
+        }
+
+
+def merge_cart(product_ids: List[int], quantities: List[int]) -> Dict[int, int]:
+    """ Quantity per product, repeated products are summed since order_items is keyed by (order, product) """
+    if len(product_ids) != len(quantities):
+        raise HTTPException(status_code=400, detail="products and quantity must have the same length")
+    if not product_ids:
+        raise HTTPException(status_code=400, detail="The order has no products")
+
+    cart: Dict[int, int] = {}
+    for product_id, quantity in zip(product_ids, quantities):
+        if quantity <= 0:
+            raise HTTPException(status_code=400, detail=f"Invalid quantity for product with ID {product_id}")
+        cart[product_id] = cart.get(product_id, 0) + quantity
+    return cart
+
+
+async def price_cart(session, restaurant_id: int, product_ids: List[int], quantities: List[int]) -> List[CartLine]:
+    """ Validate and price every cart line with a single products query """
+    cart = merge_cart(product_ids, quantities)
+
+    stmt = select(
+        Product.id, Product.name, Product.price, Product.discount, Product.status, Product.visible, Product.restaurant_id
+    ).where(Product.id.in_(cart.keys()))
+    result = await session.execute(stmt)
+    products = {row.id: row for row in result.all()}
+
+    lines = []
+    for product_id, quantity in cart.items():
+        product = products.get(product_id)
+        if product is None:
+            raise HTTPException(status_code=404, detail=f"Product with ID {product_id} not found")
+        if product.restaurant_id != restaurant_id:
+            raise HTTPException(status_code=400, detail=f"Product with ID {product_id} does not belong to this restaurant")
+        if product.status != "available" or not product.visible:
+            raise HTTPException(status_code=400, detail=f"Product with ID {product_id} is not available")
+
+        lines.append(CartLine(product.id, product.name, quantity, discounted_price(product.price, product.discount)))
+    return lines
+
+
+async def insert_order_lines(session, order_id: int, lines: List[CartLine]):
+    """ Insert every order_items row of an order in one executemany """
+    await session.execute(order_items.insert(), [
+        {"order_id": order_id, "product_id": line.product_id, "name": line.name, "quantity": line.quantity, "price": line.unit_price}
+        for line in lines
+    ])
@@ -0,0 +1,193 @@
+import asyncio
+import hashlib
+import sys
+import time
+from array import array
+from collections import OrderedDict
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, Optional, Type
+import orjson
+from fastapi import HTTPException, Request, Response
+from pydantic import BaseModel
+from sqlalchemy import select
+from src.services.SQLite.index import read_session, register_models
+from src.services.cache.index import CachedResponse
+from src.services.projection.index import columns
+from src.api.products.model import Product
+from src.api.restaurants.model import Restaurant
+import src.services.pagination.index as pagination
+
+import os
+from dotenv import load_dotenv
+load_dotenv()
+
+# Bounds how long another worker's menu changes go unseen, changes made here are applied at once
+CATALOG_SNAPSHOT_TTL_SECONDS = float(os.getenv("CATALOG_SNAPSHOT_TTL_SECONDS", 60))
+# Menus kept at once, the least recently read is dropped first
+CATALOG_SNAPSHOT_MAX_MENUS = int(os.getenv("CATALOG_SNAPSHOT_MAX_MENUS", 2000))
+
+
+class Menu:
+    """ Products of one restaurant ordered by id: the ids in an array, each product as its response JSON """
+    __slots__ = ("ids", "bodies", "digest", "expires", "size")
+
+    def __init__(self, ids: Iterable[int], bodies: Iterable[bytes], expires: float):
+        self.ids = array("q", ids)
+        self.bodies = tuple(bodies)
+        digest = hashlib.sha1()
+        for body in self.bodies:
+            digest.update(body)
+        self.digest = digest.hexdigest()
+        self.expires = expires
+        # Bytes held by the ids, the tuple and the JSON bodies
+        self.size = sys.getsizeof(self.ids) + sys.getsizeof(self.bodies) + sum(sys.getsizeof(body) for body in self.bodies)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def get(self, product_id: int) -> Optional[bytes]:
+        position = bisect_left(self.ids, product_id)
+        if position < len(self.ids) and self.ids[position] == product_id:
+            return self.bodies[position]
+        return None
+
+    def offset_page(self, skip: int, limit: int) -> bytes:
+        # Same as OFFSET/LIMIT in SQLite, a negative limit is no limit
+        start = max(skip, 0)
+        products = self.bodies[start:] if limit < 0 else self.bodies[start:start + limit]
+        return b'{"total":%d,"skip":%d,"limit":%d,"products":[%b]}' % (len(self.ids), skip, limit, b",".join(products))
+
+    def keyset_page(self, limit: int, cursor: str) -> bytes:
+        """ pagination.keyset_page on Product.id, answered by bisecting the ids """
+        if limit <= 0:
+            raise HTTPException(status_code=400, detail="limit must be positive")
+        direction = "next"
+        if cursor:
+            (key,), direction = pagination.decode_cursor(cursor, [Product.id])
+            if direction == "next":
+                start = bisect_right(self.ids, key)
+                end = min(start + limit + 1, len(self.ids))
+            else:
+                end = bisect_left(self.ids, key)
+                start = max(end - limit - 1, 0)
+        else:
+            start, end = 0, min(limit + 1, len(self.ids))
+
+        has_more = end - start > limit
+        if direction == "next":
+            end = min(end, start + limit)
+        else:
+            start = max(start, end - limit)
+
+        next_cursor = prev_cursor = None
+        if end > start:
+            has_next = has_more if direction == "next" else True
+            has_prev = bool(cursor) if direction == "next" else has_more
+            next_cursor = pagination.encode_cursor((self.ids[end - 1],), "next") if has_next else None
+            prev_cursor = pagination.encode_cursor((self.ids[start],), "prev") if has_prev else None
+        return b'{"total":%d,"limit":%d,"next":%b,"prev":%b,"products":[%b]}' % (
+            len(self.ids), limit, orjson.dumps(next_cursor), orjson.dumps(prev_cursor), b",".join(self.bodies[start:end]))
+
+
+class MenuSnapshots:
+    """
+    Menus answered from memory with no database access and no ORM objects. A menu is loaded with one query
+    on first use, and rebuilt then swapped in whole when a write to it commits, so a reader sees the menu
+    from before or after a write, never in between. A load that overlapped a write is not kept, and neither
+    is the empty menu of a restaurant that does not exist.
+    """
+
+    def __init__(self, schema: Type[BaseModel], ttl: float, max_menus: int = CATALOG_SNAPSHOT_MAX_MENUS):
+        self.schema = schema
+        # columns() configures the mappers, their relationships need every model whatever was imported so far
+        register_models()
+        self.columns = [getattr(Product, attribute.key) for attribute in columns(Product, schema)]
+        self.ttl = ttl
+        self.max_menus = max(max_menus, 1)
+        self.menus: "OrderedDict[int, Menu]" = OrderedDict()
+        # product id -> restaurant id, for lookups by product
+        self.located: Dict[int, int] = {}
+        self.versions: Dict[int, int] = {}
+        self.loading: Dict[int, asyncio.Task] = {}
+        self.hits = 0
+        self.loads = 0
+        self.rebuilds = 0
+        self.evictions = 0
+
+    def _drop(self, restaurant_id: int):
+        menu = self.menus.pop(restaurant_id, None)
+        if menu is not None:
+            for product_id in menu.ids:
+                if self.located.get(product_id) == restaurant_id:
+                    del self.located[product_id]
+
+    async def _load(self, restaurant_id: int) -> Menu:
+        version = self.versions.get(restaurant_id, 0)
+        async with read_session() as conn:
+            result = await conn.execute(select(*self.columns).where(Product.restaurant_id == restaurant_id).order_by(Product.id))
+            rows = result.all()
+            exists = bool(rows) or (await conn.execute(select(Restaurant.id).where(Restaurant.id == restaurant_id))).first() is not None
+        menu = Menu((row.id for row in rows), (self.schema.model_validate(row).model_dump_json().encode() for row in rows),
+                    time.monotonic() + self.ttl)
+        self.loads += 1
+        if exists and self.versions.get(restaurant_id, 0) == version:
+            self._drop(restaurant_id)
+            self.menus[restaurant_id] = menu
+            for product_id in menu.ids:
+                self.located[product_id] = restaurant_id
+            while len(self.menus) > self.max_menus:
+                self._drop(next(iter(self.menus)))
+                self.evictions += 1
+        return menu
+
+    async def menu(self, restaurant_id: int) -> Menu:
+        menu = self.menus.get(restaurant_id)
+        if menu is not None and menu.expires > time.monotonic():
+            self.hits += 1
+            self.menus.move_to_end(restaurant_id)
+            return menu
+        # Concurrent readers of a cold menu wait for the same load
+        task = self.loading.get(restaurant_id)
+        if task is None:
+            task = self.loading[restaurant_id] = asyncio.ensure_future(self._load(restaurant_id))
+            task.add_done_callback(lambda _: self.loading.pop(restaurant_id, None))
+        return await asyncio.shield(task)
+
+    async def product(self, product_id: int) -> Optional[bytes]:
+        restaurant_id = self.located.get(product_id)
+        if restaurant_id is not None:
+            body = (await self.menu(restaurant_id)).get(product_id)
+            if body is not None:
+                return body
+        # Not loaded yet, or moved to another restaurant since
+        async with read_session() as conn:
+            restaurant_id = (await conn.execute(select(Product.restaurant_id).where(Product.id == product_id))).scalar()
+        if restaurant_id is None:
+            return None
+        return (await self.menu(restaurant_id)).get(product_id)
+
+    async def rebuild(self, *restaurant_ids: int):
+        """ Call after committing a write to these restaurants' products, returns once the new menus are in place """
+        for restaurant_id in set(restaurant_ids):
+            self.versions[restaurant_id] = self.versions.get(restaurant_id, 0) + 1
+            self.rebuilds += 1
+            if restaurant_id in self.menus:
+                await self._load(restaurant_id)
+
+    def forget(self, restaurant_id: int):
+        """ Call after deleting the restaurant: drops its menu and any load of it already running """
+        self.versions[restaurant_id] = self.versions.get(restaurant_id, 0) + 1
+        self._drop(restaurant_id)
+
+    def response(self, request: Request, key: str, menu: Menu, body: bytes) -> Response:
+        """ Served like the catalog cache, with an ETag from the request and the menu's content """
+        return CachedResponse(body, f'"{hashlib.sha1(f"{key}|{menu.digest}".encode()).hexdigest()}"', set()).response(request)
+
+    def memory(self) -> int:
+        return sum(menu.size for menu in self.menus.values()) + sys.getsizeof(self.located)
+
+    def stats(self) -> dict:
+        return {
+            "menus": len(self.menus), "max_menus": self.max_menus, "products": len(self.located), "bytes": self.memory(),
+            "hits": self.hits, "loads": self.loads, "rebuilds": self.rebuilds, "evictions": self.evictions,
+        }
@@ -0,0 +1,99 @@
+import csv
+import io
+import json
+from datetime import date, datetime, time, timedelta
+from typing import AsyncIterator, List, Optional
+from sqlalchemy import select
+from src.services.SQLite.index import read_session
+from src.api.orders.model import Order
+from src.api.orderItems.model import order_items
+import os
+from dotenv import load_dotenv
+load_dotenv()
+
+# Rows fetched from the cursor per round trip, memory is bounded by this and not by the history
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 1000))
+
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+CSV_COLUMNS = ["order_id", "restaurant_id", "customer_id", "status", "created_at", "total_price", "product_id", "name", "quantity", "price"]
+
+
+def export_statement(restaurant_ids: Optional[List[int]] = None, start: Optional[date] = None, end: Optional[date] = None):
+    """
+    One row per order line (orders without lines give one row of NULLs), grouped by order; end is inclusive.
+    Restaurant by restaurant in created_at order, the order of ix_orders_restaurant_id_created_at_id, so rows
+    stream from the index without a scan of other restaurants' orders or a sort of the whole export
+    """
+    stmt = select(
+        Order.id, Order.restaurant_id, Order.customer_id, Order.status, Order.created_at, Order.total_price,
+        order_items.c.product_id, order_items.c.name, order_items.c.quantity, order_items.c.price,
+    ).outerjoin(order_items, order_items.c.order_id == Order.id)
+
+    if restaurant_ids is not None:
+        stmt = stmt.where(Order.restaurant_id.in_(restaurant_ids))
+    if start:
+        stmt = stmt.where(Order.created_at >= datetime.combine(start, time.min))
+    if end:
+        stmt = stmt.where(Order.created_at < datetime.combine(end + timedelta(days=1), time.min))
+    return stmt.order_by(Order.restaurant_id, Order.created_at, Order.id, order_items.c.product_id)
+
+
+async def stream_rows(stmt) -> AsyncIterator[list]:
+    """ Batches of rows from a server side cursor, the session lives as long as the response """
+    async with read_session() as conn:
+        result = await conn.stream(stmt.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        async for rows in result.partitions():
+            yield rows
+
+
+def _timestamp(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+def _order(row) -> dict:
+    return {
+        "id": row.id,
+        "restaurant_id": row.restaurant_id,
+        "customer_id": row.customer_id,
+        "status": row.status,
+        "created_at": _timestamp(row.created_at),
+        "total_price": row.total_price,
+        "lines": [],
+    }
+
+
+async def stream_ndjson(stmt) -> AsyncIterator[bytes]:
+    """ One JSON object per order with its lines, an order is written once the next one starts """
+    order = None
+    async for rows in stream_rows(stmt):
+        out = []
+        for row in rows:
+            if order is None or order["id"] != row.id:
+                if order is not None:
+                    out.append(json.dumps(order, separators=(",", ":")))
+                order = _order(row)
+            if row.product_id is not None:
+                order["lines"].append({"product_id": row.product_id, "name": row.name, "quantity": row.quantity, "price": row.price})
+        if out:
+            yield ("\n".join(out) + "\n").encode()
+    if order is not None:
+        yield (json.dumps(order, separators=(",", ":")) + "\n").encode()
+
+
+async def stream_csv(stmt) -> AsyncIterator[bytes]:
+    """ One CSV row per order line, the header goes out before the query runs """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    yield buffer.getvalue().encode()
+
+    async for rows in stream_rows(stmt):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(
+            (row.id, row.restaurant_id, row.customer_id, row.status, _timestamp(row.created_at), row.total_price,
+             row.product_id, row.name, row.quantity, row.price)
+            for row in rows
+        )
+        yield buffer.getvalue().encode()
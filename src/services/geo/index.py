@@ -0,0 +1,73 @@
+import math
+import os
+from typing import List, Optional, Tuple
+import numpy as np
+from dotenv import load_dotenv
+load_dotenv()
+
+""" Distances on the WGS84 sphere for GET /restaurants/nearby """
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+NEARBY_MAX_RADIUS_KM = float(os.getenv("NEARBY_MAX_RADIUS_KM", 50))
+# Curvature the planar approximation ignores, relative, (50 km / R) ** 2 is far below it
+PLANAR_SLACK = 1e-3
+# The R*Tree stores 32-bit floats, boxes are off by less than a metre anywhere on the globe
+ROUNDING_KM = 1e-3
+
+# (min_lat, max_lat, min_lon, max_lon)
+Box = Tuple[float, float, float, float]
+
+
+def bounding_boxes(lat: float, lon: float, radius_km: float) -> List[Box]:
+    """
+    Boxes that contain every point within radius_km of (lat, lon). Near a pole the box spans every longitude,
+    across the antimeridian it is split in two so each box can be matched against the R*Tree as is.
+    """
+    dlat = radius_km / KM_PER_DEGREE
+    min_lat, max_lat = lat - dlat, lat + dlat
+    if min_lat <= -90 or max_lat >= 90:
+        return [(max(min_lat, -90.0), min(max_lat, 90.0), -180.0, 180.0)]
+
+    # Widest longitude span of the circle, reached at the latitude where it is tangent to a meridian
+    dlon = math.degrees(math.asin(min(1.0, math.sin(math.radians(dlat)) / math.cos(math.radians(lat)))))
+    min_lon, max_lon = lon - dlon, lon + dlon
+    if min_lon < -180:
+        return [(min_lat, max_lat, min_lon + 360, 180.0), (min_lat, max_lat, -180.0, max_lon)]
+    if max_lon > 180:
+        return [(min_lat, max_lat, min_lon, 180.0), (min_lat, max_lat, -180.0, max_lon - 360)]
+    return [(min_lat, max_lat, min_lon, max_lon)]
+
+
+def planar_error(lat: float, lon: float, radius_km: float) -> Optional[float]:
+    """
+    Relative error of planar_squared_km against the great-circle distance inside the bounding box, from
+    scaling longitudes by cos(lat) alone. None when the boxes cross a pole or the antimeridian.
+    """
+    boxes = bounding_boxes(lat, lon, radius_km)
+    min_lat, max_lat, min_lon, max_lon = boxes[0]
+    if len(boxes) > 1 or max_lon - min_lon >= 360:
+        return None
+    edges = [min_lat, max_lat] + ([0.0] if min_lat < 0 < max_lat else [])
+    scale = math.cos(math.radians(lat))
+    return max(abs(math.cos(math.radians(edge)) / scale - 1) for edge in edges) + PLANAR_SLACK
+
+
+def planar_squared_km(lat: float, lon: float, latitude, longitude):
+    """ Squared equirectangular distance from (lat, lon) to the latitude/longitude columns, as an SQL expression """
+    dlat = (latitude - lat) * KM_PER_DEGREE
+    dlon = (longitude - lon) * (KM_PER_DEGREE * math.cos(math.radians(lat)))
+    return dlat * dlat + dlon * dlon
+
+
+def planar_cutoff_km(planar_km: float, error: float) -> float:
+    """ Great-circle distance every point at least planar_km away in the planar approximation is guaranteed to have """
+    return planar_km * (1 - error) - ROUNDING_KM
+
+
+def distances_km(lat: float, lon: float, latitudes, longitudes) -> np.ndarray:
+    """ Haversine distance from (lat, lon) to every point """
+    lat1, lon1 = math.radians(lat), math.radians(lon)
+    lat2, lon2 = np.radians(np.asarray(latitudes, dtype=float)), np.radians(np.asarray(longitudes, dtype=float))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
@@ -0,0 +1,191 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from fastapi import HTTPException, Response
+from sqlalchemy import select, delete
+from sqlalchemy.exc import IntegrityError
+from src.services.SQLite.index import async_session, read_session
+from src.services.cache.index import encode
+from src.api.orders.model import IdempotencyKey
+
+import os
+from dotenv import load_dotenv
+load_dotenv()
+
+# How long a client may retry with the same key and get the first response back
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", 86400))
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", 10000))
+IDEMPOTENCY_PURGE_SECONDS = float(os.getenv("IDEMPOTENCY_PURGE_SECONDS", 3600))
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+
+class Key:
+    """ Idempotency-Key of one caller and the fingerprint of the request body it came with """
+    __slots__ = ("user_id", "key", "fingerprint", "response")
+
+    def __init__(self, user_id: int, key: str, body: bytes):
+        if not key or len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+            raise HTTPException(status_code=400, detail=f"Idempotency-Key must be 1 to {IDEMPOTENCY_KEY_MAX_LENGTH} characters")
+        self.user_id = user_id
+        self.key = key
+        self.fingerprint = hashlib.sha256(body).hexdigest()
+        self.response: Optional[bytes] = None
+
+    @property
+    def id(self) -> Tuple[int, str]:
+        return (self.user_id, self.key)
+
+
+class Stored:
+    __slots__ = ("fingerprint", "response", "expires")
+
+    def __init__(self, fingerprint: str, response: bytes, expires: float):
+        self.fingerprint = fingerprint
+        self.response = response
+        self.expires = expires
+
+    def replay(self, key: Key) -> Response:
+        if self.fingerprint != key.fingerprint:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request")
+        return Response(content=self.response, media_type="application/json", headers={"Idempotent-Replayed": "true"})
+
+
+class Idempotency:
+    """
+    Runs a request once per key. A retry gets the stored response from the LRU front cache or the table,
+    a request arriving while the first one with its key is running waits for it instead of running too.
+    Across workers the primary key of the table decides, the loser's transaction is rolled back.
+    """
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.entries: "OrderedDict[Tuple[int, str], Stored]" = OrderedDict()
+        self.inflight: Dict[Tuple[int, str], asyncio.Future] = {}
+        self.task: Optional[asyncio.Task] = None
+        self.executed = 0
+        self.replayed = 0
+        self.coalesced = 0
+        self.conflicts = 0
+        self.purged = 0
+
+    def _remember(self, id: Tuple[int, str], stored: Stored):
+        self.entries[id] = stored
+        self.entries.move_to_end(id)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    async def lookup(self, key: Key) -> Optional[Stored]:
+        stored = self.entries.get(key.id)
+        if stored is None:
+            async with read_session() as conn:
+                result = await conn.execute(select(IdempotencyKey.fingerprint, IdempotencyKey.response, IdempotencyKey.expires).where(
+                    IdempotencyKey.user_id == key.user_id, IdempotencyKey.key == key.key))
+                row = result.first()
+            if row is None:
+                return None
+            stored = Stored(*row)
+            self._remember(key.id, stored)
+        if stored.expires < time.time():
+            # Not purged yet, the key is free again
+            del self.entries[key.id]
+            async with async_session() as conn:
+                await conn.execute(delete(IdempotencyKey).where(
+                    IdempotencyKey.user_id == key.user_id, IdempotencyKey.key == key.key, IdempotencyKey.expires < time.time()))
+                await conn.commit()
+            return None
+        self.entries.move_to_end(key.id)
+        return stored
+
+    def record(self, session, key: Key, content):
+        """ Add the response to the session of the request, so it is committed with whatever the request wrote """
+        key.response = encode(content)
+        session.add(IdempotencyKey(user_id=key.user_id, key=key.key, fingerprint=key.fingerprint, response=key.response,
+                                   expires=time.time() + self.ttl))
+
+    async def run(self, key: Key, work: Callable[[], Awaitable[dict]]):
+        stored = await self.lookup(key)
+        if stored is not None:
+            self.replayed += 1
+            return stored.replay(key)
+
+        running = self.inflight.get(key.id)
+        if running is not None:
+            self.coalesced += 1
+            try:
+                # A failure is shared too, the waiter sent the same request
+                stored = await asyncio.shield(running)
+            except asyncio.CancelledError:
+                if not running.cancelled():
+                    raise
+                # The first request was abandoned (its client went away), run it here unless it got to commit
+                return await self.run(key, work)
+            return stored.replay(key)
+
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[key.id] = future
+        try:
+            content = await work()
+        except IntegrityError:
+            # Another worker committed the same key first, its order stands and this one was rolled back
+            self.entries.pop(key.id, None)
+            stored = await self.lookup(key)
+            if stored is None:
+                raise
+            self.conflicts += 1
+            future.set_result(stored)
+            return stored.replay(key)
+        except Exception as error:
+            future.set_exception(error)
+            # Retrieved here so an exception nobody waited for is not logged as such
+            future.exception()
+            raise
+        except BaseException:
+            future.cancel()
+            raise
+        finally:
+            del self.inflight[key.id]
+
+        self.executed += 1
+        stored = Stored(key.fingerprint, key.response, time.time() + self.ttl)
+        self._remember(key.id, stored)
+        future.set_result(stored)
+        return content
+
+    async def purge(self) -> int:
+        async with async_session() as conn:
+            result = await conn.execute(delete(IdempotencyKey).where(IdempotencyKey.expires < time.time()))
+            await conn.commit()
+        self.purged += result.rowcount
+        return result.rowcount
+
+    async def _maintain(self):
+        while True:
+            await asyncio.sleep(IDEMPOTENCY_PURGE_SECONDS)
+            try:
+                await self.purge()
+            except Exception as error:
+                print(f"Idempotency key purge failed: {error!r}")
+
+    async def start(self):
+        """ Purge expired keys now and every IDEMPOTENCY_PURGE_SECONDS in the background """
+        await self.shutdown()
+        self.entries.clear()
+        await self.purge()
+        self.task = asyncio.create_task(self._maintain())
+
+    async def shutdown(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self.entries), "max_size": self.max_size, "inflight": len(self.inflight), "executed": self.executed,
+            "replayed": self.replayed, "coalesced": self.coalesced, "conflicts": self.conflicts, "purged": self.purged,
+        }
+
+
+idempotency = Idempotency(IDEMPOTENCY_TTL_SECONDS, IDEMPOTENCY_CACHE_SIZE)
@@ -0,0 +1,192 @@
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional, Tuple
+from sqlalchemy import event
+
+import os
+from dotenv import load_dotenv
+load_dotenv()
+
+# A request that runs the same statement this many times is counted (and printed) as a likely N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv("METRICS_N_PLUS_ONE_THRESHOLD", 10))
+# When set, GET /metrics requires "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        # One count per bucket plus +Inf, made cumulative when rendered
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class RequestStats:
+    """ Statements run while serving one request, filled by the engine hooks through the current context """
+    __slots__ = ("statements", "seconds", "repeats")
+
+    def __init__(self):
+        self.statements = 0
+        self.seconds = 0.0
+        self.repeats: Dict[str, int] = defaultdict(int)
+
+    def most_repeated(self) -> Tuple[Optional[str], int]:
+        if not self.repeats:
+            return None, 0
+        statement = max(self.repeats, key=self.repeats.get)
+        return statement, self.repeats[statement]
+
+
+current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels.items()) + "}"
+
+
+class Metrics:
+    """ Counters and histograms per (method, route template), rendered in the Prometheus text format """
+
+    def __init__(self, n_plus_one_threshold: int):
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.requests: Dict[Tuple[str, str, int], int] = defaultdict(int)
+        self.latency: Dict[Tuple[str, str], Histogram] = {}
+        self.request_statements: Dict[Tuple[str, str], Histogram] = {}
+        self.request_db_seconds: Dict[Tuple[str, str], Histogram] = {}
+        self.n_plus_one: Dict[Tuple[str, str], int] = defaultdict(int)
+        self.in_progress = 0
+        self.statements = 0
+        self.db_seconds = 0.0
+        # Boot phases in seconds, filled once by the startup handler
+        self.startup: Dict[str, float] = {}
+
+    def observe_statement(self, statement: str, seconds: float):
+        self.statements += 1
+        self.db_seconds += seconds
+        stats = current.get()
+        if stats is not None:
+            stats.statements += 1
+            stats.seconds += seconds
+            stats.repeats[statement] += 1
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float, stats: RequestStats):
+        key = (method, route)
+        self.requests[(method, route, status)] += 1
+        if key not in self.latency:
+            self.latency[key] = Histogram(LATENCY_BUCKETS)
+            self.request_statements[key] = Histogram(STATEMENT_BUCKETS)
+            self.request_db_seconds[key] = Histogram(LATENCY_BUCKETS)
+        self.latency[key].observe(seconds)
+        self.request_statements[key].observe(stats.statements)
+        self.request_db_seconds[key].observe(stats.seconds)
+
+        statement, repeats = stats.most_repeated()
+        if repeats >= self.n_plus_one_threshold:
+            self.n_plus_one[key] += 1
+            print(f"N+1 suspect: {method} {route} ran {repeats} times: {' '.join(statement.split())[:200]}")
+
+    def render(self, components: Optional[Dict[str, Callable[[], dict]]] = None) -> str:
+        lines = []
+
+        def family(name: str, kind: str, help: str):
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def histograms(name: str, help: str, series: Dict[Tuple[str, str], Histogram]):
+            family(name, "histogram", help)
+            for (method, route), histogram in series.items():
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(method=method, route=route, le=bound)} {cumulative}")
+                lines.append(f"{name}_sum{_labels(method=method, route=route)} {histogram.sum}")
+                lines.append(f"{name}_count{_labels(method=method, route=route)} {histogram.count}")
+
+        family("http_requests_total", "counter", "Requests by method, route template and status code")
+        for (method, route, status), count in self.requests.items():
+            lines.append(f"http_requests_total{_labels(method=method, route=route, status=status)} {count}")
+        family("http_requests_in_progress", "gauge", "Requests being served")
+        lines.append(f"http_requests_in_progress {self.in_progress}")
+        histograms("http_request_duration_seconds", "Time to serve a request", self.latency)
+        histograms("http_request_db_statements", "SQL statements run per request", self.request_statements)
+        histograms("http_request_db_seconds", "Time spent in SQL statements per request", self.request_db_seconds)
+        family("http_n_plus_one_requests_total", "counter", f"Requests that ran one statement at least {self.n_plus_one_threshold} times")
+        for (method, route), count in self.n_plus_one.items():
+            lines.append(f"http_n_plus_one_requests_total{_labels(method=method, route=route)} {count}")
+        family("db_statements_total", "counter", "SQL statements run, in and outside requests")
+        lines.append(f"db_statements_total {self.statements}")
+        family("db_seconds_total", "counter", "Time spent in SQL statements, in and outside requests")
+        lines.append(f"db_seconds_total {self.db_seconds}")
+
+        # stats() of the caches and pools, numeric values only
+        for component, stats in (components or {}).items():
+            for key, value in stats().items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    family(f"{component}_{key}", "gauge", f"{key} of {component}")
+                    lines.append(f"{component}_{key} {value}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics(N_PLUS_ONE_THRESHOLD)
+
+
+def track_statements(engine):
+    """ Count every statement of a (sync) engine and time it, the start is kept on the execution context """
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context.metrics_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        metrics.observe_statement(statement, time.perf_counter() - context.metrics_started)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording every HTTP request under the template of the route that served it
+    ("/restaurants/{restaurant_id}", not the path), so the series stay bounded. Unmatched paths share one label.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats()
+        token = current.set(stats)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        metrics.in_progress += 1
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            metrics.in_progress -= 1
+            current.reset(token)
+            route = scope.get("route")
+            metrics.observe_request(scope["method"], route.path if route is not None else "unmatched", status, time.perf_counter() - started, stats)
@@ -0,0 +1,102 @@
+import time
+from collections import OrderedDict
+from typing import FrozenSet, Optional, Tuple
+from fastapi import Depends, HTTPException
+from sqlalchemy import select
+from src.services.SQLite.index import read_session
+from src.api.restaurants.model import Restaurant
+import src.services.auth.index as auth
+
+import os
+from dotenv import load_dotenv
+load_dotenv()
+
+OWNERSHIP_CACHE_SIZE = int(os.getenv("OWNERSHIP_CACHE_SIZE", 10000))
+# Bounds how long another worker's restaurant changes go unseen, changes made here invalidate at once
+OWNERSHIP_TTL_SECONDS = float(os.getenv("OWNERSHIP_TTL_SECONDS", 60))
+
+
+class OwnershipIndex:
+    """ owner id -> ids of the restaurants they own, loaded with one query on a miss """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries: "OrderedDict[int, Tuple[float, FrozenSet[int]]]" = OrderedDict()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, owner_id: int) -> Optional[FrozenSet[int]]:
+        entry = self.entries.get(owner_id)
+        if entry is None or entry[0] < time.monotonic():
+            self.misses += 1
+            return None
+        self.entries.move_to_end(owner_id)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, owner_id: int, restaurant_ids: FrozenSet[int], generation: int):
+        # Loaded while a restaurant changed hands, the next lookup loads again
+        if generation != self.generation:
+            return
+        self.entries[owner_id] = (time.monotonic() + self.ttl, restaurant_ids)
+        self.entries.move_to_end(owner_id)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, *owner_ids: int):
+        """ Call after committing a restaurant create, delete or transfer, with the old and the new owner """
+        self.generation += 1
+        for owner_id in owner_ids:
+            self.entries.pop(owner_id, None)
+
+    def clear(self):
+        self.generation += 1
+        self.entries.clear()
+
+    async def restaurants_of(self, owner_id: int) -> FrozenSet[int]:
+        restaurant_ids = self.get(owner_id)
+        if restaurant_ids is None:
+            generation = self.generation
+            async with read_session() as conn:
+                result = await conn.execute(select(Restaurant.id).where(Restaurant.owner_id == owner_id))
+                restaurant_ids = frozenset(result.scalars().all())
+            self.put(owner_id, restaurant_ids, generation)
+        return restaurant_ids
+
+    def stats(self) -> dict:
+        return {"size": len(self.entries), "max_size": self.max_size, "hits": self.hits, "misses": self.misses}
+
+
+index = OwnershipIndex(OWNERSHIP_CACHE_SIZE, OWNERSHIP_TTL_SECONDS)
+
+
+class Ownership:
+    """ Restaurants the caller manages, restaurant_ids is None for admins who manage all of them """
+    __slots__ = ("token", "restaurant_ids")
+
+    def __init__(self, token: dict, restaurant_ids: Optional[FrozenSet[int]]):
+        self.token = token
+        self.restaurant_ids = restaurant_ids
+
+    @property
+    def is_admin(self) -> bool:
+        return self.restaurant_ids is None
+
+    def require_restaurants(self):
+        if self.restaurant_ids is not None and not self.restaurant_ids:
+            raise HTTPException(status_code=404, detail="No restaurants found for this owner")
+
+    def owns(self, restaurant_id: int) -> bool:
+        return self.restaurant_ids is None or restaurant_id in self.restaurant_ids
+
+    def require(self, restaurant_id: int, detail: str = "You are not the owner of this restaurant"):
+        if not self.owns(restaurant_id):
+            raise HTTPException(status_code=403, detail=detail)
+
+
+async def ownership_required(token: dict = Depends(auth.owner_or_admin_required)) -> Ownership:
+    if token["role"] == "admin":
+        return Ownership(token, None)
+    return Ownership(token, await index.restaurants_of(token["id"]))
@@ -0,0 +1,65 @@
+import base64
+import json
+from datetime import datetime
+from typing import List, Optional, Tuple
+from fastapi import HTTPException
+from sqlalchemy import DateTime, tuple_
+
+""" Keyset pagination: pages are found by seeking past the last key instead of skipping rows """
+
+
+def encode_cursor(values: tuple, direction: str) -> str:
+    payload = json.dumps({"k": [value.isoformat() if isinstance(value, datetime) else value for value in values], "d": direction})
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, columns) -> Tuple[tuple, str]:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        values, direction = payload["k"], payload["d"]
+        if direction not in ("next", "prev") or len(values) != len(columns):
+            raise ValueError(cursor)
+        return tuple(
+            datetime.fromisoformat(value) if isinstance(column.type, DateTime) else value
+            for column, value in zip(columns, values)
+        ), direction
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _key(row, columns) -> tuple:
+    return tuple(getattr(row, column.key) for column in columns)
+
+
+async def keyset_page(conn, stmt, columns: List, limit: int, cursor: Optional[str]):
+    """
+    Run stmt ordered by columns (ascending, unique together) and return (rows, next_cursor, prev_cursor).
+    An empty cursor is the first page, next/prev are None when there is nothing that way.
+    """
+    if limit <= 0:
+        raise HTTPException(status_code=400, detail="limit must be positive")
+
+    key = tuple_(*columns)
+    direction = "next"
+    if cursor:
+        values, direction = decode_cursor(cursor, columns)
+        stmt = stmt.where(key > tuple_(*values) if direction == "next" else key < tuple_(*values))
+
+    # prev pages are read backwards from the cursor and flipped afterwards
+    order = [column.asc() for column in columns] if direction == "next" else [column.desc() for column in columns]
+    result = await conn.execute(stmt.order_by(*order).limit(limit + 1))
+    rows = result.unique().scalars().all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if direction == "prev":
+        rows.reverse()
+    if not rows:
+        return rows, None, None
+
+    # Coming back with prev there is always a page after, going forward there is one before unless this is the first
+    has_next = has_more if direction == "next" else True
+    has_prev = bool(cursor) if direction == "next" else has_more
+    next_cursor = encode_cursor(_key(rows[-1], columns), "next") if has_next else None
+    prev_cursor = encode_cursor(_key(rows[0], columns), "prev") if has_prev else None
+    return rows, next_cursor, prev_cursor
@@ -0,0 +1,92 @@
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional, Tuple
+from fastapi import HTTPException
+
+import os
+from dotenv import load_dotenv 
+load_dotenv()
+
+# "thread" is enough since hashlib releases the GIL while hashing, "process" isolates it completely
+PASSWORD_HASH_POOL = os.getenv("PASSWORD_HASH_POOL", "thread")
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", os.cpu_count() or 2))
+# Hashes waiting or running at once, further logins are rejected with 503 instead of piling up
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", 64))
+# passlib's default for pbkdf2_sha256, spelled out so passlib loads with the first hash instead of at import
+PASSWORD_HASH_ROUNDS = int(os.getenv("PASSWORD_HASH_ROUNDS", 29000))
+
+
+def _hash(password: str, rounds: int) -> str:
+    from passlib.hash import pbkdf2_sha256
+    return pbkdf2_sha256.using(rounds=rounds).hash(password)
+
+
+def _verify(password: str, hashed_password: str, rounds: int) -> Tuple[bool, Optional[str]]:
+    """ Check a password and, when it was hashed with another cost, return its new hash too """
+    from passlib.hash import pbkdf2_sha256
+    if not pbkdf2_sha256.verify(password, hashed_password):
+        return False, None
+    if pbkdf2_sha256.from_string(hashed_password).rounds != rounds:
+        return True, _hash(password, rounds)
+    return True, None
+
+
+class HashPool:
+    def __init__(self, kind: str, workers: int, max_pending: int):
+        self.kind = kind
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.executor: Optional[Executor] = None
+
+    def get_executor(self) -> Executor:
+        # Created on first use so importing the module never forks worker processes
+        if self.executor is None:
+            if self.kind == "process":
+                self.executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="passwords")
+        return self.executor
+
+    async def run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail="Too many authentication requests, retry shortly", headers={"Retry-After": "1"})
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.get_executor(), fn, *args)
+        finally:
+            self.pending -= 1
+            self.completed += 1
+
+    def stats(self) -> dict:
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            # Above 1.0 hashes are queueing behind busy workers
+            "saturation": round(self.pending / self.workers, 2),
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+
+pool = HashPool(PASSWORD_HASH_POOL, PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE)
+
+
+async def hash_password(password: str) -> str:
+    return await pool.run(_hash, password, PASSWORD_HASH_ROUNDS)
+
+
+async def verify_password(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """ Returns (valid, rehashed), rehashed is set when the stored hash should be replaced """
+    return await pool.run(_verify, password, hashed_password, PASSWORD_HASH_ROUNDS)
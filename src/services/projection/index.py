@@ -0,0 +1,17 @@
+from typing import List, Type
+from pydantic import BaseModel
+from sqlalchemy import inspect
+from sqlalchemy.orm import load_only
+
+""" Load only the columns a response model shows instead of every column of the row """
+
+
+def columns(model, schema: Type[BaseModel], *extra: str) -> List:
+    """ Column attributes of model named by fields of schema, plus extra ones the handler needs (e.g. for ETags) """
+    names = set(schema.model_fields) | set(extra)
+    return [attribute for attribute in inspect(model).column_attrs if attribute.key in names]
+
+
+def project(model, schema: Type[BaseModel], *extra: str):
+    """ load_only option for select(model), chain it on relationship loaders as well """
+    return load_only(*[getattr(model, attribute.key) for attribute in columns(model, schema, *extra)])
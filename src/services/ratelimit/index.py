@@ -0,0 +1,110 @@
+import math
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from fastapi import Request, HTTPException
+import src.services.auth.index as auth
+
+import os
+from dotenv import load_dotenv
+load_dotenv()
+
+# "<requests>/<second|minute|hour>" or "off", the whole amount may be spent in one burst
+RATE_LIMIT_LOGIN = os.getenv("RATE_LIMIT_LOGIN", "10/minute")
+RATE_LIMIT_QRCODES = os.getenv("RATE_LIMIT_QRCODES", "60/minute")
+RATE_LIMIT_ORDER_LISTS = os.getenv("RATE_LIMIT_ORDER_LISTS", "120/minute")
+# Buckets kept per limit, the least recently used client is forgotten (with a full bucket) beyond it
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", 100000))
+RATE_LIMIT_SHARDS = int(os.getenv("RATE_LIMIT_SHARDS", 16))
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600}
+
+
+def parse_limit(limit: str) -> Optional[Tuple[int, float]]:
+    """ "10/minute" -> (capacity 10, refill 10 / 60 tokens per second), None for "off" """
+    if limit == "off":
+        return None
+    count, _, period = limit.partition("/")
+    if period not in PERIODS or not count.isdigit() or int(count) < 1:
+        raise ValueError(f"Invalid rate limit {limit!r}, expected <requests>/<second|minute|hour> or off")
+    return int(count), int(count) / PERIODS[period]
+
+
+def client_key(request: Request) -> str:
+    """
+    The user id of a valid bearer token, the client address otherwise. Behind a proxy run uvicorn with
+    --proxy-headers --forwarded-allow-ips so the address is the client's and not the proxy's.
+    """
+    scheme, _, credentials = request.headers.get("authorization", "").partition(" ")
+    if scheme == "Bearer" and credentials:
+        payload = auth.decode_jwt(credentials)
+        if payload:
+            return f"user:{payload['id']}"
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+
+class RateLimit:
+    """
+    Token bucket per client, a dependency raising 429 with Retry-After once the bucket is empty.
+    Buckets ([tokens, updated]) are refilled lazily when touched and spread over LRU shards by key hash,
+    so eviction only ever reorders one small OrderedDict.
+    """
+
+    def __init__(self, name: str, limit: str, max_keys: int, shards: int):
+        self.name = name
+        self.limit = limit
+        parsed = parse_limit(limit)
+        self.capacity, self.rate = parsed if parsed else (0, 0.0)
+        self.enabled = parsed is not None
+        self.shards: List["OrderedDict[str, list]"] = [OrderedDict() for _ in range(shards)]
+        self.shard_size = max(max_keys // shards, 1)
+        self.allowed = 0
+        self.throttled = 0
+        self.evicted = 0
+
+    def take(self, key: str, now: float) -> float:
+        """ Spend one token, returns 0 when allowed or the seconds until a token is available """
+        shard = self.shards[hash(key) % len(self.shards)]
+        bucket = shard.get(key)
+        if bucket is None:
+            bucket = shard[key] = [self.capacity, now]
+            if len(shard) > self.shard_size:
+                shard.popitem(last=False)
+                self.evicted += 1
+        else:
+            shard.move_to_end(key)
+            bucket[0] = min(self.capacity, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            self.allowed += 1
+            return 0.0
+        self.throttled += 1
+        return (1 - bucket[0]) / self.rate
+
+    async def __call__(self, request: Request):
+        if not self.enabled:
+            return
+        wait = self.take(client_key(request), time.monotonic())
+        if wait:
+            raise HTTPException(status_code=429, detail="Too many requests, retry later.", headers={"Retry-After": str(math.ceil(wait))})
+
+    def clear(self):
+        for shard in self.shards:
+            shard.clear()
+
+    def stats(self) -> dict:
+        return {
+            "capacity": self.capacity, "refill_per_second": self.rate, "clients": sum(len(shard) for shard in self.shards),
+            "allowed": self.allowed, "throttled": self.throttled, "evicted": self.evicted,
+        }
+
+
+# pbkdf2 on /login and /register, keyed by address since the caller has no token yet
+login_limit = RateLimit("login", RATE_LIMIT_LOGIN, RATE_LIMIT_MAX_KEYS, RATE_LIMIT_SHARDS)
+# PNG and SVG rendering on /qrcodes and /qrcodes/batch
+qrcodes_limit = RateLimit("qrcodes", RATE_LIMIT_QRCODES, RATE_LIMIT_MAX_KEYS, RATE_LIMIT_SHARDS)
+# Unpaginated order lists and the export
+order_lists_limit = RateLimit("order_lists", RATE_LIMIT_ORDER_LISTS, RATE_LIMIT_MAX_KEYS, RATE_LIMIT_SHARDS)
+
+limits: Dict[str, RateLimit] = {limit.name: limit for limit in [login_limit, qrcodes_limit, order_lists_limit]}
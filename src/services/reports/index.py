@@ -0,0 +1,219 @@
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import select, delete, func, insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from src.services.SQLite.index import async_session, register_models
+from src.api.reports.model import RestaurantDailySales, RestaurantProductSales
+from src.api.orderItems.model import order_items
+from src.api.orders.model import Order
+from src.api.products.model import Product
+from src.api.restaurants.model import Restaurant
+
+""" python -m src.services.reports.index [restaurant_id] rebuilds the rollups from orders and order_items """
+
+# (orders_count weight, sales weight) for each order status.
+# Every non canceled order counts as placed, only completed ones count as sold.
+ORDER_WEIGHTS: Dict[Optional[str], Tuple[int, int]] = {
+    None: (0, 0),
+    "pending": (1, 0),
+    "completed": (1, 1),
+    "canceled": (0, 0),
+}
+
+TOP_PRODUCTS = 5
+
+
+def month_of(day: date) -> str:
+    return day.strftime("%Y-%m")
+
+
+def parse_month(month: str) -> Tuple[date, date]:
+    first = datetime.strptime(month, "%Y-%m").date()
+    next_first = (first.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return first, next_first
+
+
+async def load_order_lines(session, order_id: int) -> List[Tuple[int, int, int]]:
+    stmt = select(order_items.c.product_id, order_items.c.quantity, order_items.c.price).where(order_items.c.order_id == order_id)
+    result = await session.execute(stmt)
+    return [tuple(row) for row in result.all()]
+
+
+async def record_order_change(session, order, old_status: Optional[str], new_status: Optional[str], lines: Optional[List[Tuple[int, int, int]]] = None):
+    """
+    Apply the difference between the old and new status of an order to the rollups.
+    Runs on the caller's session so it is committed in the same transaction as the order.
+    old_status is None for a new order, new_status is None for a deleted one.
+    """
+    old_orders, old_sales = ORDER_WEIGHTS[old_status]
+    new_orders, new_sales = ORDER_WEIGHTS[new_status]
+    orders_delta = new_orders - old_orders
+    sales_delta = new_sales - old_sales
+    if not orders_delta and not sales_delta:
+        return
+
+    if sales_delta and lines is None:
+        lines = await load_order_lines(session, order.id)
+    lines = lines or []
+
+    day = order.created_at.date()
+    quantity = sum(line_quantity for _, line_quantity, _ in lines)
+    revenue = sum(line_quantity * price for _, line_quantity, price in lines)
+
+    stmt = sqlite_insert(RestaurantDailySales).values(
+        restaurant_id=order.restaurant_id,
+        day=day,
+        orders_count=orders_delta,
+        earnings=sales_delta * revenue,
+        products_sold=sales_delta * quantity,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[RestaurantDailySales.restaurant_id, RestaurantDailySales.day],
+        set_={
+            "orders_count": RestaurantDailySales.orders_count + stmt.excluded.orders_count,
+            "earnings": RestaurantDailySales.earnings + stmt.excluded.earnings,
+            "products_sold": RestaurantDailySales.products_sold + stmt.excluded.products_sold,
+            "updated_at": datetime.now(),
+        },
+    )
+    await session.execute(stmt)
+
+    if not sales_delta or not lines:
+        return
+
+    stmt = sqlite_insert(RestaurantProductSales)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[RestaurantProductSales.restaurant_id, RestaurantProductSales.month, RestaurantProductSales.product_id],
+        set_={
+            "quantity_sold": RestaurantProductSales.quantity_sold + stmt.excluded.quantity_sold,
+            "revenue": RestaurantProductSales.revenue + stmt.excluded.revenue,
+            "updated_at": datetime.now(),
+        },
+    )
+    await session.execute(stmt, [
+        {
+            "restaurant_id": order.restaurant_id,
+            "month": month_of(day),
+            "product_id": product_id,
+            "quantity_sold": sales_delta * line_quantity,
+            "revenue": sales_delta * line_quantity * price,
+        }
+        for product_id, line_quantity, price in lines
+    ])
+
+
+def _money(cents: int) -> float:
+    return round(cents / 100, 2)
+
+
+async def build_report(session, restaurant: Restaurant, month: str) -> dict:
+    """ Build the DataSet.txt report for one month reading only the rollup tables """
+    first, next_first = parse_month(month)
+
+    stmt = select(RestaurantDailySales).where(
+        RestaurantDailySales.restaurant_id == restaurant.id,
+        RestaurantDailySales.day >= first,
+        RestaurantDailySales.day < next_first,
+    )
+    result = await session.execute(stmt)
+    days = {row.day: row for row in result.scalars().all()}
+
+    stmt = select(
+        RestaurantProductSales.product_id,
+        Product.name,
+        RestaurantProductSales.quantity_sold,
+        RestaurantProductSales.revenue,
+    ).outerjoin(Product, Product.id == RestaurantProductSales.product_id).where(
+        RestaurantProductSales.restaurant_id == restaurant.id,
+        RestaurantProductSales.month == month,
+        RestaurantProductSales.quantity_sold > 0,
+    ).order_by(RestaurantProductSales.quantity_sold.desc(), RestaurantProductSales.revenue.desc())
+    result = await session.execute(stmt)
+    products = [
+        {"id": product_id, "name": name, "quantity_sold": quantity_sold, "total_revenue": _money(revenue)}
+        for product_id, name, quantity_sold, revenue in result.all()
+    ]
+
+    monthly_earnings = []
+    monthly_gross_profit = []
+    daily_orders = []
+    day = first
+    while day < next_first:
+        row = days.get(day)
+        earnings = _money(row.earnings) if row else 0.0
+        monthly_earnings.append({"date": day.isoformat(), "earnings": earnings})
+        # Products have no cost price yet, so the whole revenue is reported as gross profit
+        monthly_gross_profit.append({"date": day.isoformat(), "total_revenue": earnings, "total_cost": 0.0, "gross_profit": earnings})
+        daily_orders.append({"date": day.isoformat(), "orders": row.orders_count if row else 0})
+        day += timedelta(days=1)
+
+    return {
+        "restaurant_info": {
+            "name": restaurant.name,
+            "id": restaurant.id,
+            "generation_date": date.today().isoformat(),
+        },
+        "monthly_earnings": monthly_earnings,
+        "monthly_gross_profit": monthly_gross_profit,
+        "best_selling_product": products[0] if products else None,
+        "products_sold": [{"name": product["name"], "quantity_sold": product["quantity_sold"]} for product in products],
+        "top_5_products": products[:TOP_PRODUCTS],
+        "daily_orders": daily_orders,
+    }
+
+
+async def rebuild_rollups(restaurant_id: Optional[int] = None):
+    """ Recompute every rollup row from the raw orders and order_items tables """
+    async with async_session() as session:
+        delete_daily = delete(RestaurantDailySales)
+        delete_products = delete(RestaurantProductSales)
+        if restaurant_id is not None:
+            delete_daily = delete_daily.where(RestaurantDailySales.restaurant_id == restaurant_id)
+            delete_products = delete_products.where(RestaurantProductSales.restaurant_id == restaurant_id)
+        await session.execute(delete_daily)
+        await session.execute(delete_products)
+
+        order_day = func.date(Order.created_at)
+        order_month = func.strftime("%Y-%m", Order.created_at)
+        line_revenue = order_items.c.quantity * order_items.c.price
+
+        placed_stmt = select(Order.restaurant_id, order_day, func.count(Order.id)).where(Order.status != "canceled").group_by(Order.restaurant_id, order_day)
+        sold_stmt = select(Order.restaurant_id, order_day, func.sum(order_items.c.quantity), func.sum(line_revenue)).join(
+            order_items, order_items.c.order_id == Order.id
+        ).where(Order.status == "completed").group_by(Order.restaurant_id, order_day)
+        products_stmt = select(Order.restaurant_id, order_month, order_items.c.product_id, func.sum(order_items.c.quantity), func.sum(line_revenue)).join(
+            order_items, order_items.c.order_id == Order.id
+        ).where(Order.status == "completed").group_by(Order.restaurant_id, order_month, order_items.c.product_id)
+        if restaurant_id is not None:
+            placed_stmt = placed_stmt.where(Order.restaurant_id == restaurant_id)
+            sold_stmt = sold_stmt.where(Order.restaurant_id == restaurant_id)
+            products_stmt = products_stmt.where(Order.restaurant_id == restaurant_id)
+
+        daily = {}
+        for rid, day, orders_count in (await session.execute(placed_stmt)).all():
+            daily[(rid, day)] = {"restaurant_id": rid, "day": date.fromisoformat(day), "orders_count": orders_count, "earnings": 0, "products_sold": 0}
+        for rid, day, quantity, revenue in (await session.execute(sold_stmt)).all():
+            row = daily.setdefault((rid, day), {"restaurant_id": rid, "day": date.fromisoformat(day), "orders_count": 0, "earnings": 0, "products_sold": 0})
+            row["earnings"] = revenue or 0
+            row["products_sold"] = quantity or 0
+
+        product_rows = [
+            {"restaurant_id": rid, "month": month, "product_id": product_id, "quantity_sold": quantity or 0, "revenue": revenue or 0}
+            for rid, month, product_id, quantity, revenue in (await session.execute(products_stmt)).all()
+        ]
+
+        if daily:
+            await session.execute(insert(RestaurantDailySales), list(daily.values()))
+        if product_rows:
+            await session.execute(insert(RestaurantProductSales), product_rows)
+        await session.commit()
+
+        print(f"Rebuilt {len(daily)} daily and {len(product_rows)} product rollup rows")
+
+
+if __name__ == "__main__":
+    import asyncio
+    import sys
+    # Registers the mappers the models refer to by name
+    register_models()
+    asyncio.run(rebuild_rollups(int(sys.argv[1]) if len(sys.argv) > 1 else None))
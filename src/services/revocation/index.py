@@ -0,0 +1,155 @@
+import asyncio
+import hashlib
+import math
+import time
+from typing import Dict, Iterable, Optional
+from sqlalchemy import select, delete
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from src.services.SQLite.index import async_session, read_session
+from src.api.auth.model import RevokedToken
+
+import os
+from dotenv import load_dotenv
+load_dotenv()
+
+# Revoked tokens the filter is sized for before its false positive rate degrades, it grows when rebuilt
+REVOCATION_BLOOM_CAPACITY = int(os.getenv("REVOCATION_BLOOM_CAPACITY", 100000))
+REVOCATION_BLOOM_FP_RATE = float(os.getenv("REVOCATION_BLOOM_FP_RATE", 0.001))
+# Bounds how long a revoke made by another worker goes unseen, revokes made here apply at once
+REVOCATION_SYNC_SECONDS = float(os.getenv("REVOCATION_SYNC_SECONDS", 30))
+REVOCATION_PURGE_SECONDS = float(os.getenv("REVOCATION_PURGE_SECONDS", 3600))
+
+
+class BloomFilter:
+    """ Bit array with k positions per key from two halves of one blake2b digest (Kirsch-Mitzenmacher) """
+
+    def __init__(self, capacity: int, fp_rate: float):
+        self.capacity = max(capacity, 1)
+        self.size = max(int(-self.capacity * math.log(fp_rate) / math.log(2) ** 2), 8)
+        self.hashes = max(round(self.size / self.capacity * math.log(2)), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class Denylist:
+    """
+    Revoked token ids. Every authenticated request asks the in-memory Bloom filter, only a hit (a revoked token
+    or a false positive) reads the revoked_tokens table. Confirmed revocations are kept until the token expires.
+    """
+
+    def __init__(self, capacity: int, fp_rate: float):
+        self.capacity = capacity
+        self.fp_rate = fp_rate
+        self.filter = BloomFilter(capacity, fp_rate)
+        # jti -> expires of tokens known to be revoked
+        self.revoked: Dict[str, float] = {}
+        self.last_id = 0
+        self.task: Optional[asyncio.Task] = None
+        self.lookups = 0
+        self.filter_hits = 0
+        self.false_positives = 0
+        self.purged = 0
+
+    def _rebuild(self, jtis: Iterable[str], count: int):
+        bloom = BloomFilter(max(self.capacity, count * 2), self.fp_rate)
+        for jti in jtis:
+            bloom.add(jti)
+        self.filter = bloom
+
+    async def load(self):
+        """ Rebuild the filter from the table, at startup and after a purge """
+        async with read_session() as conn:
+            result = await conn.execute(select(RevokedToken.id, RevokedToken.jti))
+            rows = result.all()
+        self._rebuild((jti for _, jti in rows), len(rows))
+        self.last_id = max((id for id, _ in rows), default=0)
+        now = time.time()
+        self.revoked = {jti: expires for jti, expires in self.revoked.items() if expires >= now}
+
+    async def sync(self):
+        """ Add the rows other workers inserted since the last load or sync """
+        async with read_session() as conn:
+            result = await conn.execute(select(RevokedToken.id, RevokedToken.jti).where(RevokedToken.id > self.last_id))
+            for id, jti in result.all():
+                self.filter.add(jti)
+                self.last_id = max(self.last_id, id)
+
+    async def purge(self) -> int:
+        """ Delete the rows of expired tokens, a Bloom filter cannot forget keys so it is rebuilt """
+        async with async_session() as conn:
+            result = await conn.execute(delete(RevokedToken).where(RevokedToken.expires < time.time()))
+            await conn.commit()
+        if result.rowcount:
+            self.purged += result.rowcount
+            await self.load()
+        return result.rowcount
+
+    async def revoke(self, jti: str, expires: float, user_id: Optional[int] = None):
+        async with async_session() as conn:
+            stmt = sqlite_insert(RevokedToken).values(jti=jti, expires=expires, user_id=user_id)
+            await conn.execute(stmt.on_conflict_do_nothing(index_elements=["jti"]))
+            await conn.commit()
+        self.filter.add(jti)
+        self.revoked[jti] = expires
+
+    async def is_revoked(self, jti: str) -> bool:
+        self.lookups += 1
+        if jti in self.revoked:
+            return True
+        if jti not in self.filter:
+            return False
+        self.filter_hits += 1
+        async with read_session() as conn:
+            expires = (await conn.execute(select(RevokedToken.expires).where(RevokedToken.jti == jti))).scalar()
+        if expires is None:
+            self.false_positives += 1
+            return False
+        self.revoked[jti] = expires
+        return True
+
+    async def _maintain(self):
+        next_purge = time.monotonic() + REVOCATION_PURGE_SECONDS
+        while True:
+            await asyncio.sleep(REVOCATION_SYNC_SECONDS)
+            try:
+                if time.monotonic() >= next_purge:
+                    next_purge = time.monotonic() + REVOCATION_PURGE_SECONDS
+                    await self.purge()
+                await self.sync()
+            except Exception as error:
+                print(f"Token denylist maintenance failed: {error!r}")
+
+    async def start(self):
+        """ Purge expired rows, load the filter and keep it in sync in the background """
+        await self.shutdown()
+        if not await self.purge():
+            await self.load()
+        self.task = asyncio.create_task(self._maintain())
+
+    async def shutdown(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    def stats(self) -> dict:
+        return {
+            "filter_keys": self.filter.count, "filter_bits": self.filter.size, "filter_hashes": self.filter.hashes,
+            "confirmed": len(self.revoked), "lookups": self.lookups, "filter_hits": self.filter_hits,
+            "false_positives": self.false_positives, "purged": self.purged,
+        }
+
+
+denylist = Denylist(REVOCATION_BLOOM_CAPACITY, REVOCATION_BLOOM_FP_RATE)
@@ -0,0 +1,73 @@
+import re
+from typing import List, Optional, Tuple
+from fastapi import HTTPException
+from sqlalchemy import text
+from src.services.SQLite.index import Base, async_engine, register_models
+
+""" Ranked full-text search over the products_fts and restaurants_fts tables (see their models) """
+
+MAX_TERMS = 8
+# bm25 column weights, a hit in the name counts more than one in the description
+PRODUCT_WEIGHTS = (10.0, 1.0)
+RESTAURANT_WEIGHTS = (10.0, 4.0, 1.0)
+
+_word = re.compile(r"\w+", re.UNICODE)
+
+
+def fts_query(q: str) -> str:
+    """
+    User text to an FTS5 expression where every word must match as a prefix: "ragu tagl" becomes
+    "ragu"* "tagl"*. Operators and quotes typed by the user are dropped instead of being interpreted.
+    """
+    terms = _word.findall(q)[:MAX_TERMS]
+    if not terms:
+        raise HTTPException(status_code=400, detail="Search query must contain at least one word")
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+PRODUCTS_SQL = f"""
+SELECT products.id, products.name, products.description, products.price, products.discount,
+       products.image, products.restaurant_id, bm25(products_fts, {PRODUCT_WEIGHTS[0]}, {PRODUCT_WEIGHTS[1]}) AS rank
+FROM products_fts JOIN products ON products.id = products_fts.rowid
+WHERE products_fts MATCH :query AND products.visible = 1
+  AND (:restaurant_id IS NULL OR products.restaurant_id = :restaurant_id)
+ORDER BY rank LIMIT :limit OFFSET :skip
+"""
+
+RESTAURANTS_SQL = f"""
+SELECT restaurants.id, restaurants.name, restaurants.city, restaurants.description, restaurants.image,
+       restaurants.status, bm25(restaurants_fts, {RESTAURANT_WEIGHTS[0]}, {RESTAURANT_WEIGHTS[1]}, {RESTAURANT_WEIGHTS[2]}) AS rank
+FROM restaurants_fts JOIN restaurants ON restaurants.id = restaurants_fts.rowid
+WHERE restaurants_fts MATCH :query
+ORDER BY rank LIMIT :limit OFFSET :skip
+"""
+
+
+async def search_products(conn, q: str, skip: int = 0, limit: int = 20, restaurant_id: Optional[int] = None) -> List:
+    result = await conn.execute(text(PRODUCTS_SQL), {"query": fts_query(q), "restaurant_id": restaurant_id, "skip": skip, "limit": limit})
+    return result.all()
+
+
+async def search_restaurants(conn, q: str, skip: int = 0, limit: int = 20) -> List:
+    result = await conn.execute(text(RESTAURANTS_SQL), {"query": fts_query(q), "skip": skip, "limit": limit})
+    return result.all()
+
+
+async def rebuild() -> Tuple[int, int]:
+    """ Reindex from the content tables, for databases created before the FTS tables existed """
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(text("INSERT INTO products_fts (products_fts) VALUES ('rebuild')"))
+        await conn.execute(text("INSERT INTO restaurants_fts (restaurants_fts) VALUES ('rebuild')"))
+        products = (await conn.execute(text("SELECT count(*) FROM products"))).scalar()
+        restaurants = (await conn.execute(text("SELECT count(*) FROM restaurants"))).scalar()
+    return products, restaurants
+
+
+""" python -m src.services.search.index rebuilds the full-text indexes """
+
+if __name__ == "__main__":
+    import asyncio
+    register_models()
+    products, restaurants = asyncio.run(rebuild())
+    print(f"Indexed {products} products and {restaurants} restaurants")
@@ -1,20 +1,33 @@
-from passlib.hash import pbkdf2_sha256
+import time
+from datetime import date, timedelta
+import numpy as np
+from sqlalchemy import func, insert
 from sqlalchemy.future import select
-from sqlalchemy.ext.asyncio import AsyncSession
 from src.api.users.model import User
 from src.api.products.model import Product
 from src.api.orders.model import Order
 from src.api.orderItems.model import order_items
 from src.api.restaurants.model import Restaurant
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.ext.asyncio import create_async_engine
+from src.services.SQLite.index import async_engine, async_session, reset_database, prepare_database
+import src.services.reports.index as reports
+from src.services.cart.index import discounted_price
 
+# pbkdf2_sha256 hashes (29000 rounds) of the demo passwords "admin", "password" and "ownerpassword",
+# precomputed so seeding neither loads passlib nor spends a hash per account at startup
+DEMO_PASSWORD_HASHES = {
+    "admin@admin.com": "$pbkdf2-sha256$29000$hhDCuBeCcG7N2XvvPcfY2w$.EWxcbNVzmrc9kgD6DaTdRb75M4E1MS46c6h8YyXHV4",
+    "user@example.com": "$pbkdf2-sha256$29000$0nrPmVPqPQdAqDUm5ByjNA$/MM/v7aEHnALWQpZP2YRVdZXnup6tlgpnzaWZ11E6HY",
+    "owner@example.com": "$pbkdf2-sha256$29000$.v9fq5XSOsfYO2csZcxZCw$k2OUDu8T5blq2YlwH3Bee7j8ZI2JTwEwZJFiObESQbU",
+}
 
-# Setup async engine and session
-async_engine = create_async_engine("sqlite+aiosqlite:///./test.db", echo=True)
-async_session = sessionmaker(
-    bind=async_engine, expire_on_commit=False, class_=AsyncSession
-)
+
+async def seed_if_empty() -> bool:
+    """ Seed the demo data on a database without users, returns whether it did """
+    async with async_session() as session:
+        if (await session.execute(select(User.id).limit(1))).first() is not None:
+            return False
+    await seed_data()
+    return True
 
 
 async def seed_data():
@@ -29,7 +42,7 @@ async def seed_data():
                 name="Admin",
                 surname="Admin",
                 email=admin_email,
-                hashed_password=pbkdf2_sha256.hash("admin"),
+                hashed_password=DEMO_PASSWORD_HASHES[admin_email],
                 role="admin",
             )
             session.add(admin_user)
@@ -45,7 +58,7 @@ async def seed_data():
                 name="Normal",
                 surname="User",
                 email=normal_user_email,
-                hashed_password=pbkdf2_sha256.hash("password"),
+                hashed_password=DEMO_PASSWORD_HASHES[normal_user_email],
                 role="user",
             )
             session.add(normal_user)
@@ -61,7 +74,7 @@ async def seed_data():
                 name="Owner",
                 surname="Example",
                 email=owner_email,
-                hashed_password=pbkdf2_sha256.hash("ownerpassword"),
+                hashed_password=DEMO_PASSWORD_HASHES[owner_email],
                 role="owner",
             )
             session.add(owner)
@@ -136,15 +149,14 @@ async def seed_data():
             {"id": 43, "name": "Fries Curly", "price": 499, "restaurant_id": restaurant.id, "description": "Curly fries", "discount": 10},
         ]
 
-        for product_data in products:
-            stmt = select(Product).where(Product.name == product_data["name"])
-            result = await session.execute(stmt)
-            product = result.scalar_one_or_none()
+        stmt = select(Product.name).where(Product.name.in_([product_data["name"] for product_data in products]))
+        result = await session.execute(stmt)
+        existing_products = set(result.scalars().all())
 
-            if not product:
-                product = Product(**product_data)
-                session.add(product)
-                print("Products created")
+        new_products = [Product(**product_data) for product_data in products if product_data["name"] not in existing_products]
+        if new_products:
+            session.add_all(new_products)
+            print(f"{len(new_products)} products created")
 
         await session.commit()
 
@@ -175,19 +187,219 @@ async def seed_data():
 
                 if product:
 
-                    new_order.total_price += product.price * quantity
+                    price = discounted_price(product.price, product.discount)
+                    new_order.total_price += price * quantity
 
                     await session.execute(
                         order_items.insert().values(
                             order_id=new_order.id,
                             product_id=product_id,
+                            name=product.name,
                             quantity=quantity,
-                            price=(
-                                (product.price * product.discount)
-                                if product.discount
-                                else product.price
-                            ),
+                            price=price,
                         )
                     )
 
+            await reports.record_order_change(session, new_order, None, new_order.status)
             await session.commit()
+
+
+""" python -m src.services.seeder.index --restaurants 1000 --products 50000 --orders 5000000 --months 12 """
+
+SYNTHETIC_DISHES = [
+    "Pizza Margherita", "Pizza Diavola", "Pizza Quattro Formaggi", "Spaghetti alla Carbonara", "Spaghetti Aglio e Olio",
+    "Tagliatelle al Ragù", "Lasagne alla Bolognese", "Risotto ai Funghi", "Risotto alla Milanese", "Gnocchi al Pesto",
+    "Penne all'Arrabbiata", "Bucatini all'Amatriciana", "Cacio e Pepe", "Ossobuco", "Saltimbocca alla Romana",
+    "Cotoletta alla Milanese", "Parmigiana di Melanzane", "Bruschetta", "Insalata Caprese", "Vitello Tonnato",
+    "Arancini", "Frittura di Calamari", "Tiramisù", "Panna Cotta", "Cannoli Siciliani", "Gelato", "Affogato",
+    "Caffè Espresso", "Limoncello", "Focaccia Genovese",
+]
+SYNTHETIC_CITIES = ["Roma", "Milano", "Napoli", "Torino", "Palermo", "Genova", "Bologna", "Firenze", "Bari", "Catania", "Venezia", "Verona"]
+# City centres in the order of SYNTHETIC_CITIES, restaurants are scattered around them
+SYNTHETIC_CITY_COORDINATES = np.array([
+    (41.9028, 12.4964), (45.4642, 9.1900), (40.8518, 14.2681), (45.0703, 7.6869), (38.1157, 13.3615), (44.4056, 8.9463),
+    (44.4949, 11.3426), (43.7696, 11.2558), (41.1171, 16.8719), (37.5079, 15.0830), (45.4408, 12.3155), (45.4384, 10.9916),
+])
+SYNTHETIC_CITY_SPREAD_DEGREES = 0.05
+
+# Share of orders per hour of the day, peaks at lunch and dinner
+SYNTHETIC_HOUR_WEIGHTS = np.array([
+    0.2, 0.1, 0.05, 0.05, 0.05, 0.1, 0.3, 0.8, 1.5, 1.5, 2, 4,
+    9, 10, 6, 2.5, 2, 3, 6, 11, 12, 9, 4, 1,
+])
+SYNTHETIC_BASKET_SIZES = np.arange(1, 9)
+SYNTHETIC_BASKET_WEIGHTS = np.array([18, 26, 22, 14, 9, 6, 3, 2])
+SYNTHETIC_STATUSES = np.array(["completed", "canceled", "pending"])
+SYNTHETIC_STATUS_WEIGHTS = np.array([0.92, 0.05, 0.03])
+# Rank within a menu is n * u ** skew, the higher the skew the more orders go to the first products
+SYNTHETIC_PRODUCT_SKEW = 2.5
+SYNTHETIC_RESTAURANT_SKEW = 0.8
+
+
+def _normalized(weights):
+    return weights / weights.sum()
+
+
+async def _next_id(conn, column) -> int:
+    result = await conn.execute(select(func.coalesce(func.max(column), 0)))
+    return result.scalar() + 1
+
+
+async def _bulk_insert(conn, table, rows, batch_size: int):
+    for start in range(0, len(rows), batch_size):
+        await conn.execute(insert(table), rows[start:start + batch_size])
+
+
+async def seed_synthetic(restaurants: int = 1000, products: int = 50000, orders: int = 5000000, customers: int = 20000,
+                         months: int = 12, seed: int = 42, batch_size: int = 50000):
+    """
+    Bulk insert a reproducible dataset: the same arguments and seed produce the same rows, dated back from today.
+    Rows are appended after the existing ids, the rollups are rebuilt at the end.
+    """
+    rng = np.random.default_rng(seed)
+    started = time.perf_counter()
+    from passlib.hash import pbkdf2_sha256
+
+    # One hash for every synthetic account, their password is "password"
+    hashed_password = pbkdf2_sha256.using(salt=b"synthetic", rounds=1000).hash("password")
+    products = max(products, restaurants)
+
+    async with async_engine.begin() as conn:
+        user_id = await _next_id(conn, User.id)
+        restaurant_id = await _next_id(conn, Restaurant.id)
+        product_id = await _next_id(conn, Product.id)
+        order_id = await _next_id(conn, Order.id)
+
+        owner_ids = np.arange(user_id, user_id + restaurants)
+        customer_ids = np.arange(user_id + restaurants, user_id + restaurants + customers)
+        await _bulk_insert(conn, User, [
+            {"id": int(owner), "name": "Owner", "surname": f"Synthetic {owner}", "email": f"owner{owner}@synthetic.test", "hashed_password": hashed_password, "role": "owner"}
+            for owner in owner_ids
+        ] + [
+            {"id": int(customer), "name": "Customer", "surname": f"Synthetic {customer}", "email": f"customer{customer}@synthetic.test", "hashed_password": hashed_password, "role": "user"}
+            for customer in customer_ids
+        ], batch_size)
+
+        restaurant_ids = np.arange(restaurant_id, restaurant_id + restaurants)
+        cities = rng.integers(0, len(SYNTHETIC_CITIES), restaurants)
+        # Separate generator, the other columns of a seeded dataset stay the same as before coordinates existed
+        coordinates = SYNTHETIC_CITY_COORDINATES[cities] + np.random.default_rng([seed, 1]).normal(0, SYNTHETIC_CITY_SPREAD_DEGREES, (restaurants, 2))
+        await _bulk_insert(conn, Restaurant, [
+            {
+                "id": int(rid),
+                "name": f"Trattoria {rid}",
+                "address": f"Via Roma {i + 1}",
+                "city": SYNTHETIC_CITIES[cities[i]],
+                "country": "Italia",
+                "postal_code": f"{10000 + i % 90000}",
+                "status": "open",
+                "owner_id": int(owner_ids[i]),
+                "email": f"trattoria{rid}@synthetic.test",
+                "description": f"Cucina tipica di {SYNTHETIC_CITIES[cities[i]]}",
+                "latitude": round(float(coordinates[i, 0]), 6),
+                "longitude": round(float(coordinates[i, 1]), 6),
+            }
+            for i, rid in enumerate(restaurant_ids)
+        ], batch_size)
+
+        # Menus are contiguous id ranges, restaurant i owns menu_start[i] .. menu_start[i] + menu_size[i] - 1
+        menu_size = np.full(restaurants, products // restaurants)
+        menu_size[:products % restaurants] += 1
+        menu_start = product_id + np.concatenate(([0], np.cumsum(menu_size)[:-1]))
+        product_restaurant = np.repeat(restaurant_ids, menu_size)
+        prices = rng.integers(300, 3000, products) // 10 * 10 + 9
+        discounts = np.where(rng.random(products) < 0.3, rng.choice([5, 10, 15, 20], products), 0)
+        unit_prices = (prices * (100 - discounts) + 50) // 100
+        dishes = rng.integers(0, len(SYNTHETIC_DISHES), products)
+        names = np.array([f"{SYNTHETIC_DISHES[dish]} {product_id + i}" for i, dish in enumerate(dishes)], dtype=object)
+        await _bulk_insert(conn, Product, [
+            {
+                "id": product_id + i,
+                "name": names[i],
+                "description": f"{SYNTHETIC_DISHES[dishes[i]]} della casa",
+                "price": int(prices[i]),
+                "discount": int(discounts[i]) or None,
+                "status": "available",
+                "visible": True,
+                "restaurant_id": int(product_restaurant[i]),
+            }
+            for i in range(products)
+        ], batch_size)
+
+    print(f"Seeded {restaurants} restaurants, {restaurants + customers} users and {products} products")
+
+    restaurant_weights = _normalized(1 / np.arange(1, restaurants + 1) ** SYNTHETIC_RESTAURANT_SKEW)
+    hour_weights = _normalized(SYNTHETIC_HOUR_WEIGHTS)
+    basket_weights = _normalized(SYNTHETIC_BASKET_WEIGHTS)
+    days = months * 30
+    first_day = np.datetime64(date.today() - timedelta(days=days), "s")
+    lines_seeded = 0
+
+    for batch_start in range(0, orders, batch_size):
+        count = min(batch_size, orders - batch_start)
+        ids = order_id + batch_start + np.arange(count)
+        order_restaurant = rng.choice(restaurants, count, p=restaurant_weights)
+        created_at = first_day + (
+            rng.integers(0, days, count) * 86400 + rng.choice(24, count, p=hour_weights) * 3600 + rng.integers(0, 3600, count)
+        ).astype("timedelta64[s]")
+        statuses = rng.choice(SYNTHETIC_STATUSES, count, p=SYNTHETIC_STATUS_WEIGHTS)
+        order_customer = rng.choice(customer_ids, count)
+
+        # Draw the lines, then fold repeated products of an order into its quantity
+        sizes = rng.choice(SYNTHETIC_BASKET_SIZES, count, p=basket_weights)
+        line_order = np.repeat(np.arange(count), sizes)
+        line_restaurant = order_restaurant[line_order]
+        rank = (menu_size[line_restaurant] * rng.random(len(line_order)) ** SYNTHETIC_PRODUCT_SKEW).astype(np.int64)
+        line_product = menu_start[line_restaurant] + rank
+        keys, quantity = np.unique(line_order * (product_id + products) + line_product, return_counts=True)
+        line_order, line_product = np.divmod(keys, product_id + products)
+        line_price = unit_prices[line_product - product_id]
+        line_name = names[line_product - product_id]
+        totals = np.bincount(line_order, weights=quantity * line_price, minlength=count).astype(np.int64)
+
+        # Plain tuples through the driver's executemany, formatted like SQLAlchemy stores DateTime
+        # ("YYYY-MM-DD HH:MM:SS.ffffff") so string comparisons against bound datetimes stay correct
+        created = np.char.replace(np.datetime_as_string(created_at, unit="us"), "T", " ").tolist()
+        async with async_engine.begin() as conn:
+            await conn.exec_driver_sql(
+                "INSERT INTO orders (id, customer_id, restaurant_id, status, total_price, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                list(zip(ids.tolist(), order_customer.tolist(), restaurant_ids[order_restaurant].tolist(), statuses.tolist(), totals.tolist(), created, created)),
+            )
+            line_created = [created[i] for i in line_order.tolist()]
+            await conn.exec_driver_sql(
+                "INSERT INTO order_items (order_id, product_id, name, quantity, price, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                list(zip(ids[line_order].tolist(), line_product.tolist(), line_name.tolist(), quantity.tolist(), line_price.tolist(), line_created, line_created)),
+            )
+        lines_seeded += len(keys)
+        print(f"Seeded {batch_start + count}/{orders} orders ({lines_seeded} lines) in {time.perf_counter() - started:.1f}s")
+
+    await reports.rebuild_rollups()
+    print(f"Synthetic dataset ready in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+
+    parser = argparse.ArgumentParser(description="Seed a synthetic dataset through the configured engine")
+    parser.add_argument("--restaurants", type=int, default=1000)
+    parser.add_argument("--products", type=int, default=50000)
+    parser.add_argument("--orders", type=int, default=5000000)
+    parser.add_argument("--customers", type=int, default=20000)
+    parser.add_argument("--months", type=int, default=12)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch-size", type=int, default=50000)
+    parser.add_argument("--reset", action="store_true", help="drop and recreate every table first")
+    args = parser.parse_args()
+
+    async def main():
+        # Logging every statement of a bulk load would dominate its runtime
+        async_engine.echo = False
+        # Both create every registered model, not only the ones imported here
+        if args.reset:
+            await reset_database()
+        else:
+            await prepare_database()
+        await seed_synthetic(args.restaurants, args.products, args.orders, args.customers, args.months, args.seed, args.batch_size)
+
+    asyncio.run(main())
@@ -0,0 +1,152 @@
+import asyncio
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.services.SQLite.index import async_session, DB_PROFILE
+from src.services.metrics.index import RequestStats, current
+
+import os
+from dotenv import load_dotenv
+load_dotenv()
+
+# A batch is committed this long after its first write arrived, or once it holds ORDER_WRITE_BATCH_SIZE writes.
+# 0 commits every write in its own transaction as soon as it arrives. On by default only in the development
+# profile, where concurrent writers otherwise fail with "database is locked". In production the single
+# writer connection already serializes them and a WAL commit does not fsync, so a batch only adds the
+# savepoints and makes every write wait for the slowest of its batch (see benchmarks/order_writes.py)
+ORDER_WRITE_BATCH_WINDOW_MS = float(os.getenv("ORDER_WRITE_BATCH_WINDOW_MS", 0 if DB_PROFILE == "production" else 2))
+ORDER_WRITE_BATCH_SIZE = int(os.getenv("ORDER_WRITE_BATCH_SIZE", 64))
+
+Work = Callable[[AsyncSession], Awaitable[Any]]
+# A write, the future its caller awaits and the RequestStats of that caller's request, if any
+Item = Tuple[Work, asyncio.Future, Optional[RequestStats]]
+
+
+class WriteQueue:
+    """
+    Group commit: writes queued within one window run in a single transaction, one commit (and one fsync)
+    for all of them. Each write runs in its own savepoint, so a write that fails is rolled back alone and
+    only its caller gets the error. Callers get their result once the whole batch is committed. The statements
+    of a write count toward the metrics of the request that submitted it, not the batch task.
+    """
+
+    def __init__(self, window_ms: float, max_batch: int):
+        self.window = window_ms / 1000
+        self.max_batch = max(max_batch, 1)
+        self.queue: Optional["asyncio.Queue[Optional[Item]]"] = None
+        self.task: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.writes = 0
+        self.failed = 0
+        self.largest = 0
+
+    def start(self):
+        if self.task is not None and not self.task.done() and self.task.get_loop() is asyncio.get_running_loop():
+            return
+        self.queue = asyncio.Queue()
+        self.task = asyncio.create_task(self._run())
+
+    async def shutdown(self):
+        """ Commit what is queued, then stop """
+        if self.task is None:
+            return
+        await self.queue.put(None)
+        await self.task
+        self.task = None
+
+    async def submit(self, work: Work):
+        """ Run work(session) in the next batch and return its result once committed. work must not commit """
+        if self.window <= 0:
+            async with async_session() as session:
+                result = await work(session)
+                await session.commit()
+            self.batches += 1
+            self.writes += 1
+            return result
+
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((work, future, current.get()))
+        return await future
+
+    async def _collect(self) -> Tuple[List[Item], bool]:
+        first = await self.queue.get()
+        if first is None:
+            return [], True
+        batch = [first]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self.queue.get(), remaining)
+            except asyncio.TimeoutError:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    async def _run(self):
+        # The task copied the context of whoever started it, its own statements belong to no request
+        current.set(None)
+        stopping = False
+        while not stopping:
+            batch, stopping = await self._collect()
+            if batch:
+                await self._apply(batch)
+
+    async def _apply(self, batch: List[Item]):
+        outcomes: List[Tuple[bool, Any]] = []
+        try:
+            async with async_session() as session:
+                # Takes the write lock now rather than at the first write, and makes the savepoints nest
+                # inside this transaction instead of each starting (and committing) one of its own
+                await session.execute(text("BEGIN IMMEDIATE"))
+                for work, future, stats in batch:
+                    if future.cancelled():
+                        outcomes.append((False, None))
+                        continue
+                    token = current.set(stats)
+                    try:
+                        # Released (and flushed) on exit, constraint errors surface here and stay with this write
+                        async with session.begin_nested():
+                            result = await work(session)
+                        outcomes.append((True, result))
+                    except Exception as error:
+                        outcomes.append((False, error))
+                    finally:
+                        current.reset(token)
+                    # The rows are flushed, detaching them keeps every later autoflush from walking the whole batch
+                    session.expunge_all()
+                await session.commit()
+        except Exception as error:
+            # Nothing of the batch was committed
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(error)
+            self.failed += len(batch)
+            return
+
+        self.batches += 1
+        self.writes += len(batch)
+        self.largest = max(self.largest, len(batch))
+        for (_, future, _), (ok, value) in zip(batch, outcomes):
+            if future.done():
+                continue
+            if ok:
+                future.set_result(value)
+            else:
+                self.failed += 1
+                future.set_exception(value)
+
+    def stats(self) -> dict:
+        return {
+            "window_seconds": self.window, "max_batch": self.max_batch, "queued": self.queue.qsize() if self.queue else 0,
+            "batches": self.batches, "writes": self.writes, "failed": self.failed, "largest_batch": self.largest,
+        }
+
+
+write_queue = WriteQueue(ORDER_WRITE_BATCH_WINDOW_MS, ORDER_WRITE_BATCH_SIZE)
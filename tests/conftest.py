@@ -0,0 +1,25 @@
+import asyncio
+import os
+import tempfile
+
+# Before anything from src, the engines are built from these on import
+directory = tempfile.TemporaryDirectory()
+path = os.path.join(directory.name, "tests.db")
+os.environ["ENGINE_PATH_DB"] = f"sqlite:///{path}"
+os.environ["ASYNC_ENGINE_PATH_DB"] = f"sqlite+aiosqlite:///{path}"
+
+import pytest
+import src.services.SQLite.index as db
+from src.services.seeder.index import seed_data
+
+
+@pytest.fixture(scope="session")
+def run():
+    """ Runs a coroutine to completion, on one event loop for the session since the engines keep their connections """
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(db.reset_database())
+    loop.run_until_complete(seed_data())
+    yield loop.run_until_complete
+    loop.run_until_complete(db.async_engine.dispose())
+    loop.close()
+    directory.cleanup()
@@ -0,0 +1,36 @@
+import numpy as np
+import src.services.analytics.index as analytics
+
+
+def frame(product_ids) -> analytics.OrderFrame:
+    count = len(product_ids)
+    return analytics.OrderFrame(
+        np.arange(count, dtype=np.int64), np.full(count, 86400 * 20000, dtype=np.int64),
+        np.full(count, analytics.COMPLETED, dtype=np.int8), np.array(product_ids, dtype=np.int64),
+        np.arange(count, 0, -1, dtype=np.int64), np.full(count, 100, dtype=np.int64))
+
+
+def test_summary_names_every_product_it_returns(run):
+    # Demo products 1 to 8, sold in decreasing quantities
+    summary = analytics.summary(frame(list(range(1, 9))), top=3)
+
+    assert [product["id"] for product in summary["products"]] == list(range(1, 9))
+    assert [product["name"] for product in summary["products"]][:4] == ["Pizza", "Burger", "Salad", "Pasta"]
+    assert all(product["name"] for product in summary["products"])
+    assert summary["top_products"] == summary["products"][:3]
+
+
+def test_frames_expire_after_the_ttl(monkeypatch):
+    loads = []
+    monkeypatch.setattr(analytics, "load_frame", lambda restaurant_id: loads.append(restaurant_id) or frame([]))
+    cache = analytics.FrameCache(max_size=4, ttl=60)
+    now = [1000.0]
+    monkeypatch.setattr(analytics.time, "monotonic", lambda: now[0])
+
+    cache.get(1)
+    cache.get(1)
+    now[0] += 61
+    cache.get(1)
+    cache.invalidate(1)
+    cache.get(1)
+    assert loads == [1, 1, 1]
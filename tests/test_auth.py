@@ -0,0 +1,38 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import jwt
+
+import src.services.auth.index as auth
+import src.services.revocation.index as revocation
+
+
+def user(id: int = 2):
+    return SimpleNamespace(id=id, email="user@example.com", role="user", hashed_password="hash")
+
+
+def legacy_token() -> str:
+    """ Signed like tokens were before they carried a jti """
+    expires = (datetime.now() + timedelta(minutes=5)).timestamp()
+    return jwt.encode({"id": 2, "email": "user@example.com", "role": "user", "expires": expires}, auth.JWT_SECRET, algorithm=auth.JWT_ALGORITHM)
+
+
+def test_a_revoked_token_is_refused(run):
+    token = auth.sign_jwt(user())["token"]["access_token"]
+    payload = auth.decode_jwt(token)
+    assert not run(auth.is_revoked(payload))
+
+    run(revocation.denylist.revoke(payload["jti"], payload["expires"], payload["id"]))
+    assert run(auth.is_revoked(auth.decode_jwt(token)))
+    other = auth.decode_jwt(auth.sign_jwt(user())["token"]["access_token"])
+    assert not run(auth.is_revoked(other))
+
+
+def test_a_token_without_a_jti_is_accepted_until_revoked(run):
+    token = legacy_token()
+    payload = auth.decode_jwt(token)
+    assert payload["jti"] == auth.legacy_jti(token)
+    assert not run(auth.is_revoked(payload))
+
+    run(revocation.denylist.revoke(payload["jti"], payload["expires"], payload["id"]))
+    assert run(auth.is_revoked(auth.decode_jwt(token)))
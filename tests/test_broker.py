@@ -0,0 +1,44 @@
+from src.services.broker.index import Broker
+
+
+def drain(subscription) -> list:
+    events = []
+    while not subscription.queue.empty():
+        events.append(subscription.queue.get_nowait())
+    return events
+
+
+def test_resume_replays_the_events_after_the_last_event_id():
+    broker = Broker(queue_size=4, history_size=8)
+    events = [broker.publish(1, "order.created", {"id": i}) for i in range(3)]
+
+    replayed = drain(broker.subscribe(1, events[0].id))
+    assert [event.id for event in replayed] == [event.id for event in events[1:]]
+
+
+def test_resume_past_the_queue_bound_resets_instead_of_dropping_events():
+    broker = Broker(queue_size=4, history_size=8)
+    events = [broker.publish(1, "order.created", {"id": i}) for i in range(7)]
+
+    # 6 events missed, all still in the history but more than the queue holds
+    replayed = drain(broker.subscribe(1, events[0].id))
+    assert [event.type for event in replayed] == ["reset"]
+
+
+def test_resume_past_the_history_resets():
+    broker = Broker(queue_size=4, history_size=2)
+    events = [broker.publish(1, "order.created", {"id": i}) for i in range(4)]
+
+    assert [event.type for event in drain(broker.subscribe(1, events[0].id))] == ["reset"]
+    assert [event.type for event in drain(broker.subscribe(1, "0:1"))] == ["reset"]
+
+
+def test_a_subscriber_that_falls_behind_is_closed():
+    broker = Broker(queue_size=2, history_size=8)
+    subscription = broker.subscribe(1)
+    for i in range(3):
+        broker.publish(1, "order.created", {"id": i})
+
+    assert subscription.overflowed
+    assert drain(subscription) == [None]
+    assert broker.stats()["subscribers"] == 0
@@ -0,0 +1,50 @@
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+from starlette.requests import Request
+
+from src.services.cache.index import ResponseCache
+
+
+def request(if_none_match: str = None) -> Request:
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+    return Request({"type": "http", "method": "GET", "path": "/restaurants", "query_string": b"", "headers": headers})
+
+
+def rows(updated_at: datetime):
+    return [SimpleNamespace(id=1, updated_at=updated_at)]
+
+
+def test_a_matching_etag_gets_304_and_a_changed_row_a_new_etag():
+    cache = ResponseCache(max_entries=4, ttl=60)
+    entry = cache.put("/restaurants?", [{"id": 1}], rows(datetime(2024, 1, 1)), ["restaurants"], cache.generation)
+
+    assert cache.get("/restaurants?") is entry
+    assert entry.response(request(entry.etag)).status_code == 304
+    assert entry.response(request('"stale"')).status_code == 200
+
+    changed = cache.put("/restaurants?", [{"id": 1}], rows(datetime(2024, 1, 2)), ["restaurants"], cache.generation)
+    assert changed.etag != entry.etag
+
+
+def test_invalidate_drops_tagged_entries_and_skips_puts_computed_before_it():
+    cache = ResponseCache(max_entries=4, ttl=60)
+    generation = cache.generation
+    cache.put("/restaurants?", [], [], ["restaurants"], generation)
+
+    cache.invalidate("restaurants")
+    assert cache.get("/restaurants?") is None
+
+    cache.put("/restaurants?", [], [], ["restaurants"], generation)
+    assert cache.get("/restaurants?") is None
+
+
+def test_entries_expire_after_the_ttl():
+    cache = ResponseCache(max_entries=4, ttl=0.05)
+    cache.put("/restaurants?", [], [], ["restaurants"], cache.generation)
+    assert cache.get("/restaurants?") is not None
+
+    time.sleep(0.06)
+    assert cache.get("/restaurants?") is None
+    assert cache.stats()["entries"] == 0
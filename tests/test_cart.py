@@ -0,0 +1,65 @@
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import insert
+
+from src.services.SQLite.index import async_session
+from src.api.products.model import Product
+from src.services.cart.index import discounted_price, price_cart
+
+
+async def price(restaurant_id, product_ids, quantities):
+    async with async_session() as session:
+        return await price_cart(session, restaurant_id, product_ids, quantities)
+
+
+async def hidden_products():
+    """ One out of stock and one invisible product of restaurant 1 """
+    async with async_session() as session:
+        unavailable = await session.execute(insert(Product).values(name="Sold out", price=500, status="out_of_stock", restaurant_id=1))
+        invisible = await session.execute(insert(Product).values(name="Off menu", price=500, visible=False, restaurant_id=1))
+        await session.commit()
+        return unavailable.lastrowid, invisible.lastrowid
+
+
+def test_discounts_round_half_up():
+    assert discounted_price(899, None) == 899
+    assert discounted_price(899, 10) == 809  # 809.1
+    assert discounted_price(1299, 15) == 1104  # 1104.15
+    assert discounted_price(250, 10) == 225
+    assert discounted_price(5, 10) == 5  # 4.5
+
+
+def test_cart_lines_are_priced_with_discounts_and_merged(run):
+    # Demo products: 1 Pizza 1099, 4 Pasta 899 with 10% off, 5 Sushi 1299 with 15% off
+    lines = run(price(1, [1, 4, 5, 4], [2, 1, 1, 2]))
+
+    assert [line.to_dict() for line in lines] == [
+        {"product_id": 1, "name": "Pizza", "quantity": 2, "unit_price": 1099, "total": 2198},
+        {"product_id": 4, "name": "Pasta", "quantity": 3, "unit_price": 809, "total": 2427},
+        {"product_id": 5, "name": "Sushi", "quantity": 1, "unit_price": 1104, "total": 1104},
+    ]
+
+
+def test_unavailable_invisible_and_unknown_products_are_rejected(run):
+    unavailable, invisible = run(hidden_products())
+
+    for product_id in (unavailable, invisible):
+        with pytest.raises(HTTPException) as raised:
+            run(price(1, [1, product_id], [1, 1]))
+        assert raised.value.status_code == 400
+        assert raised.value.detail == f"Product with ID {product_id} is not available"
+
+    with pytest.raises(HTTPException) as raised:
+        run(price(1, [1, 999999], [1, 1]))
+    assert raised.value.status_code == 404
+
+
+def test_products_of_another_restaurant_and_bad_quantities_are_rejected(run):
+    with pytest.raises(HTTPException) as raised:
+        run(price(2, [1], [1]))
+    assert raised.value.status_code == 400 and "does not belong" in raised.value.detail
+
+    for product_ids, quantities in (([1], [0]), ([1, 2], [1]), ([], [])):
+        with pytest.raises(HTTPException) as raised:
+            run(price(1, product_ids, quantities))
+        assert raised.value.status_code == 400
@@ -0,0 +1,29 @@
+from sqlalchemy import insert
+
+from src.services.SQLite.index import async_session
+from src.api.restaurants.model import Restaurant
+from src.api.products.model import Product
+from src.api.products.index import menus
+from src.api.restaurants.index import delete_restaurant
+
+ADMIN = {"id": 1, "role": "admin"}
+
+
+async def restaurant_with_a_product() -> int:
+    async with async_session() as conn:
+        result = await conn.execute(insert(Restaurant).values(
+            name="Closing", address="1 Street", city="City", country="Country", email="closing@example.com", owner_id=1))
+        await conn.execute(insert(Product).values(name="Closing soup", price=499, restaurant_id=result.lastrowid))
+        await conn.commit()
+        return result.lastrowid
+
+
+def test_deleting_a_restaurant_forgets_its_menu(run):
+    restaurant_id = run(restaurant_with_a_product())
+    menu = run(menus.menu(restaurant_id))
+    assert restaurant_id in menus.menus
+    assert all(menus.located[product_id] == restaurant_id for product_id in menu.ids)
+
+    run(delete_restaurant(restaurant_id, token=ADMIN))
+    assert restaurant_id not in menus.menus
+    assert not any(menus.located.get(product_id) == restaurant_id for product_id in menu.ids)
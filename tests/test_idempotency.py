@@ -0,0 +1,72 @@
+import asyncio
+
+import orjson
+import pytest
+from fastapi import HTTPException
+
+from src.services.SQLite.index import async_session
+from src.services.idempotency.index import Idempotency, Key
+
+
+def order_work(idempotency: Idempotency, key: Key, runs: list):
+    async def work():
+        runs.append(key.key)
+        await asyncio.sleep(0.01)
+        content = {"id": len(runs), "total_price": 1099}
+        async with async_session() as session:
+            idempotency.record(session, key, content)
+            await session.commit()
+        return content
+    return work
+
+
+async def send(idempotency: Idempotency, user_id: int, key: str, body: bytes, runs: list):
+    key = Key(user_id, key, body)
+    return await idempotency.run(key, order_work(idempotency, key, runs))
+
+
+def test_a_retry_replays_the_first_response(run):
+    idempotency, runs = Idempotency(ttl=60, max_size=8), []
+    first = run(send(idempotency, 2, "retry", b'{"products":[1]}', runs))
+    replayed = run(send(idempotency, 2, "retry", b'{"products":[1]}', runs))
+
+    assert runs == ["retry"]
+    assert replayed.headers["Idempotent-Replayed"] == "true"
+    assert orjson.loads(replayed.body) == first
+
+    # Another worker only has the table
+    idempotency.entries.clear()
+    assert orjson.loads(run(send(idempotency, 2, "retry", b'{"products":[1]}', runs)).body) == first
+    assert runs == ["retry"]
+
+
+def test_a_key_reused_with_another_body_is_refused(run):
+    idempotency, runs = Idempotency(ttl=60, max_size=8), []
+    run(send(idempotency, 2, "reused", b'{"products":[1]}', runs))
+
+    with pytest.raises(HTTPException) as raised:
+        run(send(idempotency, 2, "reused", b'{"products":[2]}', runs))
+    assert raised.value.status_code == 422
+    # Keys belong to one caller
+    assert run(send(idempotency, 3, "reused", b'{"products":[2]}', runs)) == {"id": 2, "total_price": 1099}
+
+
+def test_concurrent_requests_with_one_key_run_once(run):
+    idempotency, runs = Idempotency(ttl=60, max_size=8), []
+
+    async def together():
+        return await asyncio.gather(*[send(idempotency, 2, "double-click", b"{}", runs) for _ in range(3)])
+
+    results = run(together())
+    assert runs == ["double-click"]
+    assert idempotency.coalesced == 2
+    # Whichever finished its lookup first ran, the others waited for it
+    [first] = [result for result in results if isinstance(result, dict)]
+    assert [orjson.loads(result.body) for result in results if result is not first] == [first, first]
+
+
+def test_keys_must_fit_the_column():
+    for key in ("", "k" * 256):
+        with pytest.raises(HTTPException) as raised:
+            Key(2, key, b"{}")
+        assert raised.value.status_code == 400
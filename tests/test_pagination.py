@@ -0,0 +1,51 @@
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select
+
+from src.services.SQLite.index import read_session
+from src.api.products.model import Product
+from src.api.orders.model import Order
+import src.services.pagination.index as pagination
+
+
+async def walk(stmt, columns, limit: int):
+    """ Every page forward from the first, then every page back from the last """
+    async with read_session() as conn:
+        forward, cursor = [], ""
+        while cursor is not None:
+            rows, cursor, prev_cursor = await pagination.keyset_page(conn, stmt, columns, limit, cursor)
+            forward.append([row.id for row in rows])
+
+        backward = []
+        while prev_cursor is not None:
+            rows, _, prev_cursor = await pagination.keyset_page(conn, stmt, columns, limit, prev_cursor)
+            backward.append([row.id for row in rows])
+        everything = (await conn.execute(stmt.order_by(*columns))).scalars().all()
+        return forward, backward, [row.id for row in everything]
+
+
+def test_keyset_pages_cover_every_row_once_both_ways(run):
+    forward, backward, ids = run(walk(select(Product).where(Product.restaurant_id == 1), [Product.id], 3))
+
+    assert [id for page in forward for id in page] == ids
+    assert all(len(page) == 3 for page in forward[:-1])
+    # Back from the last page: the pages before it, in reverse
+    assert backward == forward[-2::-1]
+
+
+def test_keyset_pages_on_a_datetime_and_id(run):
+    forward, _, ids = run(walk(select(Order), [Order.created_at, Order.id], 2))
+
+    assert ids, "the demo data has orders"
+    assert [id for page in forward for id in page] == ids
+
+
+def test_a_malformed_cursor_is_a_bad_request(run):
+    async def page(cursor):
+        async with read_session() as conn:
+            return await pagination.keyset_page(conn, select(Product), [Product.id], 3, cursor)
+
+    for cursor in ("not-a-cursor", pagination.encode_cursor((1, 2), "next"), pagination.encode_cursor((1,), "up")):
+        with pytest.raises(HTTPException) as raised:
+            run(page(cursor))
+        assert raised.value.status_code == 400
@@ -0,0 +1,47 @@
+import asyncio
+import threading
+
+import src.services.QRCode.index as qr_code
+
+
+def slow_render(renders: list, release: threading.Event):
+    def render(url, kind, scale, error):
+        renders.append(url)
+        release.wait(5)
+        return f"{kind}:{url}".encode()
+    return render
+
+
+async def render_together(count: int, release: threading.Event, cancel_first: bool = False):
+    tasks = [asyncio.ensure_future(qr_code.render_qr_code(1, 7)) for _ in range(count)]
+    await asyncio.sleep(0.05)
+    if cancel_first:
+        tasks[0].cancel()
+    release.set()
+    return await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def test_concurrent_requests_for_one_code_share_a_render(monkeypatch):
+    renders, release = [], threading.Event()
+    monkeypatch.setattr(qr_code, "_render", slow_render(renders, release))
+    monkeypatch.setattr(qr_code, "cache", qr_code.QRCodeCache(max_size=4))
+
+    images = asyncio.run(render_together(5, release))
+
+    assert len(renders) == 1
+    assert images == [b"png:" + qr_code.table_url(1, 7).encode()] * 5
+    assert qr_code.cache.stats()["coalesced"] == 4
+    assert qr_code.cache.pending == {}
+    assert asyncio.run(qr_code.render_qr_code(1, 7)) == images[0] and len(renders) == 1
+
+
+def test_a_cancelled_caller_does_not_cancel_the_shared_render(monkeypatch):
+    renders, release = [], threading.Event()
+    monkeypatch.setattr(qr_code, "_render", slow_render(renders, release))
+    monkeypatch.setattr(qr_code, "cache", qr_code.QRCodeCache(max_size=4))
+
+    images = asyncio.run(render_together(3, release, cancel_first=True))
+
+    assert isinstance(images[0], asyncio.CancelledError)
+    assert images[1] == images[2] == b"png:" + qr_code.table_url(1, 7).encode()
+    assert len(renders) == 1
@@ -0,0 +1,57 @@
+from types import SimpleNamespace
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+import src.services.auth.index as auth
+from src.services.ratelimit.index import RateLimit, parse_limit
+
+
+def client_for(limit: RateLimit) -> TestClient:
+    app = FastAPI()
+
+    @app.get("/limited", dependencies=[Depends(limit)])
+    def limited():
+        return {"ok": True}
+
+    return TestClient(app)
+
+
+def test_an_empty_bucket_gets_429_with_retry_after():
+    client = client_for(RateLimit("test", "3/minute", max_keys=16, shards=2))
+
+    assert [client.get("/limited").status_code for _ in range(3)] == [200, 200, 200]
+    throttled = client.get("/limited")
+    assert throttled.status_code == 429
+    # One token every 20 seconds
+    assert throttled.headers["Retry-After"] == "20"
+
+
+def test_users_are_limited_by_token_and_anonymous_callers_by_address():
+    client = client_for(RateLimit("test", "1/hour", max_keys=16, shards=2))
+    token = auth.sign_jwt(SimpleNamespace(id=2, email="user@example.com", role="user", hashed_password=None))["token"]["access_token"]
+
+    assert client.get("/limited").status_code == 200
+    assert client.get("/limited").status_code == 429
+    assert client.get("/limited", headers={"Authorization": f"Bearer {token}"}).status_code == 200
+    assert client.get("/limited", headers={"Authorization": f"Bearer {token}"}).status_code == 429
+
+
+def test_buckets_refill_at_the_limit_rate():
+    limit = RateLimit("test", "2/second", max_keys=16, shards=2)
+
+    assert limit.take("ip:1", 100.0) == limit.take("ip:1", 100.0) == 0
+    assert limit.take("ip:1", 100.0) == pytest.approx(0.5)
+    assert limit.take("ip:1", 100.25) == pytest.approx(0.25)
+    assert limit.take("ip:1", 100.75) == 0
+    assert limit.stats()["throttled"] == 2
+
+
+def test_limits_are_parsed_or_refused():
+    assert parse_limit("10/minute") == (10, 10 / 60)
+    assert parse_limit("off") is None
+    assert not RateLimit("test", "off", max_keys=16, shards=2).enabled
+    for limit in ("10", "0/second", "ten/minute", "10/day"):
+        with pytest.raises(ValueError):
+            parse_limit(limit)
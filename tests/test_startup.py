@@ -0,0 +1,36 @@
+""" python -m pytest tests """
+import os
+import subprocess
+import sys
+import textwrap
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Starts the app against the database and reads every table of the schema, in its own interpreter so the
+# engine is built from the environment of the test
+START_APP = textwrap.dedent("""
+    from fastapi.testclient import TestClient
+    from sqlalchemy import inspect
+    import src.services.SQLite.index as db
+    from main import app
+
+    with TestClient(app):
+        tables = set(inspect(db.sync_engine).get_table_names())
+    missing = [table.name for table in db.Base.metadata.sorted_tables if table.name not in tables]
+    assert not missing, missing
+""")
+
+
+def run(args, path, **env):
+    environment = dict(os.environ, ENGINE_PATH_DB=f"sqlite:///{path}", ASYNC_ENGINE_PATH_DB=f"sqlite+aiosqlite:///{path}", **env)
+    return subprocess.run([sys.executable, *args], cwd=ROOT, env=environment, capture_output=True, text=True, timeout=120)
+
+
+def test_app_starts_on_a_database_reset_by_the_seeder(tmp_path):
+    path = tmp_path / "seeded.db"
+    seeded = run(["-m", "src.services.seeder.index", "--reset", "--restaurants", "2", "--products", "10",
+                  "--orders", "20", "--customers", "5", "--months", "1"], path)
+    assert seeded.returncode == 0, seeded.stderr
+
+    started = run(["-c", START_APP], path, STARTUP_MODE="warm")
+    assert started.returncode == 0, started.stderr
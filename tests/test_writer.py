@@ -0,0 +1,47 @@
+import asyncio
+from sqlalchemy import text
+from src.services.metrics.index import RequestStats, current
+from src.services.writer.index import WriteQueue
+
+
+async def submit_from_requests(queue: WriteQueue, count: int):
+    async def request(i):
+        stats = RequestStats()
+        current.set(stats)
+        value = await queue.submit(lambda session: session.execute(text("SELECT :i"), {"i": i}))
+        return value, stats
+
+    try:
+        return await asyncio.gather(*[request(i) for i in range(count)])
+    finally:
+        await queue.shutdown()
+
+
+def test_batched_writes_count_toward_the_request_that_submitted_them(run):
+    queue = WriteQueue(window_ms=5, max_batch=64)
+    results = run(submit_from_requests(queue, 3))
+
+    assert queue.batches == 1
+    for _, stats in results:
+        # SAVEPOINT, the write and RELEASE, the batch's BEGIN and COMMIT belong to no request
+        assert stats.statements == 3, dict(stats.repeats)
+        assert stats.repeats[next(iter(stats.repeats))] == 1
+
+
+def test_a_failed_write_is_rolled_back_alone(run):
+    queue = WriteQueue(window_ms=5, max_batch=64)
+
+    async def submit():
+        async def fail(session):
+            raise ValueError("rejected")
+
+        try:
+            return await asyncio.gather(queue.submit(lambda session: session.execute(text("SELECT 1"))), queue.submit(fail),
+                                        return_exceptions=True)
+        finally:
+            await queue.shutdown()
+
+    ok, failed = run(submit())
+    assert ok.scalar() == 1
+    assert isinstance(failed, ValueError)
+    assert queue.batches == 1 and queue.failed == 1